@@ -4,6 +4,10 @@
 
 from __future__ import annotations
 
+import contextlib
+import dataclasses
+import json
+import logging
 import pathlib
 import typing
 
@@ -12,6 +16,8 @@ from .. import lib
 from .. import _meta
 from .. import _utils
 
+LOGGER = logging.getLogger(__name__)
+
 DIRECT_URI_CANDIDATE_MAKERS = [
     ext.source.SourceDirectoryCandidateMaker(),
     ext.sdist.SdistCandidateMaker(),
@@ -19,6 +25,7 @@ DIRECT_URI_CANDIDATE_MAKERS = [
 ]
 
 INSTALLERS: typing.List[lib.base.Installer] = [
+    lib.wheel.WheelInstaller(),
     ext.pip.PipInstaller(),
 ]
 
@@ -27,6 +34,59 @@ WHEEL_BUILDERS = [
     ext.pip.PipWheelBuilder(),
 ]
 
+CanNotParseEnvironmentSpec = lib.lock.CanNotParseEnvironmentSpec
+
+
+@dataclasses.dataclass
+class ProfileSolveOptions:
+    """Options for the instrumentation of the dependency solver."""
+
+    is_enabled: bool
+    trace_file_path: typing.Optional[pathlib.Path]
+
+
+@contextlib.contextmanager
+def _build_registry(
+        network_settings: typing.Optional[lib.network.NetworkSettings],
+        command_name: str,
+) -> typing.Iterator[lib.base.Registry]:
+    with lib.base.build_registry(
+            _meta.PROJECT_NAME,
+            network_settings=network_settings,
+    ) as registry:
+        registry.services.cache_stats.command_name = command_name
+        yield registry
+
+
+@contextlib.contextmanager
+def _profile_solve(
+        registry: lib.base.Registry,
+        options: typing.Optional[ProfileSolveOptions],
+) -> typing.Iterator[None]:
+    #
+    profile = None
+    if options and (options.is_enabled or options.trace_file_path):
+        profile = lib.profiling.SolveProfile()
+    #
+    registry.services.solve_profile = profile
+    try:
+        yield
+    finally:
+        registry.services.solve_profile = None
+        if profile and options:
+            if options.is_enabled:
+                report_str = json.dumps(profile.make_report(), sort_keys=True)
+                LOGGER.info("Solver profile: %s", report_str)
+            if options.trace_file_path:
+                profile.write_chrome_trace(options.trace_file_path)
+
+
+def cache_info() -> typing.Dict[str, typing.Any]:
+    """Get sizes and hit rates of the caches."""
+    with lib.base.build_registry(_meta.PROJECT_NAME) as registry:
+        info = lib.cache.get_info(registry)
+    return info
+
 
 def cache_list() -> typing.List[pathlib.Path]:
     """List cached distributions."""
@@ -35,17 +95,62 @@ def cache_list() -> typing.List[pathlib.Path]:
     return cached_distributions
 
 
+def cache_prune(
+        max_size: typing.Optional[int],
+        max_age: typing.Optional[float],
+) -> typing.List[pathlib.Path]:
+    """Evict least recently used distributions from the cache."""
+    with lib.base.build_registry(_meta.PROJECT_NAME) as registry:
+        removed_distributions = lib.cache.prune(registry, max_size, max_age)
+    return removed_distributions
+
+
+def cache_remove(
+        file_name_patterns: typing.Iterable[str],
+) -> typing.List[pathlib.Path]:
+    """Evict distributions matching the patterns from the cache."""
+    with lib.base.build_registry(_meta.PROJECT_NAME) as registry:
+        removed_distributions = lib.cache.remove(registry, file_name_patterns)
+    return removed_distributions
+
+
+def get_network_settings(
+        network_config: typing.Mapping[str, typing.Any],
+) -> lib.network.NetworkSettings:
+    """Get network settings from the configuration."""
+    #
+    network_config = dict(network_config)
+    indexes_config = network_config.pop('indexes', None)
+    find_links_config = network_config.pop('find_links', [])
+    #
+    network_settings = lib.network.NetworkSettings(**network_config)
+    if indexes_config:
+        network_settings.indexes = [
+            lib.network.IndexSettings(**index_config)
+            for index_config in indexes_config
+        ]
+    network_settings.find_links = [
+        pathlib.Path(dir_path_str).expanduser()
+        for dir_path_str in find_links_config
+    ]
+    #
+    return network_settings
+
+
 def install(
         requirements_strs: typing.Iterable[str],
         skip_dependencies: bool,
+        profile_solve_options: typing.Optional[ProfileSolveOptions] = None,
+        network_settings: typing.Optional[lib.network.NetworkSettings] = None,
 ) -> None:
     """Install things."""
-    with lib.base.build_registry(_meta.PROJECT_NAME) as registry:
+    with _build_registry(network_settings, 'install') as registry:
         registry.direct_uri_candidate_makers = DIRECT_URI_CANDIDATE_MAKERS
         registry.installers = INSTALLERS
         registry.wheel_builders = WHEEL_BUILDERS
         requirements = lib.parser.parse(registry, requirements_strs)
-        lib.install.install(registry, requirements, [], skip_dependencies)
+        with _profile_solve(registry, profile_solve_options):
+            lib.install.install(registry, requirements, [], skip_dependencies)
 
 
 def links_add(requirements_strs: typing.Iterable[str]) -> None:
@@ -74,9 +179,11 @@ def pip_install(
         requirements_strs: typing.Iterable[str],
         editable_requirement_strs: typing.Iterable[str],
         no_deps: bool,
+        profile_solve_options: typing.Optional[ProfileSolveOptions] = None,
+        network_settings: typing.Optional[lib.network.NetworkSettings] = None,
 ) -> None:
     """Emulate 'pip install'."""
-    with lib.base.build_registry(_meta.PROJECT_NAME) as registry:
+    with _build_registry(network_settings, 'pip install') as registry:
         registry.direct_uri_candidate_makers = DIRECT_URI_CANDIDATE_MAKERS
         registry.installers = INSTALLERS
         registry.wheel_builders = WHEEL_BUILDERS
@@ -84,17 +191,21 @@ def pip_install(
         editable_requirements = (
             lib.parser.parse(registry, editable_requirement_strs)
         )
-        lib.install.install(
-            registry,
-            requirements,
-            editable_requirements,
-            no_deps,
-        )
+        with _profile_solve(registry, profile_solve_options):
+            lib.install.install(
+                registry,
+                requirements,
+                editable_requirements,
+                no_deps,
+            )
 
 
-def pool_add(requirements_strs: typing.Iterable[str]) -> None:
+def pool_add(
+        requirements_strs: typing.Iterable[str],
+        network_settings: typing.Optional[lib.network.NetworkSettings] = None,
+) -> None:
     """Resolve requirements and add elected candidates to pool."""
-    with lib.base.build_registry(_meta.PROJECT_NAME) as registry:
+    with _build_registry(network_settings, 'pool add') as registry:
         registry.direct_uri_candidate_makers = DIRECT_URI_CANDIDATE_MAKERS
         registry.installers = INSTALLERS
         registry.wheel_builders = WHEEL_BUILDERS
@@ -109,13 +220,33 @@ def pool_list() -> typing.List[lib.base.Requirement]:
     return pooled_projects
 
 
-def solve(requirements_strs: typing.Iterable[str]) -> None:
-    """Resolve requirements."""
-    with lib.base.build_registry(_meta.PROJECT_NAME) as registry:
+def solve(
+        requirements_strs: typing.Iterable[str],
+        profile_solve_options: typing.Optional[ProfileSolveOptions] = None,
+        environment_spec_strs: typing.Sequence[str] = (),
+        network_settings: typing.Optional[lib.network.NetworkSettings] = None,
+) -> typing.Optional[typing.Dict[str, typing.Any]]:
+    """Resolve requirements, maybe into a lock for multiple environments."""
+    #
+    lock = None
+    #
+    with _build_registry(network_settings, 'solve') as registry:
         registry.direct_uri_candidate_makers = DIRECT_URI_CANDIDATE_MAKERS
         registry.wheel_builders = WHEEL_BUILDERS
         requirements = lib.parser.parse(registry, requirements_strs)
-        lib.solve.solve(registry, requirements, False)
+        with _profile_solve(registry, profile_solve_options):
+            if environment_spec_strs:
+                lock_ = lib.lock.lock(
+                    registry,
+                    environment_spec_strs,
+                    requirements,
+                )
+                if lock_:
+                    lock = lock_.to_dict()
+            else:
+                lib.solve.solve(registry, requirements, False)
+    #
+    return lock
 
 
 def ve_create(venv_dir_str: str) -> None:
@@ -5,6 +5,7 @@
 from __future__ import annotations
 
 import argparse
+import json
 import logging
 import operator
 import pathlib
@@ -22,6 +23,8 @@ except ModuleNotFoundError:
     pass
 
 if typing.TYPE_CHECKING:
+    from .. import lib
+    #
     SubParsers = argparse._SubParsersAction  # pylint: disable=protected-access
 
 LOGGER = logging.getLogger(__name__)
@@ -37,13 +40,74 @@ def _add_cache_args_subparser(subparsers: SubParsers) -> None:
     cache_parser.set_defaults(_handler=_cache_list)
     cache_subparsers = cache_parser.add_subparsers()
     #
+    cache_info_parser = cache_subparsers.add_parser('info', allow_abbrev=False)
+    cache_info_parser.set_defaults(_handler=_cache_info)
+    cache_info_parser.add_argument(
+        '--json',
+        action='store_true',
+        help="output sizes, hit rates and history as JSON",
+    )
+    #
     cache_list_parser = cache_subparsers.add_parser('list', allow_abbrev=False)
     cache_list_parser.set_defaults(_handler=_cache_list)
+    #
+    cache_prune_parser = cache_subparsers.add_parser(
+        'prune',
+        allow_abbrev=False,
+    )
+    cache_prune_parser.set_defaults(_handler=_cache_prune)
+    cache_prune_parser.add_argument(
+        '--max-size',
+        help=(
+            "evict least recently used distributions until the cache fits, "
+            "for example '500M' or '10G'"
+        ),
+        type=_parse_size,
+    )
+    cache_prune_parser.add_argument(
+        '--max-age',
+        help="evict distributions not used for that many days",
+        type=float,
+    )
+    #
+    cache_remove_parser = cache_subparsers.add_parser(
+        'remove',
+        allow_abbrev=False,
+    )
+    cache_remove_parser.set_defaults(_handler=_cache_remove)
+    cache_remove_parser.add_argument(
+        'file_name_patterns',
+        help="for example 'numpy-*'",
+        metavar='file_name_pattern',
+        nargs='+',
+    )
+
+
+def _format_size(size: int) -> str:
+    """Format size in bytes, with a suffix as understood by '_parse_size'."""
+    size_float = float(size)
+    for suffix in ('', 'K', 'M', 'G'):
+        if size_float < 1024:
+            break
+        size_float /= 1024
+    else:
+        suffix = 'T'
+    return f'{size_float:.1f}{suffix}' if suffix else f'{size}'
+
+
+def _parse_size(size_str: str) -> int:
+    """Parse size in bytes, maybe with a 'K', 'M', 'G' or 'T' suffix."""
+    multipliers = {'K': 1024, 'M': 1024 ** 2, 'G': 1024 ** 3, 'T': 1024 ** 4}
+    multiplier = multipliers.get(size_str[-1:].upper(), 1)
+    if multiplier > 1:
+        size_str = size_str[:-1]
+    return int(float(size_str) * multiplier)
 
 
 def _add_install_args_subparser(subparsers: SubParsers) -> None:
     install_parser = subparsers.add_parser('install', allow_abbrev=False)
     install_parser.set_defaults(_handler=_install)
+    _add_profile_solve_args(install_parser)
     install_parser.add_argument(
         'requirements',
         metavar='requirement',
@@ -108,6 +172,7 @@ def _add_pip_args_subparser(subparsers: SubParsers) -> None:
         '--verbose',
         action='count',
     )
+    _add_profile_solve_args(pip_install_parser)
     #
     requirements_group = pip_install_parser.add_argument_group("Requirements")
     requirements_group.add_argument(
@@ -142,6 +207,19 @@ def _add_pool_args_subparser(subparsers: SubParsers) -> None:
     pool_list_parser.set_defaults(_handler=_pool_list)
 
 
+def _add_profile_solve_args(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument(
+        '--profile-solve',
+        action='store_true',
+        help="log a JSON report of the time spent by the dependency solver",
+    )
+    parser.add_argument(
+        '--profile-solve-trace',
+        metavar='trace_file',
+        help="write a Chrome trace file of the dependency solver",
+    )
+
+
 def _add_ve_args_subparser(subparsers: SubParsers) -> None:
     ve_parser = subparsers.add_parser('ve', allow_abbrev=False)
     ve_parser.set_defaults(_handler=_ve)
@@ -173,6 +251,24 @@ def _build_args_parser(
         help=f"(default: {default_config_file_path})"
     )
     #
+    parser.add_argument(
+        '--find-links',
+        action='append',
+        default=[],
+        help=(
+            "also look for distribution files in this local directory "
+            "(repeatable)"
+        ),
+        metavar='dir_path',
+        type=pathlib.Path,
+    )
+    #
+    parser.add_argument(
+        '--offline',
+        action='store_true',
+        help="use only what is already in the caches, never the network",
+    )
+    #
     parser.add_argument(
         '--python',
         default=sys.executable,
@@ -194,20 +290,98 @@ def _build_args_parser(
         metavar='requirement',
         nargs='+',
     )
-    solve_parser.set_defaults(_handler=_solve)
+    solve_parser.add_argument(
+        '--env-spec',
+        action='append',
+        default=[],
+        dest='env_specs',
+        help=(
+            "lock for this environment instead of the current one, "
+            "for example 'cp38-manylinux2014_x86_64' (repeatable)"
+        ),
+        metavar='env_spec',
+    )
+    _add_profile_solve_args(solve_parser)
+    solve_parser.set_defaults(_handler=_solve, _parser=solve_parser)
     #
     return parser
 
 
+def _cache_info(args: argparse.Namespace) -> None:
+    info = _core.cache_info()
+    if args.json:
+        output(json.dumps(info, indent=4))
+    else:
+        for category, size in sorted(info['sizes'].items()):
+            output(f"{category}: {_format_size(size)}")
+        for category, counters in info['totals'].items():
+            hit_rate = counters['hit_rate']
+            hit_rate_str = '-' if hit_rate is None else f'{hit_rate:.0%}'
+            output(
+                f"{category}: {counters['hits']} hits, "
+                f"{counters['misses']} misses, hit rate {hit_rate_str}, "
+                f"{_format_size(counters['fetched_bytes'])} fetched, "
+                f"{_format_size(counters['served_bytes'])} served from cache"
+            )
+
+
 def _cache_list(_args: argparse.Namespace) -> None:
     cached_distributions = _core.cache_list()
     for cached_distribution in sorted(cached_distributions):
         output(str(cached_distribution))
 
 
+def _cache_prune(args: argparse.Namespace) -> None:
+    max_age = args.max_age * 24 * 60 * 60 if args.max_age else None
+    removed_distributions = _core.cache_prune(args.max_size, max_age)
+    for removed_distribution in removed_distributions:
+        output(str(removed_distribution))
+
+
+def _cache_remove(args: argparse.Namespace) -> None:
+    removed_distributions = _core.cache_remove(args.file_name_patterns)
+    for removed_distribution in removed_distributions:
+        output(str(removed_distribution))
+
+
 def _install(args: argparse.Namespace) -> None:
     raw_requirement_strs = args.requirements
-    _core.install(raw_requirement_strs, False)
+    _core.install(
+        raw_requirement_strs,
+        False,
+        _get_profile_solve_options(args),
+        _get_network_settings(args),
+    )
+
+
+def _get_network_settings(
+        args: argparse.Namespace,
+) -> lib.network.NetworkSettings:
+    #
+    config_file = args.configuration_file
+    config_file.seek(0)
+    config_ = _utils.config.parse_config(_meta.PROJECT_NAME, config_file)
+    network_settings = _core.get_network_settings(config_['network'])
+    network_settings.find_links.extend(args.find_links)
+    network_settings.is_offline = args.offline
+    #
+    return network_settings
+
+
+def _get_profile_solve_options(
+        args: argparse.Namespace,
+) -> _core.ProfileSolveOptions:
+    #
+    trace_file_path = None
+    if args.profile_solve_trace:
+        trace_file_path = pathlib.Path(args.profile_solve_trace)
+    #
+    profile_solve_options = _core.ProfileSolveOptions(
+        args.profile_solve,
+        trace_file_path,
+    )
+    #
+    return profile_solve_options
 
 
 def _links_add(args: argparse.Namespace) -> None:
@@ -234,12 +408,14 @@ def _pip_install(args: argparse.Namespace) -> None:
         args.requirements,
         args.editable_requirements,
         args.no_deps,
+        _get_profile_solve_options(args),
+        _get_network_settings(args),
     )
 
 
 def _pool_add(args: argparse.Namespace) -> None:
     raw_requirement_strs = args.requirements
-    _core.pool_add(raw_requirement_strs)
+    _core.pool_add(raw_requirement_strs, _get_network_settings(args))
 
 
 def _pool_list(_args: argparse.Namespace) -> None:
@@ -253,7 +429,19 @@ def _pool_list(_args: argparse.Namespace) -> None:
 
 def _solve(args: argparse.Namespace) -> None:
     raw_requirement_strs = args.requirements
-    _core.solve(raw_requirement_strs)
+    try:
+        lock = _core.solve(
+            raw_requirement_strs,
+            _get_profile_solve_options(args),
+            args.env_specs,
+            _get_network_settings(args),
+        )
+    except _core.CanNotParseEnvironmentSpec as exc:
+        args._parser.error(  # pylint: disable=protected-access
+            f"argument --env-spec: can not parse '{exc}'",
+        )
+    if lock:
+        output(json.dumps(lock, indent=4))
 
 
 def _ve(args: argparse.Namespace) -> None:
@@ -21,11 +21,13 @@ def parse_config(project_name: str, config_file: typing.TextIO) -> Config:
     raw_config.read_file(config_file)
     #
     zipapp_requirements = _get_zipapp_requirements(project_name, raw_config)
+    network_config = _get_network_config(project_name, raw_config)
     #
     config = {
         'main': {
             'project_name': project_name,
         },
+        'network': network_config,
         'zipapp': {
             'requirements': zipapp_requirements,
         },
@@ -34,6 +36,73 @@ def parse_config(project_name: str, config_file: typing.TextIO) -> Config:
     return config
 
 
+def _get_network_config(
+        project_name: str,
+        raw_config: configparser.ConfigParser,
+) -> typing.Dict[str, typing.Any]:
+    #
+    network_config: typing.Dict[str, typing.Any] = {}
+    #
+    network_section_name = f'{project_name}:network'
+    #
+    if raw_config.has_section(network_section_name):
+        raw_section = raw_config[network_section_name]
+        for option_name, getter in (
+                ('pool_size', raw_section.getint),
+                ('retries', raw_section.getint),
+                ('backoff_factor', raw_section.getfloat),
+                ('timeout', raw_section.getfloat),
+                ('index_cache_max_age', raw_section.getfloat),
+                ('index_cache_max_size', raw_section.getint),
+                ('downloads_count', raw_section.getint),
+                ('downloads_per_host', raw_section.getint),
+        ):
+            if option_name in raw_section:
+                network_config[option_name] = getter(option_name)
+        #
+        if 'find_links' in raw_section:
+            network_config['find_links'] = [
+                line.strip()
+                for line in raw_section['find_links'].splitlines()
+                if line.strip()
+            ]
+    #
+    indexes_config = _get_indexes_config(project_name, raw_config)
+    if indexes_config:
+        network_config['indexes'] = indexes_config
+    #
+    return network_config
+
+
+def _get_indexes_config(
+        project_name: str,
+        raw_config: configparser.ConfigParser,
+) -> typing.List[typing.Dict[str, typing.Any]]:
+    """Get indexes, each in its own section, mirrors listed in 'urls'."""
+    #
+    indexes_config = []
+    #
+    index_section_prefix = f'{project_name}:index:'
+    #
+    for section_name in raw_config.sections():
+        if section_name.startswith(index_section_prefix):
+            raw_section = raw_config[section_name]
+            urls = [
+                line.strip()
+                for line in raw_section.get('urls', '').splitlines()
+                if line.strip()
+            ]
+            if urls:
+                indexes_config.append(
+                    {
+                        'priority': raw_section.getint('priority', 0),
+                        'urls': urls,
+                    },
+                )
+    #
+    return indexes_config
+
+
 def _get_zipapp_requirements(
         project_name: str,
         raw_config: configparser.ConfigParser,
@@ -180,7 +180,11 @@ def _make_environment(
     )
     #
     environment = lib.base.Environment(
-        purelib_dir_path,
+        lib.base.InstallDestination(
+            purelib_dir_path,
+            creator.script_dir,
+            creator.exe,
+        ),
         python_implementation_str,
         python_processor_str,
         python_version,
@@ -262,6 +266,7 @@ def _run(
         ]
         #
         registry.installers = [
+            lib.wheel.WheelInstaller(),
             ext.pip.PipInstaller(),
         ]
         #
@@ -5,6 +5,7 @@
 from __future__ import annotations
 
 import abc
+import hashlib
 import logging
 import pathlib
 import tarfile
@@ -19,8 +20,6 @@ from .. import lib
 
 LOGGER = logging.getLogger(__name__)
 
-WHEEL_DIR_PATH = 'built_from_sdist'
-
 
 class SdistCandidate(
         lib.distribution.DistFileCandidate,
@@ -35,12 +34,27 @@ class SdistCandidate(
         return metadata_
 
     def _get_path_built(self) -> pathlib.Path:
+        """Get wheel from the cache, build it only if it is not there yet."""
         #
-        wheel_path = self._extract_and_build()
+        sdist_hash = hashlib.sha256()
+        lib.network.hash_file(self.path, [sdist_hash])
+        built_wheel_dir_path = lib.build.get_built_wheel_dir_path(
+            self._registry,
+            sdist_hash.hexdigest(),
+            lib.build.get_build_requires(_read_pyproject_toml(self.path)),
+        )
+        wheel_path = lib.build.get_or_build_wheel(
+            self._registry,
+            built_wheel_dir_path,
+            self._extract_and_build,
+        )
         #
         return wheel_path
 
-    def _extract_and_build(self) -> pathlib.Path:
+    def _extract_and_build(
+            self,
+            target_dir_path: pathlib.Path,
+    ) -> pathlib.Path:
         #
         wheel_path = None
         #
@@ -57,7 +71,10 @@ class SdistCandidate(
             for item in pathlib.Path(extraction_dir_path).iterdir():
                 if item.is_dir():
                     source_dir_path = item
-                    wheel_path = self._build_wheel(source_dir_path)
+                    wheel_path = self._build_wheel(
+                        source_dir_path,
+                        target_dir_path,
+                    )
                     break
         #
         if wheel_path is None:
@@ -68,19 +85,9 @@ class SdistCandidate(
     def _build_wheel(
             self,
             source_dir_path: pathlib.Path,
+            target_dir_path: pathlib.Path,
     ) -> pathlib.Path:
         #
-        is_cache_possible = (not self.is_direct)
-        #
-        if is_cache_possible:
-            target_dir_path = (
-                self._registry.get_distributions_cache_dir_path()
-            )
-        else:
-            target_dir_path = (
-                self._registry.get_temp_dir_path().joinpath(WHEEL_DIR_PATH)
-            )
-        #
         wheel_path = lib.wheel.build_wheel(
             self._registry,
             source_dir_path,
@@ -90,6 +97,34 @@ class SdistCandidate(
         return wheel_path
 
 
+def _read_pyproject_toml(sdist_path: pathlib.Path) -> typing.Optional[bytes]:
+    """Read 'pyproject.toml' of the project, without extracting it all."""
+    #
+    content = None
+    #
+    if sdist_path.suffixes[-1:] == ['.zip']:
+        with zipfile.ZipFile(sdist_path) as zip_file:
+            for file_name in zip_file.namelist():
+                if _is_top_level_pyproject_toml(file_name):
+                    content = zip_file.read(file_name)
+                    break
+    elif sdist_path.suffixes[-2:] == ['.tar', '.gz']:
+        with tarfile.open(sdist_path) as tar_file:
+            for tar_info in tar_file:
+                if _is_top_level_pyproject_toml(tar_info.name):
+                    member_file = tar_file.extractfile(tar_info)
+                    if member_file:
+                        content = member_file.read()
+                    break
+    #
+    return content
+
+
+def _is_top_level_pyproject_toml(file_name: str) -> bool:
+    parts = file_name.strip('/').split('/')
+    return len(parts) == 2 and parts[1] == 'pyproject.toml'
+
+
 class SdistCandidateMaker(lib.base.CandidateMaker):
     """Make candidates for 'sdist' source distribution files."""
 
@@ -16,8 +16,6 @@ from .. import lib
 
 LOGGER = logging.getLogger(__name__)
 
-WHEEL_DIR_NAME = 'built_from_source'
-
 
 class SourceDirectoryCandidate(
         lib.base.BaseCandidate,
@@ -66,33 +64,17 @@ class SourceDirectoryCandidate(
         return self._source_path
 
     def _get_metadata(self) -> typing.Optional[lib.base.Metadata]:
-        metadata_ = lib.wheel.get_metadata(self.path)
+        metadata_ = lib.build.get_source_dir_metadata(
+            self._registry,
+            self.source_path,
+        )
         return metadata_
 
     def _get_path(self) -> pathlib.Path:
-        #
-        wheel_dir_path = (
-            self._registry.get_temp_dir_path().joinpath(WHEEL_DIR_NAME)
+        wheel_path = lib.build.get_source_dir_wheel(
+            self._registry,
+            self.source_path,
         )
-        for item in wheel_dir_path.iterdir():
-            project_key, release_version, tags = (
-                lib.wheel.parse_file_path(item)
-            )
-            if project_key and release_version and tags:
-                if (
-                        project_key == self.project_key
-                        and
-                        release_version == self.release_version
-                ):
-                    wheel_path = item
-                    break
-        else:
-            wheel_path = lib.wheel.build_wheel(
-                self._registry,
-                self.source_path,
-                wheel_dir_path,
-            )
-        #
         return wheel_path
 
     def _get_source_path(self) -> pathlib.Path:
@@ -140,16 +122,7 @@ class SourceDirectoryCandidateMaker(
         parser_result = None
         #
         if uri_path.is_dir():
-            target_dir_path = (
-                registry.get_temp_dir_path().joinpath(WHEEL_DIR_NAME)
-            )
-            target_dir_path.mkdir()
-            wheel_path = lib.wheel.build_wheel(
-                registry,
-                uri_path,
-                target_dir_path,
-            )
-            metadata = lib.wheel.get_metadata(wheel_path)
+            metadata = lib.build.get_source_dir_metadata(registry, uri_path)
             if metadata:
                 parser_result = cls.ParserResult(
                     packaging.utils.canonicalize_name(metadata['Name']),
@@ -3,13 +3,19 @@
 """Core library."""
 
 from . import base
+from . import build
+from . import buildenv
 from . import cache
 from . import distribution
+from . import fetch
 from . import install
 from . import installers
 from . import links
+from . import lock
+from . import network
 from . import parser
 from . import pool
+from . import profiling
 from . import solve
 from . import wheel
 
@@ -4,6 +4,7 @@
 
 from . import active
 from . import direct
+from . import local
 from . import pep503
 from . import pool
 from . import provider
@@ -5,15 +5,30 @@
 from __future__ import annotations
 
 import logging
+import os
 import sys
+import threading
 import typing
 
 import importlib.metadata
+import packaging.version
 
 from .. import base
 
+if typing.TYPE_CHECKING:
+    _ActiveDistribution = typing.Tuple[
+        base.ProjectKey,
+        typing.Optional[base.Version],
+        importlib.metadata.Distribution,
+    ]
+
 LOGGER = logging.getLogger(__name__)
 
+METADATA_DIR_SUFFIXES = (
+    '.dist-info',
+    '.egg-info',
+)
+
 
 class _ActiveCandidate(base.BaseCandidate):
     """Active distribution as a candidate for dependency resolution."""
@@ -22,11 +37,15 @@ class _ActiveCandidate(base.BaseCandidate):
             self,
             distribution: importlib.metadata.Distribution,
             extras: base.Extras,
+            project_key: base.ProjectKey,
+            release_version: typing.Optional[base.Version],
     ) -> None:
         """Initialize."""
         super().__init__(extras)
         #
         self._distribution = distribution
+        self._project_key = project_key
+        self._release_version = release_version
 
     @property
     def is_in_environment(self) -> bool:
@@ -52,10 +71,107 @@ def _get_search_path(registry: base.Registry) -> typing.List[str]:
     return search_path
 
 
+def _parse_metadata_dir_name(
+        dir_name: str,
+) -> typing.Optional[typing.Tuple[base.ProjectKey, base.Version]]:
+    """Parse name of a '*.dist-info' or '*.egg-info' directory or file."""
+    #
+    result = None
+    #
+    stem = dir_name.rsplit('.', 1)[0]
+    parts = stem.split('-')
+    if len(parts) >= 2:
+        try:
+            release_version = packaging.version.Version(parts[1])
+        except packaging.version.InvalidVersion:
+            pass
+        else:
+            result = (base.get_project_key(parts[0]), release_version)
+    #
+    return result
+
+
+def _scan_dir(dir_path_str: str) -> typing.Iterator[_ActiveDistribution]:
+    """Scan directory, parsing the names of the metadata entries only.
+
+    Metadata of old distributions can be a single '*.egg-info' file instead
+    of a directory.
+    """
+    #
+    with os.scandir(dir_path_str) as dir_entries:
+        for dir_entry in dir_entries:
+            name = dir_entry.name
+            is_metadata_entry = name.endswith(METADATA_DIR_SUFFIXES) and (
+                dir_entry.is_dir() or name.endswith('.egg-info')
+            )
+            if is_metadata_entry:
+                distribution = importlib.metadata.Distribution.at(
+                    dir_entry.path,
+                )
+                parser_result = _parse_metadata_dir_name(name)
+                if parser_result:
+                    project_key, release_version = parser_result
+                    yield project_key, release_version, distribution
+                else:
+                    # For example 'Thing.egg-info' without version
+                    project_name = distribution.metadata['Name']
+                    if project_name:
+                        project_key = base.get_project_key(project_name)
+                        yield project_key, None, distribution
+
+
+def _scan_path_entry(path_str: str) -> typing.Iterator[_ActiveDistribution]:
+    """Scan entry of the search path, for example a zip file."""
+    #
+    search_context = importlib.metadata.DistributionFinder.Context(
+        path=[path_str],
+    )
+    for distribution in importlib.metadata.distributions(
+            context=search_context,
+    ):
+        project_name = distribution.metadata['Name']
+        if project_name:
+            project_key = base.get_project_key(project_name)
+            yield project_key, None, distribution
+
+
+def _index_distributions(
+        search_path: typing.Iterable[str],
+) -> typing.Dict[base.ProjectKey, typing.List[_ActiveDistribution]]:
+    """Index distributions by project key, in order of the search path."""
+    #
+    distributions: typing.Dict[
+        base.ProjectKey,
+        typing.List[_ActiveDistribution],
+    ] = {}
+    #
+    for path_str in search_path:
+        dir_path_str = path_str if path_str else '.'
+        if os.path.isdir(dir_path_str):
+            active_distributions = _scan_dir(dir_path_str)
+        elif os.path.isfile(path_str):
+            active_distributions = _scan_path_entry(path_str)
+        else:
+            continue
+        for active_distribution in active_distributions:
+            project_key = active_distribution[0]
+            distributions.setdefault(project_key, []).append(
+                active_distribution,
+            )
+    #
+    return distributions
+
+
 class ActiveFinder(
         base.CandidateFinder,
 ):  # pylint: disable=too-few-public-methods
-    """Find candidates among the active distributions."""
+    """Find candidates among the active distributions.
+
+    The active distributions are indexed by project key once, from the names
+    of their metadata directories or files, without reading their metadata.
+    """
+
+    is_concurrency_safe = True
 
     def __init__(
             self,
@@ -65,9 +181,10 @@ class ActiveFinder(
         #
         self._registry = registry
         #
-        self._search_context = importlib.metadata.DistributionFinder.Context(
-            path=_get_search_path(self._registry),
-        )
+        self._distributions: typing.Optional[
+            typing.Dict[base.ProjectKey, typing.List[_ActiveDistribution]]
+        ] = None
+        self._lock = threading.Lock()
 
     def find_candidates(
             self,
@@ -77,11 +194,14 @@ class ActiveFinder(
     ) -> typing.Iterator[base.Candidate]:
         """Implement abstract."""
         #
-        distributions_iterator = importlib.metadata.distributions(
-            context=self._search_context,
-        )
-        for distribution in distributions_iterator:
-            candidate = _ActiveCandidate(distribution, extras)
+        distributions = self._get_distributions().get(project_key, [])
+        for _, release_version, distribution in distributions:
+            candidate = _ActiveCandidate(
+                distribution,
+                extras,
+                project_key,
+                release_version,
+            )
             is_compatible = candidate.is_compatible(
                 requirements,
                 self._registry.environment,
@@ -90,5 +210,16 @@ class ActiveFinder(
                 yield candidate
                 # Shouldn't there always be only 1 active distribution per key?
 
+    def _get_distributions(
+            self,
+    ) -> typing.Dict[base.ProjectKey, typing.List[_ActiveDistribution]]:
+        with self._lock:
+            if self._distributions is None:
+                self._distributions = _index_distributions(
+                    _get_search_path(self._registry),
+                )
+            distributions = self._distributions
+        return distributions
+
 
 # EOF
@@ -0,0 +1,292 @@
+#
+
+"""Find candidates in local directories of distribution files."""
+
+from __future__ import annotations
+
+import dataclasses
+import hashlib
+import json
+import logging
+import os
+import threading
+import typing
+
+from .. import base
+from .. import network
+from .. import wheel
+from . import versions
+
+if typing.TYPE_CHECKING:
+    import pathlib
+    #
+    _FileNamesIndex = typing.Dict[base.ProjectKey, typing.List[str]]
+
+LOGGER = logging.getLogger(__name__)
+
+
+@dataclasses.dataclass
+class _ParsedFile:
+    """Distribution file, already parsed by a candidate maker."""
+
+    candidate_maker: base.CandidateMaker
+    uri_str: str
+    parser_result: base.CandidateMaker.ParserResult
+
+
+class LocalDirectoryFinder(
+        base.CandidateFinder,
+):  # pylint: disable=too-few-public-methods
+    """Find candidates in a local directory of wheels and 'sdist's.
+
+    The names of the files are indexed by project on disk. The directory is
+    listed again only when its modification time changes, and then only the
+    names of the new files are parsed.
+    """
+
+    is_concurrency_safe = True
+    yields_sorted_candidates = True
+
+    def __init__(
+            self,
+            registry: base.Registry,
+            dir_path: pathlib.Path,
+    ) -> None:
+        """Initialize."""
+        self._registry = registry
+        self._dir_path = dir_path
+        #
+        self._lock = threading.Lock()
+        self._file_names_index: typing.Optional[_FileNamesIndex] = None
+        #
+        self._candidates: typing.Dict[
+            typing.Tuple[str, typing.FrozenSet[base.Extra]],
+            base.Candidate,
+        ] = {}
+        self._version_indexes: typing.Dict[
+            base.ProjectKey,
+            versions.VersionIndex[_ParsedFile],
+        ] = {}
+
+    def find_candidates(
+            self,
+            project_key: base.ProjectKey,
+            requirements: typing.Iterable[base.Requirement],
+            extras: base.Extras,
+    ) -> typing.Iterator[base.Candidate]:
+        """Implement abstract."""
+        #
+        version_index = self._version_indexes.get(project_key)
+        if version_index is None:
+            version_index = self._make_version_index(project_key)
+            self._version_indexes[project_key] = version_index
+        #
+        for _, parsed_files in version_index.find(requirements):
+            built_candidates = []
+            unbuilt_candidates = []
+            for parsed_file in parsed_files:
+                candidate = self._get_candidate(parsed_file, extras)
+                is_compatible = candidate.is_compatible(
+                    requirements,
+                    self._registry.environment,
+                )
+                if is_compatible:
+                    if candidate.is_built:
+                        built_candidates.append(candidate)
+                    else:
+                        unbuilt_candidates.append(candidate)
+            #
+            yield from (built_candidates or unbuilt_candidates)
+
+    def _get_candidate(
+            self,
+            parsed_file: _ParsedFile,
+            extras: base.Extras,
+    ) -> base.Candidate:
+        #
+        candidate_key = (parsed_file.uri_str, frozenset(extras))
+        candidate = self._candidates.get(candidate_key)
+        #
+        if candidate is None:
+            candidate_maker = parsed_file.candidate_maker
+            candidate = candidate_maker.make_from_parser_result(
+                self._registry,
+                parsed_file.uri_str,
+                parsed_file.parser_result,
+                extras,
+                False,  # is_direct
+            )
+            self._candidates[candidate_key] = candidate
+        #
+        return candidate
+
+    def _make_version_index(
+            self,
+            project_key: base.ProjectKey,
+    ) -> versions.VersionIndex[_ParsedFile]:
+        #
+        file_names = self._get_file_names_index().get(project_key, [])
+        tags_lookup = wheel.make_tags_lookup(self._registry.environment.tags)
+        #
+        releases = []
+        for file_name in file_names:
+            parsed_file = None
+            if wheel.is_file_name_compatible(file_name, tags_lookup):
+                parsed_file = _parse_file(
+                    self._registry,
+                    self._dir_path.joinpath(file_name),
+                )
+            if parsed_file:
+                release_version = parsed_file.parser_result.release_version
+                releases.append((release_version, parsed_file))
+        #
+        version_index = versions.VersionIndex(releases)
+        #
+        return version_index
+
+    def _get_file_names_index(self) -> _FileNamesIndex:
+        with self._lock:
+            if self._file_names_index is None:
+                self._file_names_index = load_file_names_index(
+                    self._registry,
+                    self._dir_path,
+                )
+            file_names_index = self._file_names_index
+        return file_names_index
+
+
+def _parse_file(
+        registry: base.Registry,
+        file_path: pathlib.Path,
+) -> typing.Optional[_ParsedFile]:
+    #
+    parsed_file = None
+    #
+    uri_str = file_path.as_uri()
+    for candidate_maker in registry.direct_uri_candidate_makers:
+        parser_result = candidate_maker.parse_uri(registry, uri_str)
+        if parser_result:
+            parsed_file = _ParsedFile(candidate_maker, uri_str, parser_result)
+            break
+    #
+    return parsed_file
+
+
+def _read_file_names_index(
+        index_file_path: pathlib.Path,
+) -> typing.Optional[typing.Dict[str, typing.Any]]:
+    #
+    stored_index = None
+    #
+    try:
+        stored_index = json.loads(index_file_path.read_bytes())
+    except FileNotFoundError:
+        pass
+    except ValueError:
+        LOGGER.warning("Ignoring corrupt index '%s'", index_file_path)
+    #
+    return stored_index
+
+
+def load_file_names_index(
+        registry: base.Registry,
+        dir_path: pathlib.Path,
+) -> _FileNamesIndex:
+    """Get names of distribution files by project, refreshed if needed."""
+    #
+    file_names_index: _FileNamesIndex = {}
+    #
+    dir_path = dir_path.resolve()
+    index_file_name = (
+        hashlib.sha256(str(dir_path).encode()).hexdigest() + '.json'
+    )
+    index_file_path = (
+        registry.get_find_links_index_dir_path().joinpath(index_file_name)
+    )
+    #
+    try:
+        dir_mtime_ns = dir_path.stat().st_mtime_ns
+    except OSError:
+        LOGGER.warning("Ignoring missing directory '%s'", dir_path)
+    else:
+        stored_index = _read_file_names_index(index_file_path) or {}
+        stored_projects = stored_index.get('projects', {})
+        if stored_index.get('dir_mtime_ns') == dir_mtime_ns:
+            file_names_index = stored_projects
+        else:
+            LOGGER.info("Indexing directory '%s'", dir_path)
+            ignored_file_names = _refresh_file_names_index(
+                registry,
+                dir_path,
+                file_names_index,
+                stored_projects,
+                set(stored_index.get('ignored', [])),
+            )
+            index_file_path.parent.mkdir(parents=True, exist_ok=True)
+            network.write_file_atomically(
+                index_file_path,
+                json.dumps(
+                    {
+                        'dir_mtime_ns': dir_mtime_ns,
+                        'ignored': sorted(ignored_file_names),
+                        'projects': file_names_index,
+                    },
+                ).encode(),
+            )
+    #
+    return file_names_index
+
+
+def _refresh_file_names_index(
+        registry: base.Registry,
+        dir_path: pathlib.Path,
+        file_names_index: _FileNamesIndex,
+        stored_projects: _FileNamesIndex,
+        stored_ignored_file_names: typing.Set[str],
+) -> typing.Set[str]:
+    """List directory, parse only names of files that were not indexed."""
+    #
+    ignored_file_names = set()
+    #
+    project_keys = {
+        file_name: project_key
+        for project_key, file_names in stored_projects.items()
+        for file_name in file_names
+    }
+    #
+    with os.scandir(dir_path) as dir_entries:
+        for dir_entry in dir_entries:
+            file_name = dir_entry.name
+            if file_name in stored_ignored_file_names:
+                ignored_file_names.add(file_name)
+                continue
+            project_key = project_keys.get(file_name)
+            if project_key is None and dir_entry.is_file():
+                parsed_file = _parse_file(
+                    registry,
+                    dir_path.joinpath(file_name),
+                )
+                if parsed_file:
+                    project_key = parsed_file.parser_result.project_key
+            if project_key is None:
+                ignored_file_names.add(file_name)
+            else:
+                file_names_index.setdefault(project_key, []).append(file_name)
+    #
+    return ignored_file_names
+
+
+def make_local_finders(
+        registry: base.Registry,
+) -> typing.List[LocalDirectoryFinder]:
+    """Make a finder for each of the configured 'find links' directories."""
+    #
+    finders = [
+        LocalDirectoryFinder(registry, dir_path)
+        for dir_path in registry.services.http_session.settings.find_links
+    ]
+    #
+    return finders
+
+
+# EOF
@@ -1,37 +1,117 @@
 #
 
-"""Find candidates on a PEP503 index."""
+"""Find candidates on a PEP503 index, or its PEP691 JSON variant."""
 
 from __future__ import annotations
 
+import concurrent.futures
+import dataclasses
+import functools
+import html.parser
+import json
 import logging
+import operator
 import typing
+import urllib.parse
 
-import mousebender.simple
-import requests
+import packaging.specifiers
 
 from .. import base
+from .. import distribution
+from .. import network
+from .. import wheel
+from . import versions
 
 LOGGER = logging.getLogger(__name__)
 
+JSON_CONTENT_TYPE = 'application/vnd.pypi.simple.v1+json'
+
+# Prefer JSON, fall back to HTML for the indexes that do not support PEP691
+ACCEPT_HEADER = ', '.join(
+    (
+        JSON_CONTENT_TYPE,
+        'application/vnd.pypi.simple.v1+html;q=0.2',
+        'text/html;q=0.01',
+    ),
+)
+
+
+class CanNotFetchProjectPage(Exception):
+    """Can not fetch project page from any of the mirrors."""
+
+
+@dataclasses.dataclass
+class Link:
+    """Link to a distribution file, from the project page of an index."""
+
+    filename: str
+    url: str
+    hashes: typing.Dict[str, str]
+    requires_python: packaging.specifiers.SpecifierSet
+    is_yanked: bool
+    # Hashes of the PEP658 '.metadata' file, 'None' if there is no such file
+    core_metadata_hashes: typing.Optional[typing.Dict[str, str]] = None
+
+
+@dataclasses.dataclass
+class _IndexedLink:
+    """Link to a distribution file, already parsed by a candidate maker."""
+
+    candidate_maker: base.CandidateMaker
+    uri_str: str
+    parser_result: base.CandidateMaker.ParserResult
+    hashes: typing.Dict[str, str]
+    core_metadata_hashes: typing.Optional[typing.Dict[str, str]]
+
 
 class SimpleIndexFinder(
         base.CandidateFinder,
 ):  # pylint: disable=too-few-public-methods
-    """Find candidates in PEP503 simple index."""
+    """Find candidates in PEP503 simple index.
 
-    PYPI_BASE_URL = 'https://pypi.org/simple/'
+    If the index is served by several mirrors, project pages are requested
+    from all of them in parallel and the fastest healthy answer is used.
+    Mirrors that keep failing are left out for a while.
+    """
+
+    PYPI_BASE_URL = network.PYPI_SIMPLE_URL
+
+    is_concurrency_safe = True
+    yields_sorted_candidates = True
 
     def __init__(
             self,
             registry: base.Registry,
             base_url: typing.Optional[str] = None,
+            mirror_urls: typing.Iterable[str] = (),
     ) -> None:
         """Initialize."""
         self._registry = registry
-        self._base_url = base_url if base_url else self.PYPI_BASE_URL
+        # Project paths are appended to the base URLs
+        self._base_urls = [
+            _normalize_base_url(url)
+            for url in (
+                base_url if base_url else self.PYPI_BASE_URL,
+                *mirror_urls,
+            )
+        ]
+        #
+        self._candidates: typing.Dict[
+            typing.Tuple[str, typing.FrozenSet[base.Extra]],
+            base.Candidate,
+        ] = {}
+        self._version_indexes: typing.Dict[
+            base.ProjectKey,
+            versions.VersionIndex[_IndexedLink],
+        ] = {}
+        #
+        self._python_incompatibilities: typing.Dict[
+            packaging.specifiers.SpecifierSet,
+            bool,
+        ] = {}
+        self._tags_lookup = wheel.make_tags_lookup(registry.environment.tags)
 
-    def find_candidates(  # pylint: disable=too-complex
+    def find_candidates(
             self,
             project_key: base.ProjectKey,
             requirements: typing.Iterable[base.Requirement],
@@ -39,96 +119,448 @@ class SimpleIndexFinder(
     ) -> typing.Iterator[base.Candidate]:
         """Implement abstract."""
         #
-        if typing.TYPE_CHECKING:
-            Candidates = typing.List[base.Candidate]
-            Release = typing.Dict[str, Candidates]
-        #
-        candidates: typing.Dict[base.Version, Release] = {}
-        #
-        project_url = '{}{}'.format(self._base_url, project_key)
-        project_page = requests.get(project_url).content.decode()
+        version_index = self._version_indexes.get(project_key)
+        if version_index is None:
+            version_index = self._make_version_index(project_key)
+            self._version_indexes[project_key] = version_index
         #
-        links = mousebender.simple.parse_archive_links(project_page)
+        # Offline, report only the best missing file of a project that has
+        # no candidate at all left in the caches
+        missing_uri_str = None
+        is_found = False
         #
-        for link in links:
-            candidate = self._make_candidate_from_link(link, extras)
-            if candidate:
+        for _, indexed_links in version_index.find(requirements):
+            built_candidates = []
+            unbuilt_candidates = []
+            for indexed_link in indexed_links:
+                candidate = self._get_candidate(indexed_link, extras)
                 is_compatible = candidate.is_compatible(
                     requirements,
                     self._registry.environment,
                 )
-                if is_compatible:
-                    release = candidates.setdefault(
-                        candidate.release_version,
-                        {
-                            'built': [],
-                            'unbuilt': [],
-                        },
-                    )
-                    #
+                if is_compatible and not self._is_available(candidate):
+                    missing_uri_str = missing_uri_str or indexed_link.uri_str
+                elif is_compatible:
                     if candidate.is_built:
-                        release['built'].append(candidate)
+                        built_candidates.append(candidate)
                     else:
-                        release['unbuilt'].append(candidate)
-        #
-        if candidates:
-            for version in candidates:
-                release = candidates[version]
-                for candidate in release['built']:
-                    yield candidate
-                if not release['built']:
-                    for candidate in release['unbuilt']:
-                        yield candidate
-
-    def _make_candidate_from_link(
+                        unbuilt_candidates.append(candidate)
+            #
+            is_found = is_found or bool(built_candidates or unbuilt_candidates)
+            yield from (built_candidates or unbuilt_candidates)
+        #
+        if missing_uri_str and not is_found:
+            http_session = self._registry.services.http_session
+            http_session.record_missing_url(missing_uri_str)
+
+    def _is_available(self, candidate: base.Candidate) -> bool:
+        """Check if candidate is available, offline it has to be cached."""
+        #
+        is_available = True
+        #
+        if self._registry.services.http_session.is_offline:
+            if isinstance(candidate, distribution.DistFileCandidate):
+                is_available = candidate.is_available_locally
+        #
+        return is_available
+
+    def _get_candidate(
             self,
-            distribution_link: mousebender.simple.ArchiveLink,
+            indexed_link: _IndexedLink,
             extras: base.Extras,
-    ) -> typing.Optional[base.Candidate]:
+    ) -> base.Candidate:
         #
-        candidate = None
+        candidate_key = (indexed_link.uri_str, frozenset(extras))
+        candidate = self._candidates.get(candidate_key)
         #
-        if not distribution_link.yanked[0]:
-            if not self._is_link_python_incompatible(distribution_link):
-                distribution_url = distribution_link.url
-                candidate = (
-                    self._make_candidate_from_url(distribution_url, extras)
+        if candidate is None:
+            candidate_maker = indexed_link.candidate_maker
+            candidate = candidate_maker.make_from_parser_result(
+                self._registry,
+                indexed_link.uri_str,
+                indexed_link.parser_result,
+                extras,
+                False,  # is_direct
+            )
+            if isinstance(candidate, distribution.DistFileCandidate):
+                candidate.hashes = indexed_link.hashes
+                candidate.core_metadata_hashes = (
+                    indexed_link.core_metadata_hashes
                 )
+            self._candidates[candidate_key] = candidate
         #
         return candidate
 
-    def _make_candidate_from_url(
+    def _make_version_index(
             self,
-            distribution_url: str,
-            extras: base.Extras,
-    ) -> typing.Optional[base.Candidate]:
+            project_key: base.ProjectKey,
+    ) -> versions.VersionIndex[_IndexedLink]:
+        #
+        links = self._get_links(f'{project_key}/')
+        #
+        indexed_links = []
+        for link in links:
+            indexed_link = self._parse_link(link)
+            if indexed_link:
+                release_version = indexed_link.parser_result.release_version
+                indexed_links.append((release_version, indexed_link))
+        #
+        version_index = versions.VersionIndex(indexed_links)
+        #
+        return version_index
+
+    def _get_links(
+            self,
+            project_path: str,
+    ) -> typing.List[Link]:
+        """Get links from project page, shared with the derived registries."""
+        #
+        links_cache = self._registry.get_memory_cache('index_links')
+        links_key = (tuple(self._base_urls), project_path)
+        links: typing.Optional[typing.List[Link]] = links_cache.get(links_key)
+        #
+        if links is None:
+            try:
+                project_page = self._get_project_page(project_path)
+            except (CanNotFetchProjectPage, network.CanNotUseNetworkOffline):
+                if not self._registry.services.http_session.is_offline:
+                    raise
+                links = []
+            else:
+                links = parse_links(project_page)
+            links_cache[links_key] = links
+        #
+        return links
+
+    def _get_project_page(self, project_path: str) -> network.Page:
+        #
+        if len(self._base_urls) > 1:
+            project_page = self._race_mirrors(project_path)
+        else:
+            project_page = self._registry.services.index_page_cache.get(
+                self._base_urls[0] + project_path,
+                {'Accept': ACCEPT_HEADER},
+            )
+        #
+        return project_page
+
+    def _race_mirrors(self, project_path: str) -> network.Page:
+        """Get project page from the fastest healthy mirror."""
+        #
+        breakers = self._registry.get_memory_cache('circuit_breakers')
+        mirrors = [
+            (
+                base_url + project_path,
+                breakers.setdefault(base_url, network.CircuitBreaker()),
+            )
+            for base_url in self._base_urls
+        ]
+        # If all the mirrors are failing, try them all anyway
+        available_mirrors = [
+            mirror for mirror in mirrors if mirror[1].is_closed
+        ] or mirrors
+        #
+        executor = self._registry.get_executor('mirrors')
+        futures = []
+        for project_url, circuit_breaker in available_mirrors:
+            future = executor.submit(
+                _get_mirror_page,
+                self._registry.services.index_page_cache,
+                project_url,
+                circuit_breaker,
+            )
+            futures.append(future)
+        #
+        project_page = None
+        fallback_page = None
+        for future in concurrent.futures.as_completed(futures):
+            # Failures were already logged, by the task of the mirror
+            page = None if future.exception() else future.result()
+            if page is not None and page.status_code == 200:
+                project_page = page
+                break
+            if page is not None and _is_healthy(page):
+                # For example '404', maybe the other mirrors know better
+                fallback_page = fallback_page or page
+        #
+        for future in futures:
+            future.cancel()
         #
-        candidate = None
+        project_page = project_page or fallback_page
+        if project_page is None:
+            raise CanNotFetchProjectPage(project_path)
+        #
+        return project_page
+
+    def _parse_link(
+            self,
+            distribution_link: Link,
+    ) -> typing.Optional[_IndexedLink]:
+        #
+        indexed_link = None
+        #
+        # Cheap checks first, most links of some projects are for wheels of
+        # other platforms
+        is_plausible = (
+            not distribution_link.is_yanked
+            and
+            not self._is_link_python_incompatible(distribution_link)
+            and
+            wheel.is_file_name_compatible(
+                distribution_link.filename,
+                self._tags_lookup,
+            )
+        )
+        #
+        if is_plausible:
+            indexed_link = self._parse_url(distribution_link)
+        #
+        return indexed_link
+
+    def _parse_url(
+            self,
+            distribution_link: Link,
+    ) -> typing.Optional[_IndexedLink]:
+        #
+        indexed_link = None
+        #
+        distribution_url = distribution_link.url
         #
         for candidate_maker in self._registry.direct_uri_candidate_makers:
-            candidate = candidate_maker.make_from_uri(
+            parser_result = candidate_maker.parse_uri(
                 self._registry,
                 distribution_url,
-                extras,
-                False,  # is_direct
             )
-            if candidate:
+            if parser_result:
+                indexed_link = _IndexedLink(
+                    candidate_maker,
+                    distribution_url,
+                    parser_result,
+                    distribution_link.hashes,
+                    distribution_link.core_metadata_hashes,
+                )
                 break
         #
-        return candidate
+        return indexed_link
 
     def _is_link_python_incompatible(
             self,
-            distribution_link: mousebender.simple.ArchiveLink,
+            distribution_link: Link,
     ) -> bool:
         """Check if link advertises itself as incompatible with this Python."""
         #
-        env_python_version = self._registry.environment.python_version
         link_python_specifier = distribution_link.requires_python
         #
-        is_incompatible = (env_python_version not in link_python_specifier)
+        # The same few values repeat in a page
+        is_incompatible = (
+            self._python_incompatibilities.get(link_python_specifier)
+        )
+        if is_incompatible is None:
+            env_python_version = self._registry.environment.python_version
+            is_incompatible = env_python_version not in link_python_specifier
+            self._python_incompatibilities[link_python_specifier] = (
+                is_incompatible
+            )
         #
         return is_incompatible
 
 
+def _normalize_base_url(base_url: str) -> str:
+    #
+    normalized_base_url = base_url
+    #
+    if not normalized_base_url.endswith('/'):
+        normalized_base_url += '/'
+    #
+    return normalized_base_url
+
+
+def _is_healthy(page: network.Page) -> bool:
+    is_healthy = page.status_code < 500
+    return is_healthy
+
+
+def _get_mirror_page(
+        page_cache: network.PageCache,
+        project_url: str,
+        circuit_breaker: network.CircuitBreaker,
+) -> network.Page:
+    """Get project page from a mirror, and record the health of the mirror."""
+    #
+    try:
+        page = page_cache.get(project_url, {'Accept': ACCEPT_HEADER})
+    except BaseException as exception:
+        LOGGER.warning("Mirror failed: %r", exception)
+        circuit_breaker.record_failure()
+        raise
+    #
+    if _is_healthy(page):
+        circuit_breaker.record_success()
+    else:
+        circuit_breaker.record_failure()
+    #
+    return page
+
+
+def make_index_finders(
+        registry: base.Registry,
+) -> typing.List[SimpleIndexFinder]:
+    """Make a finder for each of the configured indexes, by priority."""
+    #
+    indexes = sorted(
+        registry.services.http_session.settings.indexes,
+        key=operator.attrgetter('priority'),
+    )
+    finders = [
+        SimpleIndexFinder(registry, index.urls[0], index.urls[1:])
+        for index in indexes
+        if index.urls
+    ]
+    #
+    return finders
+
+
+@functools.lru_cache(maxsize=None)
+def _parse_requires_python(
+        requires_python_str: str,
+) -> packaging.specifiers.SpecifierSet:
+    """Parse 'Requires-Python', the same few values repeat in a page."""
+    #
+    try:
+        specifier_set = packaging.specifiers.SpecifierSet(requires_python_str)
+    except packaging.specifiers.InvalidSpecifier:
+        LOGGER.warning("Ignoring invalid '%s'", requires_python_str)
+        specifier_set = packaging.specifiers.SpecifierSet()
+    #
+    return specifier_set
+
+
+def _parse_hash(hash_str: str) -> typing.Dict[str, str]:
+    """Parse hash such as 'sha256=abc', maybe empty."""
+    hash_name, _, hash_value = hash_str.partition('=')
+    hashes = {hash_name.lower(): hash_value} if hash_value else {}
+    return hashes
+
+
+def _parse_html_core_metadata(
+        attributes: typing.Dict[str, typing.Optional[str]],
+) -> typing.Optional[typing.Dict[str, str]]:
+    #
+    core_metadata_hashes = None
+    #
+    # The older name of the attribute is still in use
+    for attribute_name in ('data-core-metadata', 'data-dist-info-metadata'):
+        if attribute_name in attributes:
+            attribute_value = attributes[attribute_name] or ''
+            if attribute_value != 'false':
+                core_metadata_hashes = _parse_hash(attribute_value)
+            break
+    #
+    return core_metadata_hashes
+
+
+class _HtmlLinksParser(html.parser.HTMLParser):
+    """Parse the anchors of a PEP503 HTML project page."""
+
+    def __init__(self, page_url: str) -> None:
+        """Initialize."""
+        super().__init__()
+        self._page_url = page_url
+        #
+        self.links: typing.List[Link] = []
+
+    def handle_starttag(
+            self,
+            tag: str,
+            attrs: typing.List[typing.Tuple[str, typing.Optional[str]]],
+    ) -> None:
+        """Override."""
+        #
+        attributes = dict(attrs)
+        href = attributes.get('href')
+        #
+        if tag == 'a' and href:
+            # Links might be relative to the project page
+            url_parts = urllib.parse.urlsplit(
+                urllib.parse.urljoin(self._page_url, href),
+            )
+            file_name = urllib.parse.unquote(url_parts.path.rpartition('/')[2])
+            link = Link(
+                file_name,
+                urllib.parse.urlunsplit((*url_parts[:4], '')),
+                _parse_hash(url_parts.fragment),
+                _parse_requires_python(
+                    attributes.get('data-requires-python') or '',
+                ),
+                'data-yanked' in attributes,
+                _parse_html_core_metadata(attributes),
+            )
+            self.links.append(link)
+
+
+def parse_html_links(page_url: str, content: bytes) -> typing.List[Link]:
+    """Parse links from a PEP503 HTML project page."""
+    #
+    parser = _HtmlLinksParser(page_url)
+    parser.feed(content.decode())
+    parser.close()
+    #
+    return parser.links
+
+
+def _parse_json_core_metadata(
+        file_details: typing.Dict[str, typing.Any],
+) -> typing.Optional[typing.Dict[str, str]]:
+    #
+    core_metadata_hashes = None
+    #
+    # The older name of the key is still in use
+    core_metadata = file_details.get(
+        'core-metadata',
+        file_details.get('dist-info-metadata', False),
+    )
+    if isinstance(core_metadata, dict):
+        core_metadata_hashes = dict(core_metadata)
+    elif core_metadata:
+        core_metadata_hashes = {}
+    #
+    return core_metadata_hashes
+
+
+def parse_json_links(page_url: str, content: bytes) -> typing.List[Link]:
+    """Parse links from a PEP691 JSON project page."""
+    #
+    links = []
+    #
+    project_details = json.loads(content)
+    for file_details in project_details['files']:
+        url_parts = urllib.parse.urlsplit(
+            urllib.parse.urljoin(page_url, file_details['url']),
+        )
+        link = Link(
+            file_details['filename'],
+            urllib.parse.urlunsplit((*url_parts[:4], '')),
+            dict(file_details.get('hashes', {})),
+            _parse_requires_python(file_details.get('requires-python') or ''),
+            file_details.get('yanked', False) is not False,
+            _parse_json_core_metadata(file_details),
+        )
+        links.append(link)
+    #
+    return links
+
+
+def parse_links(page: network.Page) -> typing.List[Link]:
+    """Parse links from a project page, according to its content type."""
+    #
+    content_type = page.content_type.split(';')[0].strip()
+    #
+    if content_type == JSON_CONTENT_TYPE:
+        links = parse_json_links(page.url, page.content)
+    else:
+        links = parse_html_links(page.url, page.content)
+    #
+    return links
+
+
 # EOF
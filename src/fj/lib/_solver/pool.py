@@ -10,9 +10,13 @@ import importlib.metadata
 import packaging
 
 from .. import base
+from . import versions
 
 if typing.TYPE_CHECKING:
     import pathlib
+    #
+    _Release = typing.Tuple[base.Version, importlib.metadata.Distribution]
+    _VersionIndex = versions.VersionIndex[importlib.metadata.Distribution]
 
 
 class _PoolCandidate(base.BaseCandidate):
@@ -96,11 +100,16 @@ class PoolCandidateFinder(
 ):  # pylint: disable=too-few-public-methods
     """Find candidates in the pool."""
 
+    is_concurrency_safe = True
+    yields_sorted_candidates = True
+
     def __init__(self, registry: base.Registry) -> None:
         """Initialize."""
         self._registry = registry
         #
-        self._pool_distributions = find_distributions(self._registry)
+        self._version_indexes = _make_version_indexes(
+            find_distributions(self._registry),
+        )
 
     def find_candidates(
             self,
@@ -110,19 +119,40 @@ class PoolCandidateFinder(
     ) -> typing.Iterator[base.Candidate]:
         """Implement abstract."""
         #
-        for distribution in self._pool_distributions:
-            distribution_name = distribution.metadata['Name']
-            distribution_key = (
-                packaging.utils.canonicalize_name(distribution_name)
-            )
-            if distribution_key == project_key:
-                candidate = _PoolCandidate(distribution, extras)
-                is_compatible = candidate.is_compatible(
-                    requirements,
-                    self._registry.environment,
-                )
-                if is_compatible:
-                    yield candidate
+        version_index = self._version_indexes.get(project_key)
+        if version_index:
+            for _, distributions in version_index.find(requirements):
+                for distribution in distributions:
+                    candidate = _PoolCandidate(distribution, extras)
+                    is_compatible = candidate.is_compatible(
+                        requirements,
+                        self._registry.environment,
+                    )
+                    if is_compatible:
+                        yield candidate
+
+
+def _make_version_indexes(
+        distributions: typing.Iterable[importlib.metadata.Distribution],
+) -> typing.Dict[base.ProjectKey, _VersionIndex]:
+    #
+    releases: typing.Dict[base.ProjectKey, typing.List[_Release]] = {}
+    #
+    for distribution in distributions:
+        project_key = base.get_project_key(distribution.metadata['Name'])
+        release_version = (
+            packaging.version.Version(distribution.metadata['Version'])
+        )
+        releases.setdefault(project_key, []).append(
+            (release_version, distribution),
+        )
+    #
+    version_indexes = {
+        project_key: versions.VersionIndex(project_releases)
+        for project_key, project_releases in releases.items()
+    }
+    #
+    return version_indexes
 
 
 # EOF
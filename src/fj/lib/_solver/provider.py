@@ -4,14 +4,25 @@
 
 from __future__ import annotations
 
+import logging
 import operator
 import typing
 
-import packaging.utils
 import resolvelib
 
+from .. import base
+
 if typing.TYPE_CHECKING:
-    from .. import base
+    import concurrent.futures
+    #
+    _Future = concurrent.futures.Future[typing.List[base.Candidate]]
+    # Candidates found, and the direct candidate that stopped the search
+    _Matches = typing.Tuple[
+        typing.List[base.Candidate],
+        typing.Optional[base.Candidate],
+    ]
+
+LOGGER = logging.getLogger(__name__)
 
 
 class Provider(resolvelib.providers.AbstractProvider):  # type: ignore[misc]
@@ -24,7 +35,7 @@ class Provider(resolvelib.providers.AbstractProvider):  # type: ignore[misc]
             skip_dependencies: bool,
     ):
         """Initialize."""
-        self._candidates_finders = candidates_finders
+        self._candidates_finders = list(candidates_finders)
         self._registry = registry
         self._skip_dependencies = skip_dependencies
 
@@ -33,7 +44,7 @@ class Provider(resolvelib.providers.AbstractProvider):  # type: ignore[misc]
             dependency: base.Requirement,
     ) -> base.ProjectKey:
         """Implement abstract."""
-        project_key = packaging.utils.canonicalize_name(dependency.name)
+        project_key = base.get_project_key(dependency.name)
         return project_key
 
     def find_matches(
@@ -48,43 +59,88 @@ class Provider(resolvelib.providers.AbstractProvider):  # type: ignore[misc]
         from a remote index.
         If it can be assumed that the finders are already sorted by order of
         priority, then that job is easy.
+        The finders placed before the first one that is safe to run
+        concurrently (for example the one for direct requirements) run first,
+        so that the others are not started at all if one of them finds a
+        direct candidate. Then the finders that are safe to run concurrently
+        are dispatched, so that they overlap with each other and with the
+        other finders, but their results are still merged in order of
+        priority.
         """
         #
-        matches = []
-        #
         # All requirements are guaranteed to have the same key but might have
         # different specifiers.
-        project_key = packaging.utils.canonicalize_name(requirements[0].name)
+        project_key = base.get_project_key(requirements[0].name)
         #
         extras = set()
         for requirement in requirements:
             extras.update(requirement.extras)
         #
-        for candidates_finder in self._candidates_finders:
-            unsorted_candidates = candidates_finder.find_candidates(
+        split_index = len(self._candidates_finders)
+        for index, candidates_finder in enumerate(self._candidates_finders):
+            if candidates_finder.is_concurrency_safe:
+                split_index = index
+                break
+        first_finders = self._candidates_finders[:split_index]
+        other_finders = self._candidates_finders[split_index:]
+        #
+        matches, direct_candidate = _find_candidates_in_order(
+            first_finders,
+            {},
+            project_key,
+            requirements,
+            extras,
+        )
+        if direct_candidate is None:
+            futures = self._dispatch_finders(
+                other_finders,
                 project_key,
                 requirements,
                 extras,
             )
-            if unsorted_candidates:
-                candidates = sorted(
-                    unsorted_candidates,
-                    key=operator.attrgetter('release_version'),
-                    reverse=True,
+            try:
+                other_matches, direct_candidate = _find_candidates_in_order(
+                    other_finders,
+                    futures,
+                    project_key,
+                    requirements,
+                    extras,
                 )
-                direct_candidate = None
-                for candidate in candidates:
-                    if candidate.is_direct:
-                        direct_candidate = candidate
-                        break
-                if not direct_candidate:
-                    matches.extend(candidates)
-                else:
-                    matches = [direct_candidate]
-                    break
+            finally:
+                _settle_futures(futures)
+            matches.extend(other_matches)
+        #
+        if direct_candidate is not None:
+            matches = [direct_candidate]
         #
         return matches
 
+    def _dispatch_finders(
+            self,
+            candidates_finders: typing.Sequence[base.CandidateFinder],
+            project_key: base.ProjectKey,
+            requirements: typing.Sequence[base.Requirement],
+            extras: base.Extras,
+    ) -> typing.Dict[int, _Future]:
+        """Start the finders that are safe to run concurrently."""
+        #
+        futures = {}
+        #
+        if len(candidates_finders) > 1:
+            executor = self._registry.get_executor('finders')
+            for candidates_finder in candidates_finders:
+                if candidates_finder.is_concurrency_safe:
+                    future = executor.submit(
+                        _find_candidates,
+                        candidates_finder,
+                        project_key,
+                        requirements,
+                        extras,
+                    )
+                    futures[id(candidates_finder)] = future
+        #
+        return futures
+
     def get_preference(
             self,
             resolution: typing.Optional[base.Candidate],
@@ -103,7 +159,15 @@ class Provider(resolvelib.providers.AbstractProvider):  # type: ignore[misc]
         #
         dependencies = []
         if not self._skip_dependencies:
-            dependencies = candidate.dependencies
+            dependencies = [
+                requirement
+                for requirement in candidate.dependencies
+                if base.is_requirement_applicable(
+                    requirement,
+                    candidate.extras,
+                    self._registry.environment,
+                )
+            ]
         #
         return dependencies
 
@@ -117,7 +181,7 @@ class Provider(resolvelib.providers.AbstractProvider):  # type: ignore[misc]
         # Aren't matched candidates already supposed to have been checked and
         # filtered? Is that redundant? Should we always return true?
         #
-        project_key = packaging.utils.canonicalize_name(requirement.name)
+        project_key = base.get_project_key(requirement.name)
         is_satisfied = (
             candidate.project_key == project_key
             and candidate.release_version in requirement.specifier
@@ -125,4 +189,78 @@ class Provider(resolvelib.providers.AbstractProvider):  # type: ignore[misc]
         return is_satisfied
 
 
+def _find_candidates_in_order(
+        candidates_finders: typing.Iterable[base.CandidateFinder],
+        futures: typing.Dict[int, _Future],
+        project_key: base.ProjectKey,
+        requirements: typing.Sequence[base.Requirement],
+        extras: base.Extras,
+) -> _Matches:
+    """Merge candidates of the finders, until a direct candidate is found.
+
+    The results of the finders already dispatched are taken from their
+    futures, which are removed from the mapping once consumed.
+    """
+    #
+    matches = []
+    direct_candidate = None
+    #
+    for candidates_finder in candidates_finders:
+        future = futures.pop(id(candidates_finder), None)
+        if future:
+            unsorted_candidates = future.result()
+        else:
+            unsorted_candidates = _find_candidates(
+                candidates_finder,
+                project_key,
+                requirements,
+                extras,
+            )
+        if candidates_finder.yields_sorted_candidates:
+            candidates = unsorted_candidates
+        else:
+            candidates = sorted(
+                unsorted_candidates,
+                key=operator.attrgetter('release_version'),
+                reverse=True,
+            )
+        for candidate in candidates:
+            if candidate.is_direct:
+                direct_candidate = candidate
+                break
+        if direct_candidate is not None:
+            break
+        matches.extend(candidates)
+    #
+    return (matches, direct_candidate)
+
+
+def _settle_futures(futures: typing.Dict[int, _Future]) -> None:
+    """Cancel finders whose results are not needed, wait for the others.
+
+    So that no finder is still running when it is called again, and so that
+    their errors are not lost.
+    """
+    for future in futures.values():
+        if not future.cancel():
+            exception = future.exception()
+            if exception is not None:
+                LOGGER.warning(
+                    "Ignoring error of unneeded finder: %r",
+                    exception,
+                )
+
+
+def _find_candidates(
+        candidates_finder: base.CandidateFinder,
+        project_key: base.ProjectKey,
+        requirements: typing.Sequence[base.Requirement],
+        extras: base.Extras,
+) -> typing.List[base.Candidate]:
+    candidates = list(
+        candidates_finder.find_candidates(project_key, requirements, extras),
+    )
+    return candidates
+
+
 # EOF
@@ -0,0 +1,204 @@
+#
+
+"""Index of the releases of a project, sorted by version."""
+
+from __future__ import annotations
+
+import bisect
+import functools
+import typing
+
+import packaging.specifiers
+import packaging.version
+
+if typing.TYPE_CHECKING:
+    from .. import base
+    #
+    _Bound = typing.Optional[base.Version]
+    _Range = typing.Tuple[_Bound, _Bound, bool]
+
+T = typing.TypeVar('T')
+
+
+def _make_dev_version(
+        epoch: int,
+        release: typing.Sequence[int],
+) -> base.Version:
+    """Make the lowest possible version for this release segment."""
+    epoch_str = f'{epoch}!' if epoch else ''
+    release_str = '.'.join(str(part) for part in release)
+    version = packaging.version.Version(f'{epoch_str}{release_str}.dev0')
+    return version
+
+
+def _parse_version(version_str: str) -> typing.Optional[base.Version]:
+    """Parse version, 'None' if invalid."""
+    #
+    try:
+        version = packaging.version.Version(version_str)
+    except packaging.version.InvalidVersion:
+        version = None
+    #
+    return version
+
+
+def _get_prefix_range(prefix: base.Version) -> _Range:
+    """Get range of versions matching a prefix, as in '== 1.2.*'."""
+    #
+    lower = None
+    upper = None
+    #
+    if prefix.public == prefix.base_version:
+        lower = _make_dev_version(prefix.epoch, prefix.release)
+        upper_release = prefix.release[:-1] + (prefix.release[-1] + 1, )
+        upper = _make_dev_version(prefix.epoch, upper_release)
+    #
+    return lower, upper, False
+
+
+@functools.lru_cache(maxsize=None)
+def _get_specifier_range(
+        specifier: packaging.specifiers.Specifier,
+) -> _Range:
+    """Get the range of public versions that might match the specifier.
+
+    The range is a superset, and it is expected that versions in the range
+    are still checked against the specifier. Bounds are compared against the
+    public part of the versions, since most operators ignore the local part.
+    An invalid version gives an unbounded range.
+    """
+    #
+    lower = None
+    upper = None
+    upper_inclusive = True
+    #
+    operator = specifier.operator
+    version_str = specifier.version
+    #
+    is_prefix = operator == '==' and version_str.endswith('.*')
+    is_bounded = operator in ('==', '~=', '>=', '>', '<=', '<')
+    version = _parse_version(version_str[:-2] if is_prefix else version_str)
+    #
+    if version is not None and is_prefix:
+        lower, upper, upper_inclusive = _get_prefix_range(version)
+    elif version is not None and is_bounded:
+        public_version = packaging.version.Version(version.public)
+        if operator in ('==', '~=', '>=', '>'):
+            lower = public_version
+        if operator in ('==', '<=', '<'):
+            upper = public_version
+        if operator == '~=' and len(version.release) > 1:
+            upper_release = version.release[:-2] + (version.release[-2] + 1, )
+            upper = _make_dev_version(version.epoch, upper_release)
+            upper_inclusive = False
+    #
+    return lower, upper, upper_inclusive
+
+
+class VersionIndex(typing.Generic[T]):
+    """Releases of a project, presorted by version.
+
+    Specifiers are compiled into ranges of versions, so that the releases
+    to check are first narrowed down with a binary search. The matches are
+    memorized for each combination of specifiers.
+    """
+
+    def __init__(
+            self,
+            items: typing.Iterable[typing.Tuple[base.Version, T]],
+    ) -> None:
+        """Initialize."""
+        #
+        releases: typing.Dict[base.Version, typing.List[T]] = {}
+        for version, item in items:
+            releases.setdefault(version, []).append(item)
+        #
+        self._versions = sorted(releases)
+        self._public_versions = [
+            packaging.version.Version(version.public)
+            if version.local
+            else version
+            for version in self._versions
+        ]
+        self._releases = [releases[version] for version in self._versions]
+        #
+        self._matches: typing.Dict[
+            typing.Tuple[str, ...],
+            typing.List[int],
+        ] = {}
+
+    def __len__(self) -> int:
+        """Get the count of release versions."""
+        return len(self._versions)
+
+    def find(
+            self,
+            requirements: typing.Iterable[base.Requirement],
+    ) -> typing.Iterator[typing.Tuple[base.Version, typing.List[T]]]:
+        """Find releases matching all requirements, latest version first."""
+        #
+        specifier_sets = [
+            requirement.specifier for requirement in requirements
+        ]
+        matches_key = tuple(sorted(str(item) for item in specifier_sets))
+        #
+        matches = self._matches.get(matches_key)
+        if matches is None:
+            matches = self._find_matches(specifier_sets)
+            self._matches[matches_key] = matches
+        #
+        for index in matches:
+            yield self._versions[index], self._releases[index]
+
+    def _find_matches(
+            self,
+            specifier_sets: typing.Sequence[packaging.specifiers.SpecifierSet],
+    ) -> typing.List[int]:
+        #
+        matches = []
+        #
+        start, stop = self._narrow(specifier_sets)
+        for index in range(stop - 1, start - 1, -1):
+            version = self._versions[index]
+            for specifier_set in specifier_sets:
+                if version not in specifier_set:
+                    break
+            else:
+                matches.append(index)
+        #
+        return matches
+
+    def _narrow(
+            self,
+            specifier_sets: typing.Iterable[packaging.specifiers.SpecifierSet],
+    ) -> typing.Tuple[int, int]:
+        """Narrow down the slice of versions with a binary search."""
+        #
+        start = 0
+        stop = len(self._versions)
+        #
+        for specifier_set in specifier_sets:
+            for specifier in specifier_set:
+                lower, upper, upper_inclusive = (
+                    _get_specifier_range(specifier)
+                )
+                if lower is not None:
+                    start = max(
+                        start,
+                        bisect.bisect_left(self._public_versions, lower),
+                    )
+                if upper is not None:
+                    if upper_inclusive:
+                        upper_index = (
+                            bisect.bisect_right(self._public_versions, upper)
+                        )
+                    else:
+                        upper_index = (
+                            bisect.bisect_left(self._public_versions, upper)
+                        )
+                    stop = min(stop, upper_index)
+        #
+        return start, max(start, stop)
+
+
+# EOF
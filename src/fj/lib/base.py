@@ -5,8 +5,11 @@
 from __future__ import annotations
 
 import abc
+import concurrent.futures
 import contextlib
+import copy
 import dataclasses
+import functools
 import pathlib
 import platform
 import sys
@@ -16,16 +19,23 @@ import typing
 import urllib
 
 import appdirs
+import packaging.markers
 import packaging.requirements
 import packaging.tags
 import packaging.utils
 import packaging.version
 
+from . import cache
+from . import network
+
 if typing.TYPE_CHECKING:
     import email
     #
+    from . import profiling
+    #
     Extra = str
     Extras = typing.Set[Extra]
+    MemoryCache = typing.Dict[typing.Any, typing.Any]
     Metadata = email.message.EmailMessage
     ProjectKey = packaging.utils.NormalizedName
     Tags = typing.FrozenSet[packaging.tags.Tag]
@@ -33,16 +43,127 @@ if typing.TYPE_CHECKING:
     Requirement = packaging.requirements.Requirement
 
 
+@dataclasses.dataclass
+class InstallDestination:
+    """Where the distributions get installed in an environment."""
+
+    purelib_dir_path: pathlib.Path
+    #
+    # Directory for the scripts of the distributions installed in the
+    # 'purelib' directory, if anything is to be installed there.
+    scripts_dir_path: typing.Optional[pathlib.Path] = None
+    #
+    # Interpreter of the environment, for the scripts installed there.
+    python_executable_path: typing.Optional[pathlib.Path] = None
+
+
 @dataclasses.dataclass
 class Environment:
     """Environment information."""
 
-    purelib_dir_path: pathlib.Path
+    install_destination: InstallDestination
     python_implementation_str: str
     python_processor_str: str
     python_version: Version
     search_path: typing.List[str]
     tags: Tags
+    #
+    # Values for the evaluation of markers, overriding the ones guessed from
+    # the current interpreter and the other fields.
+    marker_environment: typing.Dict[str, str] = (
+        dataclasses.field(default_factory=dict)
+    )
+
+    @property
+    def purelib_dir_path(self) -> pathlib.Path:
+        """Path to the 'purelib' directory."""
+        return self.install_destination.purelib_dir_path
+
+
+def get_marker_environment(environment: Environment) -> typing.Dict[str, str]:
+    """Get values for the evaluation of markers in the environment."""
+    #
+    python_version = environment.python_version
+    #
+    marker_environment = {
+        key: str(value)
+        for key, value in packaging.markers.default_environment().items()
+    }
+    marker_environment.update(
+        {
+            'implementation_name': (
+                environment.python_implementation_str.lower()
+            ),
+            'platform_python_implementation': (
+                environment.python_implementation_str
+            ),
+            'python_full_version': str(python_version),
+            'python_version': f'{python_version.major}.{python_version.minor}',
+        },
+    )
+    marker_environment.update(environment.marker_environment)
+    #
+    return marker_environment
+
+
+def is_requirement_applicable(
+        requirement: Requirement,
+        extras: Extras,
+        environment: Environment,
+) -> bool:
+    """Check if requirement's marker applies to the extras and environment."""
+    #
+    is_applicable = True
+    #
+    if requirement.marker is not None:
+        is_applicable = False
+        marker_environment = get_marker_environment(environment)
+        for extra in (extras or {''}):
+            marker_environment['extra'] = extra
+            if requirement.marker.evaluate(marker_environment):
+                is_applicable = True
+                break
+    #
+    return is_applicable
+
+
+class Services:  # pylint: disable=too-few-public-methods
+    """Network and cache services, shared with the derived registries."""
+
+    def __init__(
+            self,
+            registry: Registry,
+            network_settings: typing.Optional[network.NetworkSettings],
+    ) -> None:
+        """Initialize."""
+        self.cache_stats = cache.CacheStats(
+            registry.get_cache_stats_file_path(),
+        )
+        self.distribution_cache = cache.DistributionCache(
+            registry.get_distributions_cache_dir_path(),
+        )
+        self.http_session = network.HttpSession(network_settings)
+        self.index_page_cache = network.PageCache(
+            registry.get_index_cache_dir_path(),
+            self.http_session,
+            self.cache_stats,
+        )
+        self.solve_profile: typing.Optional[profiling.SolveProfile] = None
+        #
+        self.executors: typing.Dict[
+            str,
+            concurrent.futures.ThreadPoolExecutor,
+        ] = {}
+        self.memory_caches: typing.Dict[str, MemoryCache] = {}
+
+    def close(self) -> None:
+        """Release resources, for example wait for the executors."""
+        for executor in self.executors.values():
+            executor.shutdown()
+        self.executors.clear()
+        self.index_page_cache.close()
+        self.http_session.close()
+        self.cache_stats.close()
 
 
 class Registry:
@@ -53,6 +174,7 @@ class Registry:
             application_name: str,
             environment: Environment,
             temp_dir_path: pathlib.Path,
+            network_settings: typing.Optional[network.NetworkSettings] = None,
     ) -> None:
         """Initialize."""
         self._application_name = application_name
@@ -62,12 +184,107 @@ class Registry:
         self.direct_uri_candidate_makers: typing.List[CandidateMaker] = []
         self.installers: typing.List[Installer] = []
         self.wheel_builders: typing.List[WheelBuilder] = []
+        #
+        self.services = Services(self, network_settings)
+
+    @property
+    def application_name(self) -> str:
+        """Name of the application, for example in the 'INSTALLER' files."""
+        return self._application_name
 
     @property
     def environment(self) -> Environment:
         """Environment."""
         return self._environment
 
+    @property
+    def network_bytes_count(self) -> int:
+        """Count of bytes received over the network."""
+        return self.services.http_session.received_bytes_count
+
+    def close(self) -> None:
+        """Release resources, for example wait for the executors."""
+        self.services.close()
+
+    def derive(self, environment: Environment) -> Registry:
+        """Derive a registry for another environment.
+
+        Everything else, including the in-memory caches, is shared with the
+        original registry.
+        """
+        registry = copy.copy(self)
+        registry._environment = environment  # pylint: disable=protected-access
+        return registry
+
+    def get_executor(
+            self,
+            executor_name: str,
+            max_workers: typing.Optional[int] = None,
+    ) -> concurrent.futures.ThreadPoolExecutor:
+        """Get executor, shared with the derived registries.
+
+        Tasks that submit other tasks should use a different executor, so
+        that they can not starve each other. The count of workers is set when
+        the executor is first created.
+        """
+        executors = self.services.executors
+        executor = executors.get(executor_name)
+        if executor is None:
+            thread_name_prefix = f'{self._application_name}-{executor_name}'
+            executor = concurrent.futures.ThreadPoolExecutor(
+                max_workers=max_workers,
+                thread_name_prefix=thread_name_prefix,
+            )
+            executors[executor_name] = executor
+        return executor
+
+    def get_memory_cache(self, cache_name: str) -> MemoryCache:
+        """Get in-memory cache, shared with the derived registries."""
+        return self.services.memory_caches.setdefault(cache_name, {})
+
+    def get_build_environments_cache_dir_path(self) -> pathlib.Path:
+        """Get path to the directory for the cache of build environments.
+
+        Build environments for the interpreter running the builds, the one of
+        this process, whatever the interpreter of the target environment.
+        """
+        interpreter_key = _get_build_interpreter_key()
+        build_environments_cache_dir_path = (
+            self._get_user_cache_dir_path().joinpath(
+                'build-environments',
+                interpreter_key,
+            )
+        )
+        return build_environments_cache_dir_path
+
+    def get_built_wheels_cache_dir_path(self) -> pathlib.Path:
+        """Get path to the directory for the cache of built wheels.
+
+        Wheels built by the current interpreter only.
+        """
+        interpreter_key = _get_interpreter_key(self._environment)
+        built_wheels_cache_dir_path = (
+            self._get_user_cache_dir_path().joinpath(
+                'built-wheels',
+                interpreter_key,
+            )
+        )
+        return built_wheels_cache_dir_path
+
+    def get_cache_stats_file_path(self) -> pathlib.Path:
+        """Get path to the database of the cache statistics."""
+        cache_stats_file_path = (
+            self._get_user_cache_dir_path().joinpath('stats.sqlite3')
+        )
+        return cache_stats_file_path
+
+    def get_core_metadata_cache_dir_path(self) -> pathlib.Path:
+        """Get path to the directory for the cache of metadata files."""
+        core_metadata_cache_dir_path = (
+            self._get_user_cache_dir_path().joinpath('metadata')
+        )
+        return core_metadata_cache_dir_path
+
     def get_distributions_cache_dir_path(self) -> pathlib.Path:
         """Get path to the directory for the cache of distributions."""
         distributions_cache_dir_path = (
@@ -75,6 +292,20 @@ class Registry:
         )
         return distributions_cache_dir_path
 
+    def get_find_links_index_dir_path(self) -> pathlib.Path:
+        """Get path to the directory for the indexes of local directories."""
+        find_links_index_dir_path = (
+            self._get_user_cache_dir_path().joinpath('find-links')
+        )
+        return find_links_index_dir_path
+
+    def get_index_cache_dir_path(self) -> pathlib.Path:
+        """Get path to the directory for the cache of index pages."""
+        index_cache_dir_path = (
+            self._get_user_cache_dir_path().joinpath('index')
+        )
+        return index_cache_dir_path
+
     def get_interpreter_dir_path(self) -> pathlib.Path:
         """Get path to the directory specific to the current interpreter."""
         interpreter_key = _get_interpreter_key(self._environment)
@@ -109,6 +340,7 @@ class Registry:
 def build_registry(
         application_name: str,
         environment: typing.Optional[Environment] = None,
+        network_settings: typing.Optional[network.NetworkSettings] = None,
 ) -> typing.Iterator[Registry]:
     """Build registry as a context manager."""
     #
@@ -117,8 +349,16 @@ def build_registry(
     #
     with tempfile.TemporaryDirectory() as temp_dir_name:
         temp_dir_path = pathlib.Path(temp_dir_name)
-        registry = Registry(application_name, environment, temp_dir_path)
-        yield registry
+        registry = Registry(
+            application_name,
+            environment,
+            temp_dir_path,
+            network_settings,
+        )
+        try:
+            yield registry
+        finally:
+            registry.close()
 
 
 class CanNotReadCandidateMetadata(Exception):
@@ -295,17 +535,13 @@ class BaseCandidate(Candidate, metaclass=abc.ABCMeta):
         return self._release_version
 
     def _get_dependencies(self) -> typing.Iterator[Requirement]:
+        """Get all dependencies, markers are evaluated later."""
         dependencies_: typing.List[str] = (
             self.metadata.get_all('Requires-Dist', [])
         )
         for dependency in dependencies_:
             requirement = packaging.requirements.Requirement(dependency)
-            if requirement.marker is None:
-                yield requirement
-            else:
-                for extra in self.extras:
-                    if requirement.marker.evaluate({'extra': extra}):
-                        yield requirement
+            yield requirement
 
     @abc.abstractmethod
     def _get_metadata(self) -> typing.Optional[Metadata]:
@@ -325,7 +561,7 @@ def is_candidate_requirements_compatible(
     project_key = candidate.project_key
     #
     for requirement in requirements:
-        key = packaging.utils.canonicalize_name(requirement.name)
+        key = get_project_key(requirement.name)
         specifiers = requirement.specifier
         if project_key != key or release_version not in specifiers:
             break
@@ -335,11 +571,25 @@ def is_candidate_requirements_compatible(
     return is_compatible
 
 
+@functools.lru_cache(maxsize=None)
+def get_project_key(project_name: str) -> ProjectKey:
+    """Get the canonical project key for a project name."""
+    return packaging.utils.canonicalize_name(project_name)
+
+
 class CandidateFinder(  # pylint: disable=too-few-public-methods
         metaclass=abc.ABCMeta,
 ):
     """Find candidates for dependency resolution."""
 
+    # Set to true if 'find_candidates' can run in a separate thread,
+    # concurrently with the other finders.
+    is_concurrency_safe = False
+    #
+    # Set to true if the candidates are found already sorted by release
+    # version, latest first, so that there is no need to sort them again.
+    yields_sorted_candidates = False
+
     @abc.abstractmethod
     def find_candidates(
             self,
@@ -370,6 +620,25 @@ class CandidateMaker(
             candidate = cls.make_from_uri(registry, uri_str, extras, True)
         return candidate
 
+    @classmethod
+    def make_from_parser_result(  # pylint: disable=too-many-arguments
+            cls,
+            registry: Registry,
+            uri_str: str,
+            parser_result: CandidateMaker.ParserResult,
+            extras: Extras,
+            is_direct: bool,
+    ) -> Candidate:
+        """Make a candidate for a URI that has already been parsed."""
+        candidate = cls._make(
+            registry,
+            uri_str,
+            parser_result,
+            extras,
+            is_direct,
+        )
+        return candidate
+
     @classmethod
     def make_from_uri(
             cls,
@@ -385,7 +654,7 @@ class CandidateMaker(
         parser_result = cls.parse_uri(registry, uri_str)
         #
         if parser_result:
-            candidate = cls._make(
+            candidate = cls.make_from_parser_result(
                 registry,
                 uri_str,
                 parser_result,
@@ -499,6 +768,24 @@ def _get_interpreter_key(environment: Environment) -> str:
     return interpreter_key
 
 
+@functools.lru_cache(maxsize=None)
+def _get_build_interpreter_key() -> str:
+    """Get key of the interpreter of this process, that runs the builds."""
+    #
+    python_version = packaging.version.Version(platform.python_version())
+    interpreter_key = (
+        f'{platform.python_implementation()}'
+        '-'
+        f'{python_version.major}'
+        '.'
+        f'{python_version.minor}'
+        '-'
+        f'{platform.processor()}'
+    )
+    #
+    return interpreter_key
+
+
 def get_pinned_requirement_version_str(
         requirement: Requirement,
 ) -> typing.Optional[str]:
@@ -519,6 +806,7 @@ def _get_current_environment() -> Environment:
     """Get current environment information."""
     #
     purelib_dir_path = pathlib.Path(sysconfig.get_paths()['purelib'])
+    scripts_dir_path = pathlib.Path(sysconfig.get_paths()['scripts'])
     #
     python_implementation_str = platform.python_implementation()
     #
@@ -531,7 +819,11 @@ def _get_current_environment() -> Environment:
     tags = frozenset(packaging.tags.sys_tags())
     #
     environment = Environment(
-        purelib_dir_path,
+        InstallDestination(
+            purelib_dir_path,
+            scripts_dir_path,
+            pathlib.Path(sys.executable),
+        ),
         python_implementation_str,
         python_processor_str,
         python_version,
@@ -0,0 +1,352 @@
+#
+
+"""Build wheels, and cache them."""
+
+from __future__ import annotations
+
+import fnmatch
+import functools
+import hashlib
+import json
+import logging
+import os
+import pathlib
+import tempfile
+import typing
+
+import pep517.wrappers
+
+from . import buildenv
+from . import cache
+from . import network
+from . import wheel
+
+if typing.TYPE_CHECKING:
+    from . import base
+
+LOGGER = logging.getLogger(__name__)
+
+# Directories of tools and outputs of builds, never part of a source tree
+_SOURCE_TREE_IGNORED_NAMES = (
+    '.eggs',
+    '.git',
+    '.hg',
+    '.mypy_cache',
+    '.nox',
+    '.pytest_cache',
+    '.svn',
+    '.tox',
+    '.venv',
+    '__pycache__',
+    '/build/',
+    '/dist/',
+    '*.egg-info',
+    '*.pyc',
+)
+
+
+class CanNotPrepareMetadata(Exception):
+    """Can not prepare metadata."""
+
+
+def get_build_requires(
+        pyproject_toml_content: typing.Optional[bytes],
+) -> typing.List[str]:
+    """Get the build requirements of a project, from its 'pyproject.toml'."""
+    build_system = buildenv.load_build_system(pyproject_toml_content)
+    build_requires = build_system.get(
+        'requires',
+        buildenv.DEFAULT_BUILD_REQUIRES,
+    )
+    return list(build_requires)
+
+
+def _read_ignore_patterns(dir_path: pathlib.Path) -> typing.List[str]:
+    """Read the patterns of the top level '.gitignore' file.
+
+    Negated patterns are not supported, they are skipped.
+    """
+    #
+    patterns = list(_SOURCE_TREE_IGNORED_NAMES)
+    #
+    try:
+        content = dir_path.joinpath('.gitignore').read_text()
+    except (OSError, UnicodeDecodeError):
+        pass
+    else:
+        for line in content.splitlines():
+            pattern = line.strip()
+            if pattern and not pattern.startswith(('#', '!')):
+                patterns.append(pattern)
+    #
+    return patterns
+
+
+def _is_ignored(
+        patterns: typing.Iterable[str],
+        relative_path_str: str,
+        is_dir: bool,
+) -> bool:
+    #
+    is_ignored = False
+    #
+    name = relative_path_str.rpartition('/')[2]
+    for pattern in patterns:
+        if pattern.endswith('/'):
+            if not is_dir:
+                continue
+            pattern = pattern.rstrip('/')
+        if '/' in pattern:
+            is_ignored = fnmatch.fnmatchcase(
+                relative_path_str,
+                pattern.lstrip('/'),
+            )
+        else:
+            is_ignored = fnmatch.fnmatchcase(name, pattern)
+        if is_ignored:
+            break
+    #
+    return is_ignored
+
+
+def hash_source_tree(dir_path: pathlib.Path) -> str:
+    """Hash the paths and contents of the files of a source tree.
+
+    The directories of tools, the outputs of builds, and the files ignored by
+    the top level '.gitignore' file do not count.
+    """
+    #
+    tree_hash = hashlib.sha256()
+    #
+    patterns = _read_ignore_patterns(dir_path)
+    for root, dir_names, file_names in os.walk(dir_path):
+        relative_root_path = pathlib.Path(root).relative_to(dir_path)
+        dir_names[:] = sorted(
+            dir_name for dir_name in dir_names
+            if not _is_ignored(
+                patterns,
+                relative_root_path.joinpath(dir_name).as_posix(),
+                True,
+            )
+        )
+        for file_name in sorted(file_names):
+            relative_path_str = (
+                relative_root_path.joinpath(file_name).as_posix()
+            )
+            if not _is_ignored(patterns, relative_path_str, False):
+                file_hash = hashlib.sha256(
+                    pathlib.Path(root, file_name).read_bytes(),
+                )
+                tree_hash.update(relative_path_str.encode() + b'\0')
+                tree_hash.update(file_hash.digest())
+    #
+    return tree_hash.hexdigest()
+
+
+def get_built_wheel_dir_path(
+        registry: base.Registry,
+        source_hash_str: str,
+        build_requires: typing.Iterable[str],
+) -> pathlib.Path:
+    """Get path to the directory of the cached wheel built from a source.
+
+    The wheel is addressed by the hash of its source, its normalized build
+    requirements, and the tags of the environment.
+    """
+    #
+    key = {
+        'build_requires': buildenv.normalize_requirement_strs(
+            build_requires,
+        ),
+        'source': source_hash_str,
+        'tags': sorted(str(tag) for tag in registry.environment.tags),
+    }
+    key_hash_str = hashlib.sha256(
+        json.dumps(key, sort_keys=True).encode(),
+    ).hexdigest()
+    #
+    built_wheel_dir_path = (
+        registry.get_built_wheels_cache_dir_path().joinpath(key_hash_str)
+    )
+    #
+    return built_wheel_dir_path
+
+
+def get_or_build_wheel(
+        registry: base.Registry,
+        built_wheel_dir_path: pathlib.Path,
+        build: typing.Callable[[pathlib.Path], pathlib.Path],
+) -> pathlib.Path:
+    """Get wheel from the cache, or build it into the given directory.
+
+    The entry is locked while building, so that concurrent processes build
+    each wheel only once. The wheel is built next to the cache entry, then
+    the whole directory is published at once, so that no partial wheel is
+    ever used.
+    """
+    #
+    cache_stats = registry.services.cache_stats
+    #
+    with cache.lock_entry(built_wheel_dir_path.with_suffix('.lock')):
+        wheel_path = _find_built_wheel(built_wheel_dir_path)
+        if wheel_path:
+            LOGGER.info("Using cached wheel '%s'", wheel_path)
+            cache_stats.record_hit('built_wheels')
+        else:
+            cache_stats.record_miss('built_wheels')
+            built_wheel_dir_path.parent.mkdir(parents=True, exist_ok=True)
+            with tempfile.TemporaryDirectory(
+                    dir=built_wheel_dir_path.parent,
+            ) as build_dir_name:
+                wheel_dir_path = pathlib.Path(build_dir_name, 'wheel')
+                wheel_dir_path.mkdir()
+                wheel_path = build(wheel_dir_path)
+                os.replace(wheel_path.parent, built_wheel_dir_path)
+            wheel_path = built_wheel_dir_path.joinpath(wheel_path.name)
+    #
+    return wheel_path
+
+
+def _call_prepare_metadata_hook(
+        registry: base.Registry,
+        source_dir_path: pathlib.Path,
+        metadata_dir_path: pathlib.Path,
+) -> str:
+    #
+    hook_caller = buildenv.make_wheel_hook_caller(registry, source_dir_path)
+    dist_info_dir_name = hook_caller.prepare_metadata_for_build_wheel(
+        str(metadata_dir_path),
+        _allow_fallback=False,
+    )
+    #
+    return typing.cast(str, dist_info_dir_name)
+
+
+def prepare_metadata(
+        registry: base.Registry,
+        source_dir_path: pathlib.Path,
+        metadata_dir_path: pathlib.Path,
+) -> typing.Optional[pathlib.Path]:
+    """Get metadata with the 'prepare_metadata_for_build_wheel' hook.
+
+    Get nothing if the build backend does not have this optional hook.
+    """
+    #
+    metadata_path = None
+    #
+    LOGGER.info("Preparing metadata for '%s'...", source_dir_path)
+    try:
+        dist_info_dir_name = _call_prepare_metadata_hook(
+            registry,
+            source_dir_path,
+            metadata_dir_path,
+        )
+    except pep517.wrappers.HookMissing:
+        LOGGER.info("Build backend can not prepare metadata")
+    except Exception as exc:
+        raise CanNotPrepareMetadata(source_dir_path) from exc
+    else:
+        metadata_path = metadata_dir_path.joinpath(
+            dist_info_dir_name,
+            'METADATA',
+        )
+    #
+    return metadata_path
+
+
+def _get_source_dir_built_wheel_dir_path(
+        registry: base.Registry,
+        source_dir_path: pathlib.Path,
+) -> pathlib.Path:
+    """Get path to the cached wheel, hash the source tree once per run."""
+    #
+    dir_paths_cache = registry.get_memory_cache('source_dir_built_wheels')
+    built_wheel_dir_path: typing.Optional[pathlib.Path] = (
+        dir_paths_cache.get(source_dir_path)
+    )
+    #
+    if built_wheel_dir_path is None:
+        built_wheel_dir_path = get_built_wheel_dir_path(
+            registry,
+            hash_source_tree(source_dir_path),
+            get_build_requires(buildenv.read_pyproject_toml(source_dir_path)),
+        )
+        dir_paths_cache[source_dir_path] = built_wheel_dir_path
+    #
+    return built_wheel_dir_path
+
+
+def get_source_dir_wheel(
+        registry: base.Registry,
+        source_dir_path: pathlib.Path,
+) -> pathlib.Path:
+    """Get wheel for a source directory, built only if its tree changed."""
+    wheel_path = get_or_build_wheel(
+        registry,
+        _get_source_dir_built_wheel_dir_path(registry, source_dir_path),
+        functools.partial(wheel.build_wheel, registry, source_dir_path),
+    )
+    return wheel_path
+
+
+def get_source_dir_metadata(
+        registry: base.Registry,
+        source_dir_path: pathlib.Path,
+) -> typing.Optional[base.Metadata]:
+    """Get metadata for a source directory, without building a wheel.
+
+    The metadata is read from the cached wheel if there is one already,
+    otherwise it is prepared by the build backend and cached next to where
+    the wheel would be. Only if the build backend can not prepare metadata,
+    the wheel gets built.
+    """
+    #
+    metadata = None
+    #
+    cache_stats = registry.services.cache_stats
+    built_wheel_dir_path = _get_source_dir_built_wheel_dir_path(
+        registry,
+        source_dir_path,
+    )
+    metadata_file_path = built_wheel_dir_path.with_suffix('.METADATA')
+    wheel_path = _find_built_wheel(built_wheel_dir_path)
+    #
+    if wheel_path:
+        cache_stats.record_hit('metadata')
+        metadata = wheel.get_metadata(wheel_path)
+    elif metadata_file_path.is_file():
+        cache_stats.record_hit('metadata')
+        metadata = wheel.parse_metadata(metadata_file_path.read_bytes())
+    else:
+        cache_stats.record_miss('metadata')
+        with tempfile.TemporaryDirectory() as metadata_dir_name:
+            prepared_metadata_path = prepare_metadata(
+                registry,
+                source_dir_path,
+                pathlib.Path(metadata_dir_name),
+            )
+            if prepared_metadata_path:
+                content = prepared_metadata_path.read_bytes()
+                metadata_file_path.parent.mkdir(parents=True, exist_ok=True)
+                network.write_file_atomically(metadata_file_path, content)
+                metadata = wheel.parse_metadata(content)
+        if metadata is None:
+            wheel_path = get_source_dir_wheel(registry, source_dir_path)
+            metadata = wheel.get_metadata(wheel_path)
+    #
+    return metadata
+
+
+def _find_built_wheel(
+        dir_path: pathlib.Path,
+) -> typing.Optional[pathlib.Path]:
+    #
+    wheel_path = None
+    #
+    if dir_path.is_dir():
+        wheel_path = next(dir_path.glob('*.whl'), None)
+    #
+    return wheel_path
+
+
+# EOF
@@ -0,0 +1,269 @@
+#
+
+"""Build environments for PEP517 build backends, cached and reused."""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import os
+import pathlib
+import subprocess
+import sys
+import sysconfig
+import tempfile
+import typing
+
+import packaging.requirements
+import packaging.utils
+import pep517.wrappers
+
+if sys.version_info >= (3, 11):
+    import tomllib
+else:
+    import tomli as tomllib
+
+from . import cache
+
+if typing.TYPE_CHECKING:
+    from . import base
+
+LOGGER = logging.getLogger(__name__)
+
+# As assumed by PEP517 and PEP518 without a 'build-system' table
+DEFAULT_BUILD_BACKEND = 'setuptools.build_meta:__legacy__'
+DEFAULT_BUILD_REQUIRES = ('setuptools>=40.8.0', 'wheel')
+
+
+class CanNotInstallBuildRequirements(Exception):
+    """Can not install build requirements."""
+
+
+def load_build_system(
+        pyproject_toml_content: typing.Optional[bytes],
+) -> typing.Dict[str, typing.Any]:
+    """Get the 'build-system' table of a 'pyproject.toml' file."""
+    #
+    build_system: typing.Dict[str, typing.Any] = {}
+    #
+    if pyproject_toml_content is not None:
+        try:
+            pyproject = tomllib.loads(pyproject_toml_content.decode())
+        except (tomllib.TOMLDecodeError, UnicodeDecodeError):
+            LOGGER.warning("Ignoring invalid 'pyproject.toml'")
+        else:
+            build_system = pyproject.get('build-system', {})
+    #
+    return build_system
+
+
+def read_pyproject_toml(
+        source_dir_path: pathlib.Path,
+) -> typing.Optional[bytes]:
+    """Read the 'pyproject.toml' file of a source directory, if any."""
+    #
+    pyproject_toml_content = None
+    #
+    try:
+        pyproject_toml_content = (
+            source_dir_path.joinpath('pyproject.toml').read_bytes()
+        )
+    except FileNotFoundError:
+        pass
+    #
+    return pyproject_toml_content
+
+
+def _normalize_requirement_str(requirement_str: str) -> str:
+    #
+    try:
+        requirement = packaging.requirements.Requirement(requirement_str)
+    except packaging.requirements.InvalidRequirement:
+        normalized_requirement_str = requirement_str.strip()
+    else:
+        requirement.name = packaging.utils.canonicalize_name(requirement.name)
+        normalized_requirement_str = str(requirement)
+    #
+    return normalized_requirement_str
+
+
+def normalize_requirement_strs(
+        requirement_strs: typing.Iterable[str],
+) -> typing.List[str]:
+    """Normalize names of requirements, and sort them, to compare them."""
+    normalized_requirement_strs = sorted(
+        _normalize_requirement_str(requirement_str)
+        for requirement_str in requirement_strs
+    )
+    return normalized_requirement_strs
+
+
+def _get_install_dir_paths(
+        prefix_dir_path: pathlib.Path,
+) -> typing.Tuple[pathlib.Path, typing.List[pathlib.Path]]:
+    """Get the scripts and library directories of an installation prefix."""
+    #
+    install_scheme = 'nt' if os.name == 'nt' else 'posix_prefix'
+    install_dir_paths = {
+        name: pathlib.Path(path_str)
+        for name, path_str in sysconfig.get_paths(
+            install_scheme,
+            vars={
+                'base': str(prefix_dir_path),
+                'platbase': str(prefix_dir_path),
+            },
+        ).items()
+    }
+    #
+    lib_dir_paths = [install_dir_paths['purelib']]
+    if install_dir_paths['platlib'] != install_dir_paths['purelib']:
+        lib_dir_paths.append(install_dir_paths['platlib'])
+    #
+    return (install_dir_paths['scripts'], lib_dir_paths)
+
+
+def _pip_install(
+        prefix_dir_path: pathlib.Path,
+        requirement_strs: typing.Iterable[str],
+) -> None:
+    #
+    command = [
+        sys.executable,
+        '-m',
+        'pip',
+        'install',
+        '--ignore-installed',
+        '--prefix',
+        str(prefix_dir_path),
+        *requirement_strs,
+    ]
+    LOGGER.info("install %s", command)
+    try:
+        subprocess.run(
+            command,
+            check=True,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+        )
+    except subprocess.CalledProcessError as exc:
+        LOGGER.error("%s", exc.output.decode(errors='replace'))
+        raise CanNotInstallBuildRequirements(requirement_strs) from exc
+
+
+def _get_layer(
+        registry: base.Registry,
+        requirement_strs: typing.List[str],
+) -> pathlib.Path:
+    """Get installation prefix of the requirements, install them if needed.
+
+    The layer is locked while installing, so that concurrent processes
+    install each set of requirements only once. The requirements are
+    installed next to the cache entry, then the whole prefix is published at
+    once, so that no partial layer is ever used.
+    """
+    #
+    cache_stats = registry.services.cache_stats
+    #
+    key_hash_str = hashlib.sha256(
+        json.dumps(requirement_strs).encode(),
+    ).hexdigest()
+    layer_dir_path = (
+        registry.get_build_environments_cache_dir_path().joinpath(key_hash_str)
+    )
+    #
+    with cache.lock_entry(layer_dir_path.with_suffix('.lock')):
+        if layer_dir_path.is_dir():
+            LOGGER.info("Using cached build environment '%s'", layer_dir_path)
+            cache_stats.record_hit('build_environments')
+        else:
+            cache_stats.record_miss('build_environments')
+            layer_dir_path.parent.mkdir(parents=True, exist_ok=True)
+            with tempfile.TemporaryDirectory(
+                    dir=layer_dir_path.parent,
+            ) as install_dir_name:
+                prefix_dir_path = pathlib.Path(install_dir_name, 'prefix')
+                _pip_install(prefix_dir_path, requirement_strs)
+                os.replace(prefix_dir_path, layer_dir_path)
+    #
+    return layer_dir_path
+
+
+class BuildEnvironment:
+    """Build environment, made of cached layers of installed requirements.
+
+    Each set of requirements is installed once for each interpreter, in its
+    own installation prefix. The layers are put on the search path of the
+    subprocesses calling the hooks of the build backend, the environment
+    of the current process is left untouched.
+    """
+
+    def __init__(self, registry: base.Registry) -> None:
+        """Initialize."""
+        self._registry = registry
+        self._scripts_dir_paths: typing.List[pathlib.Path] = []
+        self._lib_dir_paths: typing.List[pathlib.Path] = []
+
+    def install(self, requirement_strs: typing.Iterable[str]) -> None:
+        """Add a layer with these requirements, on top of the others."""
+        #
+        requirement_strs = normalize_requirement_strs(requirement_strs)
+        #
+        if requirement_strs:
+            layer_dir_path = _get_layer(self._registry, requirement_strs)
+            scripts_dir_path, lib_dir_paths = (
+                _get_install_dir_paths(layer_dir_path)
+            )
+            self._scripts_dir_paths.insert(0, scripts_dir_path)
+            self._lib_dir_paths[0:0] = lib_dir_paths
+
+    def run_subprocess(
+            self,
+            command: typing.Sequence[str],
+            cwd: typing.Optional[str] = None,
+            extra_environ: typing.Optional[typing.Mapping[str, str]] = None,
+    ) -> None:
+        """Run a subprocess in this environment, for the hook caller."""
+        #
+        environ = dict(extra_environ or {})
+        for name, dir_paths, default in (
+                ('PATH', self._scripts_dir_paths, os.defpath),
+                ('PYTHONPATH', self._lib_dir_paths, None),
+        ):
+            path_strs = [str(dir_path) for dir_path in dir_paths]
+            current_str = os.environ.get(name, default)
+            if current_str:
+                path_strs.append(current_str)
+            environ[name] = os.pathsep.join(path_strs)
+        #
+        pep517.wrappers.default_subprocess_runner(command, cwd, environ)
+
+
+def make_wheel_hook_caller(
+        registry: base.Registry,
+        source_dir_path: pathlib.Path,
+) -> pep517.wrappers.Pep517HookCaller:
+    """Make caller of the hooks of the build backend, to build wheels.
+
+    The static build requirements from 'pyproject.toml' and then the ones
+    the build backend asks for are installed into the build environment.
+    """
+    #
+    build_system = load_build_system(read_pyproject_toml(source_dir_path))
+    #
+    build_environment = BuildEnvironment(registry)
+    hook_caller = pep517.wrappers.Pep517HookCaller(
+        str(source_dir_path),
+        build_system.get('build-backend', DEFAULT_BUILD_BACKEND),
+        build_system.get('backend-path'),
+        runner=build_environment.run_subprocess,
+    )
+    build_environment.install(
+        build_system.get('requires', DEFAULT_BUILD_REQUIRES),
+    )
+    build_environment.install(hook_caller.get_requires_for_build_wheel())
+    #
+    return hook_caller
+
+
+# EOF
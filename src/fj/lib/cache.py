@@ -1,9 +1,19 @@
 #
 
-"""Cache."""
+"""Caches of distribution files, and statistics on their effectiveness."""
 
 from __future__ import annotations
 
+import contextlib
+import dataclasses
+import fnmatch
+import hashlib
+import logging
+import os
+import sqlite3
+import sys
+import threading
+import time
 import typing
 
 if typing.TYPE_CHECKING:
@@ -11,22 +21,634 @@ if typing.TYPE_CHECKING:
     #
     from . import base
 
+if sys.platform == 'win32':
+    import msvcrt  # pylint: disable=import-error
+else:
+    import fcntl
+
+LOGGER = logging.getLogger(__name__)
+
+INDEX_FILE_NAME = 'index.sqlite3'
+
+# Age of the abandoned downloads to remove, unless told otherwise
+STALE_PART_MAX_AGE = 24 * 60 * 60
+
+STATS_CATEGORIES = (
+    'build_environments',
+    'built_wheels',
+    'distributions',
+    'index',
+    'metadata',
+    'pool',
+)
+
+_STATS_SCHEMA = '''
+    CREATE TABLE IF NOT EXISTS counters (
+        day TEXT NOT NULL,
+        command TEXT NOT NULL,
+        category TEXT NOT NULL,
+        hits INTEGER NOT NULL,
+        misses INTEGER NOT NULL,
+        fetched_bytes INTEGER NOT NULL,
+        served_bytes INTEGER NOT NULL,
+        PRIMARY KEY (day, command, category)
+    );
+'''
+
+_SCHEMA = '''
+    CREATE TABLE IF NOT EXISTS entries (
+        url TEXT PRIMARY KEY,
+        file_name TEXT NOT NULL,
+        sha256 TEXT NOT NULL,
+        size INTEGER NOT NULL,
+        created_at REAL NOT NULL,
+        accessed_at REAL NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS entries_sha256 ON entries (sha256);
+    CREATE INDEX IF NOT EXISTS entries_accessed_at ON entries (accessed_at);
+'''
+
+
+def _lock_file_or_raise(file_descriptor: int) -> None:
+    if sys.platform == 'win32':
+        msvcrt.locking(file_descriptor, msvcrt.LK_NBLCK, 1)
+    else:
+        fcntl.flock(file_descriptor, fcntl.LOCK_EX | fcntl.LOCK_NB)
+
+
+def _try_lock_file(file_descriptor: int) -> bool:
+    try:
+        _lock_file_or_raise(file_descriptor)
+    except OSError:
+        is_locked = False
+    else:
+        is_locked = True
+    return is_locked
+
+
+def _lock_file(file_descriptor: int) -> None:
+    if sys.platform == 'win32':
+        # 'LK_LOCK' gives up after 10 seconds, so keep trying
+        while not _try_lock_file(file_descriptor):
+            time.sleep(0.1)
+    else:
+        fcntl.flock(file_descriptor, fcntl.LOCK_EX)
+
+
+def _unlock_file(file_descriptor: int) -> None:
+    if sys.platform == 'win32':
+        msvcrt.locking(file_descriptor, msvcrt.LK_UNLCK, 1)
+    else:
+        fcntl.flock(file_descriptor, fcntl.LOCK_UN)
+
+
+@contextlib.contextmanager
+def lock_entry(lock_path: pathlib.Path) -> typing.Iterator[None]:
+    """Hold an exclusive lock on an entry of a cache, across processes.
+
+    So that when several processes need the same entry at the same time,
+    only one of them downloads or builds it, and the others wait for it.
+    Lock files are left in place, removing them could let two processes
+    hold a lock on two different files of the same name.
+    """
+    lock_path.parent.mkdir(parents=True, exist_ok=True)
+    with open(lock_path, 'wb') as lock_file:
+        file_descriptor = lock_file.fileno()
+        if not _try_lock_file(file_descriptor):
+            LOGGER.info("Waiting for lock on '%s'", lock_path)
+            _lock_file(file_descriptor)
+        try:
+            yield
+        finally:
+            _unlock_file(file_descriptor)
+
+
+def _remove_abandoned_file(file_path: pathlib.Path) -> None:
+    LOGGER.info("Removing abandoned '%s'", file_path)
+    with contextlib.suppress(FileNotFoundError):
+        file_path.unlink()
+
+
+@dataclasses.dataclass
+class CacheEntry:
+    """Distribution file in the cache."""
+
+    url: str
+    sha256_str: str
+    path: pathlib.Path
+    size: int
+    accessed_at: float
+
+
+class DistributionCache:
+    """Cache of distribution files, addressed by the hash of their content.
+
+    Files are stored as 'sha256/<2 first characters>/<hash>/<file name>',
+    so that files with the same name from different indexes do not
+    collide. A small SQLite index maps each URL to its file, and keeps track
+    of the last access, for the eviction of the least recently used files.
+    """
+
+    def __init__(self, dir_path: pathlib.Path) -> None:
+        """Initialize."""
+        self._dir_path = dir_path
+        self._is_schema_created = False
+
+    @property
+    def parts_dir_path(self) -> pathlib.Path:
+        """Path to the directory for the files being downloaded."""
+        return self._dir_path.joinpath('parts')
+
+    def get_part_path(self, url: str, file_name: str) -> pathlib.Path:
+        """Get path to the file for a download in progress."""
+        url_hash_str = hashlib.sha256(url.encode()).hexdigest()[:16]
+        return self.parts_dir_path.joinpath(f'{url_hash_str}-{file_name}.part')
+
+    def lock(self, url: str) -> typing.ContextManager[None]:
+        """Lock the entry for the URL, while it is being downloaded."""
+        url_hash_str = hashlib.sha256(url.encode()).hexdigest()[:16]
+        return lock_entry(
+            self._dir_path.joinpath('locks', f'{url_hash_str}.lock'),
+        )
+
+    def get(
+            self,
+            url: str,
+            sha256_str: typing.Optional[str] = None,
+    ) -> typing.Optional[pathlib.Path]:
+        """Get path to cached file, by URL or by hash of its content."""
+        #
+        file_path = None
+        #
+        with self._connect() as connection:
+            row = connection.execute(
+                'SELECT file_name, sha256 FROM entries WHERE url = ?',
+                (url,),
+            ).fetchone()
+            if row is None and sha256_str:
+                # The same file, from another index or mirror
+                row = connection.execute(
+                    'SELECT file_name, sha256 FROM entries WHERE sha256 = ?',
+                    (sha256_str.lower(),),
+                ).fetchone()
+            if row:
+                maybe_file_path = self._get_entry_path(row[1], row[0])
+                if maybe_file_path.is_file():
+                    file_path = maybe_file_path
+                    connection.execute(
+                        'UPDATE entries SET accessed_at = ? WHERE sha256 = ?',
+                        (time.time(), row[1]),
+                    )
+                else:
+                    connection.execute(
+                        'DELETE FROM entries WHERE sha256 = ?',
+                        (row[1],),
+                    )
+        #
+        return file_path
+
+    def add(
+            self,
+            url: str,
+            file_name: str,
+            sha256_str: str,
+            part_path: pathlib.Path,
+    ) -> pathlib.Path:
+        """Move downloaded file into the cache."""
+        #
+        file_path = self._get_entry_path(sha256_str, file_name)
+        file_path.parent.mkdir(parents=True, exist_ok=True)
+        os.replace(part_path, file_path)
+        #
+        now = time.time()
+        with self._connect() as connection:
+            connection.execute(
+                'INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?, ?)',
+                (
+                    url,
+                    file_name,
+                    sha256_str,
+                    file_path.stat().st_size,
+                    now,
+                    now,
+                ),
+            )
+        #
+        return file_path
+
+    def list_(self) -> typing.List[CacheEntry]:
+        """List entries, least recently used first."""
+        #
+        entries = []
+        #
+        if self._dir_path.joinpath(INDEX_FILE_NAME).is_file():
+            with self._connect() as connection:
+                rows = connection.execute(
+                    'SELECT url, file_name, sha256, size, accessed_at'
+                    ' FROM entries ORDER BY accessed_at',
+                ).fetchall()
+            entries = [
+                CacheEntry(
+                    url,
+                    sha256_str,
+                    self._get_entry_path(sha256_str, file_name),
+                    size,
+                    accessed_at,
+                )
+                for url, file_name, sha256_str, size, accessed_at in rows
+            ]
+        #
+        return entries
+
+    def prune(
+            self,
+            max_size: typing.Optional[int] = None,
+            max_age: typing.Optional[float] = None,
+    ) -> typing.List[CacheEntry]:
+        """Evict least recently used files, until they fit the limits.
+
+        A file shared by several URLs counts once, and is evicted with all
+        of its entries, when none of them was used recently enough.
+        """
+        #
+        entries_by_sha256: typing.Dict[str, typing.List[CacheEntry]] = {}
+        for entry in self.list_():
+            entries_by_sha256.setdefault(entry.sha256_str, []).append(entry)
+        # Least recently used first, by the last access to any of the URLs
+        files_entries = sorted(
+            entries_by_sha256.values(),
+            key=lambda file_entries: file_entries[-1].accessed_at,
+        )
+        total_size = sum(
+            file_entries[0].size for file_entries in files_entries
+        )
+        oldest_accessed_at = time.time() - max_age if max_age else None
+        #
+        entries_to_remove = []
+        for file_entries in files_entries:
+            is_too_old = (
+                oldest_accessed_at is not None
+                and
+                file_entries[-1].accessed_at < oldest_accessed_at
+            )
+            is_too_big = max_size is not None and total_size > max_size
+            if is_too_old or is_too_big:
+                entries_to_remove.extend(file_entries)
+                total_size -= file_entries[0].size
+        #
+        self._remove_entries(entries_to_remove)
+        #
+        return entries_to_remove
+
+    def prune_stale_files(self) -> typing.List[pathlib.Path]:
+        """Remove abandoned downloads, and files of the older flat layout.
+
+        Downloads in 'parts/' that were not written to for longer than a day
+        and that are not locked are abandoned.
+        Files directly in the cache directory, other than the index, are
+        from before the cache was addressed by hash, and are never used.
+        """
+        #
+        removed_paths = []
+        #
+        oldest_modified_at = time.time() - STALE_PART_MAX_AGE
+        if self.parts_dir_path.is_dir():
+            for part_path in sorted(self.parts_dir_path.iterdir()):
+                is_stale = (
+                    part_path.is_file()
+                    and
+                    part_path.stat().st_mtime < oldest_modified_at
+                )
+                if is_stale and self._remove_part_file(part_path):
+                    removed_paths.append(part_path)
+        #
+        if self._dir_path.is_dir():
+            for file_path in sorted(self._dir_path.iterdir()):
+                is_flat_file = (
+                    file_path.is_file()
+                    and
+                    not file_path.name.startswith(INDEX_FILE_NAME)
+                )
+                if is_flat_file:
+                    LOGGER.info("Removing unused '%s'", file_path)
+                    file_path.unlink()
+                    removed_paths.append(file_path)
+        #
+        return removed_paths
+
+    def _remove_part_file(self, part_path: pathlib.Path) -> bool:
+        """Remove file of a download, unless it is still in progress."""
+        #
+        is_removed = False
+        #
+        # Parts are named after the hash of their URL, as are their locks
+        url_hash_str = part_path.name.partition('-')[0]
+        lock_path = self._dir_path.joinpath('locks', f'{url_hash_str}.lock')
+        lock_path.parent.mkdir(parents=True, exist_ok=True)
+        with open(lock_path, 'wb') as lock_file:
+            file_descriptor = lock_file.fileno()
+            if _try_lock_file(file_descriptor):
+                try:
+                    _remove_abandoned_file(part_path)
+                finally:
+                    _unlock_file(file_descriptor)
+                is_removed = True
+        #
+        return is_removed
+
+    def remove(
+            self,
+            file_name_patterns: typing.Iterable[str],
+    ) -> typing.List[CacheEntry]:
+        """Evict files whose names match any of the patterns."""
+        #
+        file_name_patterns = list(file_name_patterns)
+        entries_to_remove = [
+            entry
+            for entry in self.list_()
+            if any(
+                fnmatch.fnmatch(entry.path.name, file_name_pattern)
+                for file_name_pattern in file_name_patterns
+            )
+        ]
+        #
+        self._remove_entries(entries_to_remove)
+        #
+        return entries_to_remove
+
+    def _remove_entries(self, entries: typing.Iterable[CacheEntry]) -> None:
+        #
+        with self._connect() as connection:
+            for entry in entries:
+                LOGGER.info("Removing '%s' from the cache", entry.path)
+                connection.execute(
+                    'DELETE FROM entries WHERE url = ?',
+                    (entry.url,),
+                )
+                # The same file might still be there for another URL
+                is_shared = connection.execute(
+                    'SELECT 1 FROM entries WHERE sha256 = ?',
+                    (entry.sha256_str,),
+                ).fetchone()
+                if not is_shared:
+                    with contextlib.suppress(FileNotFoundError):
+                        entry.path.unlink()
+                    with contextlib.suppress(OSError):
+                        entry.path.parent.rmdir()
+
+    @contextlib.contextmanager
+    def _connect(self) -> typing.Iterator[sqlite3.Connection]:
+        """Connect to the index, commit when leaving the context."""
+        #
+        self._dir_path.mkdir(parents=True, exist_ok=True)
+        index_file_path = self._dir_path.joinpath(INDEX_FILE_NAME)
+        with contextlib.closing(
+                sqlite3.connect(index_file_path, timeout=60),
+        ) as connection:
+            with connection:
+                if not self._is_schema_created:
+                    connection.executescript(_SCHEMA)
+                    self._is_schema_created = True
+                yield connection
+
+    def _get_entry_path(
+            self,
+            sha256_str: str,
+            file_name: str,
+    ) -> pathlib.Path:
+        #
+        entry_path = self._dir_path.joinpath(
+            'sha256',
+            sha256_str[:2],
+            sha256_str,
+            file_name,
+        )
+        #
+        return entry_path
+
+
+@dataclasses.dataclass
+class StatsCounters:
+    """Counters of a cache."""
+
+    hits: int = 0
+    misses: int = 0
+    # Bytes received over the network, on misses
+    fetched_bytes: int = 0
+    # Bytes that did not have to be received, on hits
+    served_bytes: int = 0
+
+    @property
+    def hit_rate(self) -> typing.Optional[float]:
+        """Ratio of hits to lookups, 'None' without lookups."""
+        lookups_count = self.hits + self.misses
+        return self.hits / lookups_count if lookups_count else None
+
+    def add(self, other: StatsCounters) -> None:
+        """Add the other counters to these ones."""
+        self.hits += other.hits
+        self.misses += other.misses
+        self.fetched_bytes += other.fetched_bytes
+        self.served_bytes += other.served_bytes
+
+    def to_dict(self) -> typing.Dict[str, typing.Any]:
+        """Get counters as a JSON serializable object."""
+        return dict(dataclasses.asdict(self), hit_rate=self.hit_rate)
+
+
+class CacheStats:
+    """Count hits and misses of the caches, persist them when closed.
+
+    The counters are added up by day, command, and category of cache, in a
+    small SQLite database.
+    """
+
+    def __init__(self, file_path: pathlib.Path) -> None:
+        """Initialize."""
+        self._file_path = file_path
+        self._lock = threading.Lock()
+        self._counters: typing.Dict[str, StatsCounters] = {}
+        #
+        self.command_name = ''
+
+    def record_hit(self, category: str, served_bytes: int = 0) -> None:
+        """Record a hit, and the bytes it saved from the network."""
+        with self._lock:
+            counters = self._counters.setdefault(category, StatsCounters())
+            counters.hits += 1
+            counters.served_bytes += served_bytes
+
+    def record_miss(self, category: str, fetched_bytes: int = 0) -> None:
+        """Record a miss, and the bytes it cost over the network."""
+        with self._lock:
+            counters = self._counters.setdefault(category, StatsCounters())
+            counters.misses += 1
+            counters.fetched_bytes += fetched_bytes
+
+    def close(self) -> None:
+        """Add the counters of this run to the persisted ones."""
+        with self._lock:
+            counters = self._counters
+            self._counters = {}
+        if counters:
+            day = time.strftime('%Y-%m-%d')
+            with self._connect() as connection:
+                for category, category_counters in counters.items():
+                    connection.execute(
+                        'INSERT INTO counters VALUES (?, ?, ?, ?, ?, ?, ?)'
+                        ' ON CONFLICT (day, command, category) DO UPDATE SET'
+                        ' hits = hits + excluded.hits,'
+                        ' misses = misses + excluded.misses,'
+                        ' fetched_bytes = fetched_bytes'
+                        ' + excluded.fetched_bytes,'
+                        ' served_bytes = served_bytes + excluded.served_bytes',
+                        (
+                            day,
+                            self.command_name,
+                            category,
+                            category_counters.hits,
+                            category_counters.misses,
+                            category_counters.fetched_bytes,
+                            category_counters.served_bytes,
+                        ),
+                    )
+
+    def load(
+            self,
+    ) -> typing.Dict[str, typing.Dict[str, StatsCounters]]:
+        """Load persisted counters, by day and category."""
+        #
+        days: typing.Dict[str, typing.Dict[str, StatsCounters]] = {}
+        #
+        if self._file_path.is_file():
+            with self._connect() as connection:
+                rows = connection.execute(
+                    'SELECT day, category, hits, misses, fetched_bytes,'
+                    ' served_bytes FROM counters ORDER BY day',
+                ).fetchall()
+            for day, category, *values in rows:
+                days.setdefault(day, {}).setdefault(
+                    category,
+                    StatsCounters(),
+                ).add(StatsCounters(*values))
+        #
+        return days
+
+    @contextlib.contextmanager
+    def _connect(self) -> typing.Iterator[sqlite3.Connection]:
+        #
+        self._file_path.parent.mkdir(parents=True, exist_ok=True)
+        with contextlib.closing(
+                sqlite3.connect(self._file_path, timeout=60),
+        ) as connection:
+            with connection:
+                connection.executescript(_STATS_SCHEMA)
+                yield connection
+
+
+def _get_dir_size(dir_path: pathlib.Path) -> int:
+    #
+    size = 0
+    #
+    for root_dir_name, _, file_names in os.walk(dir_path):
+        for file_name in file_names:
+            file_path = os.path.join(root_dir_name, file_name)
+            with contextlib.suppress(OSError):
+                size += os.lstat(file_path).st_size
+    #
+    return size
+
+
+def get_info(registry: base.Registry) -> typing.Dict[str, typing.Any]:
+    """Get sizes of the caches, and their hit rates, in total and by day."""
+    #
+    days = registry.services.cache_stats.load()
+    #
+    totals = {category: StatsCounters() for category in STATS_CATEGORIES}
+    for day_counters in days.values():
+        for category, counters in day_counters.items():
+            totals.setdefault(category, StatsCounters()).add(counters)
+    #
+    sizes = {
+        # For all the interpreters
+        'build_environments': _get_dir_size(
+            registry.get_build_environments_cache_dir_path().parent,
+        ),
+        'built_wheels': _get_dir_size(
+            registry.get_built_wheels_cache_dir_path().parent,
+        ),
+        'distributions': sum(
+            entry.size
+            for entry in registry.services.distribution_cache.list_()
+        ),
+        'index': _get_dir_size(registry.get_index_cache_dir_path()),
+        'metadata': _get_dir_size(
+            registry.get_core_metadata_cache_dir_path(),
+        ),
+        'pool': _get_dir_size(registry.get_pool_dir_path()),
+    }
+    #
+    info = {
+        'days': {
+            day: {
+                category: counters.to_dict()
+                for category, counters in sorted(day_counters.items())
+            }
+            for day, day_counters in days.items()
+        },
+        'sizes': sizes,
+        'totals': {
+            category: counters.to_dict()
+            for category, counters in sorted(totals.items())
+        },
+    }
+    #
+    return info
+
 
 def list_(registry: base.Registry) -> typing.List[pathlib.Path]:
     """List cached distributions."""
     #
-    cached_distributions = []
-    #
-    distributions_cache_dir_path = registry.get_distributions_cache_dir_path()
-    if distributions_cache_dir_path.is_dir():
-        cached_distributions = [
-            item
-            for item
-            in distributions_cache_dir_path.iterdir()
-            if item.is_file()
-        ]
+    cached_distributions = [
+        entry.path for entry in registry.services.distribution_cache.list_()
+    ]
     #
     return cached_distributions
 
 
+def prune(
+        registry: base.Registry,
+        max_size: typing.Optional[int],
+        max_age: typing.Optional[float],
+) -> typing.List[pathlib.Path]:
+    """Evict least recently used distributions, and stale files.
+
+    Return the paths of the removed files.
+    """
+    #
+    distribution_cache = registry.services.distribution_cache
+    removed_entries = distribution_cache.prune(max_size, max_age)
+    # A file shared by several URLs is removed once
+    removed_distributions = list(
+        dict.fromkeys(entry.path for entry in removed_entries),
+    )
+    # Downloads in progress are not evicted with the distributions
+    removed_distributions.extend(distribution_cache.prune_stale_files())
+    #
+    return removed_distributions
+
+
+def remove(
+        registry: base.Registry,
+        file_name_patterns: typing.Iterable[str],
+) -> typing.List[pathlib.Path]:
+    """Evict distributions matching the file name patterns."""
+    #
+    distribution_cache = registry.services.distribution_cache
+    removed_entries = distribution_cache.remove(file_name_patterns)
+    removed_distributions = [entry.path for entry in removed_entries]
+    #
+    return removed_distributions
+
+
 # EOF
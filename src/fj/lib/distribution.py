@@ -5,6 +5,8 @@
 from __future__ import annotations
 
 import abc
+import email.parser
+import hashlib
 import logging
 import pathlib
 import typing
@@ -13,11 +15,26 @@ import urllib
 import requests
 
 from . import base
+from . import network
 
 LOGGER = logging.getLogger(__name__)
 
+# Strongest first
+HASH_NAMES_BY_PREFERENCE = (
+    'sha512',
+    'sha384',
+    'sha256',
+    'sha224',
+    'sha1',
+    'md5',
+)
 
-class DistFileCandidate(
+
+class CanNotVerifyHash(Exception):
+    """Can not verify hash of downloaded distribution file."""
+
+
+class DistFileCandidate(  # pylint: disable=too-many-instance-attributes
         base.BaseCandidate,
         metaclass=abc.ABCMeta,
 ):
@@ -44,12 +61,42 @@ class DistFileCandidate(
         #
         self._path: typing.Optional[pathlib.Path] = None
         self._path_built: typing.Optional[pathlib.Path] = None
+        #
+        # Hashes of the distribution file, advertised by the index or in the
+        # fragment of the URI
+        self.hashes: typing.Dict[str, str] = _parse_uri_hashes(uri_str)
+        #
+        # Hashes of the PEP658 '.metadata' file served next to the
+        # distribution file, 'None' if there is no such file
+        self.core_metadata_hashes: typing.Optional[typing.Dict[str, str]] = (
+            None
+        )
 
     @property
     def is_direct(self) -> bool:
         """Override."""
         return self._is_direct
 
+    @property
+    def uri_str(self) -> str:
+        """URI of the distribution file."""
+        return self._uri_str
+
+    @property
+    def metadata(self) -> base.Metadata:
+        """Override, to share metadata between candidates for the same file."""
+        metadata_cache = self._registry.get_memory_cache('metadata')
+        metadata_: typing.Optional[base.Metadata] = (
+            metadata_cache.get(self._uri_str)
+        )
+        if metadata_ is None:
+            if self.core_metadata_hashes is not None:
+                metadata_ = self._get_core_metadata(self.core_metadata_hashes)
+            if metadata_ is None:
+                metadata_ = super().metadata
+            metadata_cache[self._uri_str] = metadata_
+        return metadata_
+
     @property
     def path(self) -> pathlib.Path:
         """Path to distribution file."""
@@ -68,60 +115,250 @@ class DistFileCandidate(
             self._path_built = self._get_path_built()
         return self._path_built
 
+    def _get_core_metadata(
+            self,
+            hashes: typing.Dict[str, str],
+    ) -> typing.Optional[base.Metadata]:
+        """Get metadata from the PEP658 '.metadata' file.
+
+        This file is much smaller than the distribution file, and for source
+        distributions it saves a build.
+        """
+        #
+        metadata_ = None
+        #
+        uri_parts = urllib.parse.urlparse(self._uri_str)
+        file_name = pathlib.Path(uri_parts.path).name + '.metadata'
+        cache_dir_path = self._registry.get_core_metadata_cache_dir_path()
+        cache_path = cache_dir_path.joinpath(file_name)
+        #
+        cache_stats = self._registry.services.cache_stats
+        content = None
+        if cache_path.is_file():
+            content = cache_path.read_bytes()
+            if _is_hash_matching(content, hashes):
+                cache_stats.record_hit('metadata', len(content))
+            else:
+                LOGGER.warning(
+                    "Hash mismatch for cached metadata of '%s'",
+                    self,
+                )
+                cache_path.unlink()
+                content = None
+        #
+        if content is None:
+            content = self._fetch_core_metadata()
+            if content is not None and _is_hash_matching(content, hashes):
+                cache_dir_path.mkdir(parents=True, exist_ok=True)
+                network.write_file_atomically(cache_path, content)
+            elif content is not None:
+                LOGGER.warning("Hash mismatch for metadata of '%s'", self)
+                content = None
+        #
+        if content is not None:
+            email_parser = email.parser.BytesParser()
+            metadata_ = email_parser.parsebytes(content, headersonly=True)
+        #
+        return metadata_  # type: ignore[return-value]
+
+    def _fetch_core_metadata(self) -> typing.Optional[bytes]:
+        """Fetch the '.metadata' file, 'None' if it can not be fetched.
+
+        The metadata can still be read from the distribution file then.
+        """
+        #
+        content = None
+        #
+        url = urllib.parse.urldefrag(self._uri_str).url + '.metadata'
+        LOGGER.info("Fetching metadata for '%s'", self._uri_str)
+        try:
+            response = self._registry.services.http_session.get(url)
+        except (
+                requests.RequestException,
+                network.CanNotUseNetworkOffline,
+        ) as exc:
+            LOGGER.info("Can not fetch metadata of '%s': %r", self, exc)
+        else:
+            if response.status_code == 200:
+                content = response.content
+            self._registry.services.cache_stats.record_miss(
+                'metadata',
+                len(response.content),
+            )
+        #
+        return content
+
     @abc.abstractmethod
     def _get_path_built(self) -> pathlib.Path:
         """Get the path to built distribution file."""
         raise NotImplementedError
 
-    def _get_path(self) -> pathlib.Path:
+    @property
+    def is_available_locally(self) -> bool:
+        """Check if the distribution file is available without download."""
+        return self._path is not None or self._get_local_path() is not None
+
+    def _get_local_path(self) -> typing.Optional[pathlib.Path]:
+        """Get path to the local or already cached distribution file."""
         #
         distribution_path = None
         #
         uri_parts = urllib.parse.urlparse(self._uri_str)
-        file_path = pathlib.Path(uri_parts.path)
         #
         is_local = uri_parts.scheme == 'file'
         #
         if is_local:
-            distribution_path = file_path
+            distribution_path = pathlib.Path(uri_parts.path)
         else:
-            file_name = file_path.name
-            cache_dir_path = self._registry.get_distributions_cache_dir_path()
-            maybe_distribution_path = cache_dir_path.joinpath(file_name)
-            if maybe_distribution_path.is_file():
-                distribution_path = maybe_distribution_path
-            else:
-                distribution_path = self._add_to_cache(maybe_distribution_path)
+            distribution_path = self._registry.services.distribution_cache.get(
+                urllib.parse.urldefrag(self._uri_str).url,
+                self.hashes.get('sha256'),
+            )
         #
         return distribution_path
 
-    def _add_to_cache(
-            self,
-            destination_path: pathlib.Path,
-    ) -> pathlib.Path:
+    def _get_path(self) -> pathlib.Path:
         #
-        distribution_path = None
+        distribution_path = self._get_local_path()
+        #
+        is_cached = urllib.parse.urlparse(self._uri_str).scheme != 'file'
+        if distribution_path and is_cached and self.hashes:
+            if not _is_file_hash_matching(distribution_path, self.hashes):
+                LOGGER.warning(
+                    "Fetching again corrupt cached file '%s'",
+                    distribution_path,
+                )
+                distribution_path.unlink()
+                distribution_path = None
         #
-        parent_dir_path = destination_path.parent
-        if not parent_dir_path.is_dir():
-            LOGGER.info(
-                "Creating distribution cache directory: %s",
-                parent_dir_path,
+        if distribution_path is None:
+            distribution_path = self._fetch_to_cache()
+        elif is_cached:
+            self._registry.services.cache_stats.record_hit(
+                'distributions',
+                distribution_path.stat().st_size,
             )
-            parent_dir_path.mkdir(parents=True)
         #
-        LOGGER.info(
-            "Caching distribution from '%s' to '%s'",
-            self._uri_str,
-            destination_path,
+        return distribution_path
+
+    def _fetch_to_cache(self) -> pathlib.Path:
+        """Download to the cache, unless another process just did."""
+        #
+        url = urllib.parse.urldefrag(self._uri_str).url
+        cache_stats = self._registry.services.cache_stats
+        #
+        with self._registry.services.distribution_cache.lock(url):
+            distribution_path = self._get_local_path()
+            if distribution_path is None:
+                distribution_path = self._add_to_cache()
+                cache_stats.record_miss(
+                    'distributions',
+                    distribution_path.stat().st_size,
+                )
+            else:
+                cache_stats.record_hit(
+                    'distributions',
+                    distribution_path.stat().st_size,
+                )
+        #
+        return distribution_path
+
+    def _add_to_cache(self) -> pathlib.Path:
+        #
+        url = urllib.parse.urldefrag(self._uri_str).url
+        file_name = pathlib.Path(urllib.parse.urlparse(url).path).name
+        #
+        distribution_cache = self._registry.services.distribution_cache
+        part_path = distribution_cache.get_part_path(url, file_name)
+        part_path.parent.mkdir(parents=True, exist_ok=True)
+        #
+        LOGGER.info("Caching distribution from '%s'", url)
+        #
+        # Download to a '.part' file, hashed while it streams, so that the
+        # cache never holds partial files. The cache is addressed by the
+        # 'sha256' hash, whatever hash the index knows.
+        hash_name = _get_hash_name(self.hashes) or 'sha256'
+        expected_hash_str = self.hashes.get(hash_name)
+        file_hashes = {'sha256': hashlib.sha256()}
+        if hash_name not in file_hashes:
+            file_hashes[hash_name] = hashlib.new(hash_name)
+        network.download_to_part_file(
+            self._registry.services.http_session,
+            url,
+            part_path,
+            list(file_hashes.values()),
+            expected_hash_str,
+        )
+        #
+        if expected_hash_str:
+            file_hash_str = file_hashes[hash_name].hexdigest()
+            if file_hash_str != expected_hash_str.lower():
+                part_path.unlink()
+                raise CanNotVerifyHash(self._uri_str)
+        #
+        distribution_path = distribution_cache.add(
+            url,
+            file_name,
+            file_hashes['sha256'].hexdigest(),
+            part_path,
         )
-        with open(destination_path, 'wb') as distribution_file:
-            get_request = requests.get(self._uri_str, stream=True)
-            for chunk in get_request.iter_content(chunk_size=128):
-                distribution_file.write(chunk)
-            distribution_path = destination_path
         #
         return distribution_path
 
 
+def _get_hash_name(hashes: typing.Dict[str, str]) -> typing.Optional[str]:
+    """Get name of the strongest of the known hashes."""
+    #
+    hash_name = next(
+        (item for item in HASH_NAMES_BY_PREFERENCE if item in hashes),
+        None,
+    )
+    #
+    return hash_name
+
+
+def _is_hash_matching(content: bytes, hashes: typing.Dict[str, str]) -> bool:
+    """Check content against the strongest of the known hashes, if any."""
+    #
+    is_matching = True
+    #
+    hash_name = _get_hash_name(hashes)
+    if hash_name:
+        content_hash = hashlib.new(hash_name, content).hexdigest()
+        is_matching = content_hash == hashes[hash_name].lower()
+    #
+    return is_matching
+
+
+def _is_file_hash_matching(
+        file_path: pathlib.Path,
+        hashes: typing.Dict[str, str],
+) -> bool:
+    """Check file against the strongest of the known hashes, if any."""
+    #
+    is_matching = True
+    #
+    hash_name = _get_hash_name(hashes)
+    if hash_name:
+        file_hash = hashlib.new(hash_name)
+        network.hash_file(file_path, [file_hash])
+        is_matching = file_hash.hexdigest() == hashes[hash_name].lower()
+    #
+    return is_matching
+
+
+def _parse_uri_hashes(uri_str: str) -> typing.Dict[str, str]:
+    """Parse hashes in the fragment of the URI, as in '#sha256=...'."""
+    #
+    hashes = {}
+    #
+    fragment = urllib.parse.urlparse(uri_str).fragment
+    for fragment_part in fragment.split('&'):
+        hash_name, _, hash_value = fragment_part.partition('=')
+        if hash_name in hashlib.algorithms_guaranteed and hash_value:
+            hashes[hash_name] = hash_value
+    #
+    return hashes
+
+
 # EOF
@@ -0,0 +1,120 @@
+#
+
+"""Fetch the distribution files of a resolution, concurrently."""
+
+from __future__ import annotations
+
+import concurrent.futures
+import logging
+import threading
+import typing
+import urllib.parse
+
+from . import distribution
+
+if typing.TYPE_CHECKING:
+    from . import base
+
+LOGGER = logging.getLogger(__name__)
+
+
+class _HostLimits:  # pylint: disable=too-few-public-methods
+    """Limit the count of concurrent downloads from each host."""
+
+    def __init__(self, downloads_per_host: int) -> None:
+        self._downloads_per_host = downloads_per_host
+        self._lock = threading.Lock()
+        self._semaphores: typing.Dict[str, threading.BoundedSemaphore] = {}
+
+    def get_semaphore(self, uri_str: str) -> threading.BoundedSemaphore:
+        """Get semaphore for the host of the URI."""
+        host = urllib.parse.urlparse(uri_str).netloc
+        with self._lock:
+            semaphore = self._semaphores.get(host)
+            if semaphore is None:
+                semaphore = threading.BoundedSemaphore(
+                    self._downloads_per_host,
+                )
+                self._semaphores[host] = semaphore
+        return semaphore
+
+
+def _fetch(
+        candidate: distribution.DistFileCandidate,
+        host_limits: _HostLimits,
+) -> None:
+    with host_limits.get_semaphore(candidate.uri_str):
+        _ = candidate.path
+
+
+def _get_candidates_to_fetch(
+        candidates: typing.Iterable[base.Candidate],
+) -> typing.List[distribution.DistFileCandidate]:
+    """Get candidates whose file is not available, one for each file."""
+    #
+    candidates_to_fetch: typing.Dict[
+        str,
+        distribution.DistFileCandidate,
+    ] = {}
+    #
+    for candidate in candidates:
+        if isinstance(candidate, distribution.DistFileCandidate):
+            if not candidate.is_available_locally:
+                candidates_to_fetch.setdefault(candidate.uri_str, candidate)
+    #
+    return list(candidates_to_fetch.values())
+
+
+def _wait(
+        registry: base.Registry,
+        futures: typing.List[concurrent.futures.Future[None]],
+) -> None:
+    """Wait for the downloads, report the progress."""
+    #
+    network_bytes_start = registry.network_bytes_count
+    #
+    for fetched_count, future in enumerate(
+            concurrent.futures.as_completed(futures),
+            start=1,
+    ):
+        future.result()
+        LOGGER.info(
+            "Fetched %d/%d distribution files, %d bytes",
+            fetched_count,
+            len(futures),
+            registry.network_bytes_count - network_bytes_start,
+        )
+
+
+def fetch_candidates(
+        registry: base.Registry,
+        candidates: typing.Iterable[base.Candidate],
+) -> None:
+    """Download the distribution files that are not available yet.
+
+    Otherwise they would be downloaded one after the other, when their path
+    is needed for the installation.
+    """
+    #
+    candidates_to_fetch = _get_candidates_to_fetch(candidates)
+    #
+    if candidates_to_fetch:
+        settings = registry.services.http_session.settings
+        executor = registry.get_executor(
+            'downloads',
+            settings.downloads_count,
+        )
+        host_limits = _HostLimits(settings.downloads_per_host)
+        #
+        futures = [
+            executor.submit(_fetch, candidate, host_limits)
+            for candidate in candidates_to_fetch
+        ]
+        try:
+            _wait(registry, futures)
+        finally:
+            for future in futures:
+                future.cancel()
+
+
+# EOF
@@ -9,6 +9,7 @@ import typing
 
 import packaging
 
+from . import fetch
 from . import installers
 from . import links
 from . import pool
@@ -24,6 +25,18 @@ class CanNotInstallWithoutPath(Exception):
     """Can not install candidate without path."""
 
 
+def _record_pool_stats(
+        registry: base.Registry,
+        candidates_to_link: typing.List[base.Candidate],
+        candidates_to_pool: typing.List[base.Candidate],
+) -> None:
+    """Count candidates found in the pool as hits, the others as misses."""
+    for _ in range(len(candidates_to_link) - len(candidates_to_pool)):
+        registry.services.cache_stats.record_hit('pool')
+    for _ in candidates_to_pool:
+        registry.services.cache_stats.record_miss('pool')
+
+
 def _install_candidates(  # pylint: disable=too-complex
         registry: base.Registry,
         candidates: typing.Iterable[base.Candidate],
@@ -42,6 +55,13 @@ def _install_candidates(  # pylint: disable=too-complex
             if not candidate.is_in_pool:
                 candidates_to_pool.append(candidate)
     #
+    _record_pool_stats(registry, candidates_to_link, candidates_to_pool)
+    #
+    fetch.fetch_candidates(
+        registry,
+        candidates_to_pool + candidates_to_install,
+    )
+    #
     if candidates_to_pool:
         pool.add_candidates(registry, candidates_to_pool)
     #
@@ -49,7 +69,11 @@ def _install_candidates(  # pylint: disable=too-complex
         links.add_candidates(registry, candidates_to_link)
     #
     for candidate in candidates_to_install:
-        candidate_path = getattr(candidate, 'path', None)
+        # The built distribution, so that a direct 'sdist' is built once
+        candidate_path = (
+            getattr(candidate, 'path_built', None)
+            or getattr(candidate, 'path', None)
+        )
         if candidate_path:
             installers.install_path(registry, candidate_path)
         else:
@@ -0,0 +1,387 @@
+#
+
+"""Lock requirements for multiple environments in one pass."""
+
+from __future__ import annotations
+
+import dataclasses
+import logging
+import re
+import typing
+
+import packaging.tags
+import packaging.version
+
+from . import base
+from . import solve
+from . import _solver
+
+LOGGER = logging.getLogger(__name__)
+
+_PLATFORM_REGEXES = [
+    (
+        re.compile(r'(?:many|musl)?linux(?:1|2010|2014|_\d+_\d+)?_(\w+)'),
+        {
+            'os_name': 'posix',
+            'platform_system': 'Linux',
+            'sys_platform': 'linux',
+        },
+    ),
+    (
+        re.compile(r'macosx_\d+_\d+_(\w+)'),
+        {
+            'os_name': 'posix',
+            'platform_system': 'Darwin',
+            'sys_platform': 'darwin',
+        },
+    ),
+    (
+        re.compile(r'win_?(\w+)'),
+        {
+            'os_name': 'nt',
+            'platform_system': 'Windows',
+            'sys_platform': 'win32',
+        },
+    ),
+]
+
+_LEGACY_MANYLINUX_VERSIONS = {
+    'manylinux1': (2, 5),
+    'manylinux2010': (2, 12),
+    'manylinux2014': (2, 17),
+}
+
+_LOCK_MARKER_KEYS = (
+    'python_version',
+    'sys_platform',
+    'platform_machine',
+)
+
+_INTERPRETER_REGEX = re.compile(r'([a-z]+)(\d)(\d+)')
+
+_MACOSX_REGEX = re.compile(r'macosx_(\d+)_(\d+)_(\w+)')
+
+_MANYLINUX_REGEX = re.compile(r'(manylinux(?:1|2010|2014|_\d+_\d+))_(\w+)')
+
+_WINDOWS_MACHINES = {
+    '32': 'x86',
+    'amd64': 'AMD64',
+    'arm64': 'ARM64',
+}
+
+
+class CanNotParseEnvironmentSpec(Exception):
+    """Can not parse environment specification."""
+
+
+@dataclasses.dataclass
+class Lock:
+    """Pinned candidates for each environment."""
+
+    environments: typing.Dict[str, base.Environment]
+    selections: typing.Dict[str, typing.Dict[base.ProjectKey, base.Candidate]]
+
+    def to_dict(self) -> typing.Dict[str, typing.Any]:
+        """Get lock as a JSON serializable object."""
+        #
+        releases: typing.Dict[
+            typing.Tuple[base.ProjectKey, base.Version],
+            typing.List[str],
+        ] = {}
+        for environment_name, selection in self.selections.items():
+            for project_key, candidate in selection.items():
+                release_key = (project_key, candidate.release_version)
+                releases.setdefault(release_key, []).append(environment_name)
+        #
+        packages = []
+        for release_key in sorted(releases):
+            project_key, release_version = release_key
+            environment_names = releases[release_key]
+            package = {
+                'environments': environment_names,
+                'name': project_key,
+                'version': str(release_version),
+            }
+            if len(environment_names) < len(self.environments):
+                package['marker'] = ' or '.join(
+                    f'({_make_marker(self.environments[environment_name])})'
+                    for environment_name in environment_names
+                )
+            packages.append(package)
+        #
+        lock_dict = {
+            'environments': list(self.environments),
+            'packages': packages,
+        }
+        #
+        return lock_dict
+
+
+def _make_marker(environment: base.Environment) -> str:
+    marker_environment = base.get_marker_environment(environment)
+    marker_str = ' and '.join(
+        f'{marker_key} == "{marker_environment[marker_key]}"'
+        for marker_key in _LOCK_MARKER_KEYS
+    )
+    return marker_str
+
+
+def _expand_manylinux_platform(
+        manylinux_str: str,
+        machine: str,
+) -> typing.List[str]:
+    #
+    if manylinux_str in _LEGACY_MANYLINUX_VERSIONS:
+        glibc_major, glibc_minor = _LEGACY_MANYLINUX_VERSIONS[manylinux_str]
+    else:
+        glibc_major, glibc_minor = (
+            int(part) for part in manylinux_str.split('_')[1:]
+        )
+    #
+    legacy_platforms = {
+        glibc_version: legacy_str
+        for legacy_str, glibc_version in _LEGACY_MANYLINUX_VERSIONS.items()
+    }
+    platforms = []
+    for minor in range(glibc_minor, 4, -1):
+        platforms.append(f'manylinux_{glibc_major}_{minor}_{machine}')
+        legacy_str = legacy_platforms.get((glibc_major, minor))
+        if legacy_str:
+            platforms.append(f'{legacy_str}_{machine}')
+    platforms.append(f'linux_{machine}')
+    #
+    return platforms
+
+
+def _expand_platform(platform: str) -> typing.List[str]:
+    """Expand platform into all the ones it is compatible with.
+
+    That is the older 'manylinux' and 'macosx' platforms.
+    """
+    #
+    platforms = [platform]
+    #
+    manylinux_match = _MANYLINUX_REGEX.fullmatch(platform)
+    macosx_match = _MACOSX_REGEX.fullmatch(platform)
+    if manylinux_match:
+        platforms = _expand_manylinux_platform(*manylinux_match.groups())
+    elif macosx_match:
+        major_str, minor_str, machine = macosx_match.groups()
+        platforms = list(
+            packaging.tags.mac_platforms(
+                (int(major_str), int(minor_str)),
+                machine,
+            ),
+        )
+    #
+    return platforms
+
+
+def _get_platform_markers(platform: str) -> typing.Dict[str, str]:
+    #
+    for regex, platform_markers in _PLATFORM_REGEXES:
+        match = regex.fullmatch(platform)
+        if match:
+            machine = match.group(1)
+            if platform_markers['sys_platform'] == 'win32':
+                machine = _WINDOWS_MACHINES.get(machine, machine)
+            markers = dict(platform_markers, platform_machine=machine)
+            break
+    else:
+        raise CanNotParseEnvironmentSpec(platform)
+    #
+    return markers
+
+
+def _get_abis(
+        short_name: str,
+        python_version_set: typing.Tuple[int, int],
+        abis_str: str,
+) -> typing.List[str]:
+    """Get the ABIs of the spec, or the default one of the interpreter."""
+    #
+    abis = abis_str.split('.') if abis_str else []
+    #
+    if not abis and short_name == 'cp':
+        major, minor = python_version_set
+        # Without 'pymalloc' flag since 3.8
+        abi_flags_str = 'm' if python_version_set < (3, 8) else ''
+        abis = [f'cp{major}{minor}{abi_flags_str}']
+    #
+    return abis
+
+
+def _get_tags(
+        interpreter_str: str,
+        python_version_set: typing.Tuple[int, int],
+        abis: typing.List[str],
+        platforms: typing.List[str],
+) -> typing.FrozenSet[packaging.tags.Tag]:
+    #
+    tag_list: typing.List[packaging.tags.Tag] = []
+    if interpreter_str.startswith('cp'):
+        tag_list.extend(
+            packaging.tags.cpython_tags(
+                python_version=python_version_set,
+                abis=abis,
+                platforms=platforms,
+            ),
+        )
+    else:
+        tag_list.extend(
+            packaging.tags.generic_tags(
+                interpreter=interpreter_str,
+                abis=abis,
+                platforms=platforms,
+            ),
+        )
+    tag_list.extend(
+        packaging.tags.compatible_tags(
+            python_version=python_version_set,
+            interpreter=interpreter_str,
+            platforms=platforms,
+        ),
+    )
+    #
+    return frozenset(tag_list)
+
+
+def _split_environment_spec(
+        environment_spec_str: str,
+) -> typing.Tuple[str, typing.Tuple[int, int], str, str]:
+    """Split into interpreter name and version, ABIs, and platforms."""
+    #
+    spec_parts = environment_spec_str.split('-')
+    if len(spec_parts) == 2:
+        interpreter_str, platforms_str = spec_parts
+        abis_str = ''
+    elif len(spec_parts) == 3:
+        interpreter_str, abis_str, platforms_str = spec_parts
+    else:
+        raise CanNotParseEnvironmentSpec(environment_spec_str)
+    #
+    match = _INTERPRETER_REGEX.fullmatch(interpreter_str)
+    if not match or not platforms_str:
+        raise CanNotParseEnvironmentSpec(environment_spec_str)
+    short_name, major_str, minor_str = match.groups()
+    python_version_set = (int(major_str), int(minor_str))
+    #
+    return short_name, python_version_set, abis_str, platforms_str
+
+
+def _get_python_implementation_str(short_name: str) -> str:
+    #
+    implementations = {
+        short_name: long_name
+        for long_name, short_name
+        in packaging.tags.INTERPRETER_SHORT_NAMES.items()
+    }
+    long_name = implementations.get(short_name)
+    if not long_name:
+        raise CanNotParseEnvironmentSpec(short_name)
+    python_implementation_str = {
+        'cpython': 'CPython',
+        'pypy': 'PyPy',
+    }.get(long_name, long_name)
+    #
+    return python_implementation_str
+
+
+def parse_environment_spec(
+        registry: base.Registry,
+        environment_spec_str: str,
+) -> base.Environment:
+    """Parse environment specification.
+
+    For example 'cp38-manylinux2014_x86_64', that is an interpreter tag and
+    platform tags, possibly compressed as in 'cp39-win_amd64.win32'. ABI
+    tags can be given in between, as in 'pp38-pypy38_pp73-win_amd64',
+    otherwise it is the default one of CPython, or none for the other
+    interpreters.
+
+    The micro version of the interpreter is not known, '0' is assumed for
+    the 'python_full_version' marker.
+    """
+    #
+    short_name, python_version_set, abis_str, platforms_str = (
+        _split_environment_spec(environment_spec_str)
+    )
+    major, minor = python_version_set
+    #
+    platforms = []
+    for platform in platforms_str.split('.'):
+        platforms.extend(_expand_platform(platform))
+    #
+    marker_environment = _get_platform_markers(platforms[0])
+    #
+    environment = base.Environment(
+        # Nothing gets installed in this environment
+        base.InstallDestination(registry.environment.purelib_dir_path),
+        _get_python_implementation_str(short_name),
+        marker_environment['platform_machine'],
+        packaging.version.Version(f'{major}.{minor}.0'),
+        [],  # search_path
+        _get_tags(
+            f'{short_name}{major}{minor}',
+            python_version_set,
+            _get_abis(short_name, python_version_set, abis_str),
+            platforms,
+        ),
+        marker_environment,
+    )
+    #
+    return environment
+
+
+def lock(
+        registry: base.Registry,
+        environment_spec_strs: typing.Iterable[str],
+        requirements: typing.Iterable[base.Requirement],
+) -> typing.Optional[Lock]:
+    """Solve requirements for all environments.
+
+    Registries derived for each environment share the in-memory caches, so
+    that index pages and metadata are fetched only once.
+    """
+    #
+    lock_ = None
+    #
+    requirements = list(requirements)
+    #
+    environments = {
+        environment_spec_str: parse_environment_spec(
+            registry,
+            environment_spec_str,
+        )
+        for environment_spec_str in environment_spec_strs
+    }
+    #
+    selections = {}
+    for environment_name, environment in environments.items():
+        LOGGER.info("Solving for environment '%s'", environment_name)
+        environment_registry = registry.derive(environment)
+        finders = [
+            _solver.direct.DirectCandidateFinder(
+                environment_registry,
+                requirements,
+            ),
+            _solver.pool.PoolCandidateFinder(environment_registry),
+            *_solver.local.make_local_finders(environment_registry),
+            *_solver.pep503.make_index_finders(environment_registry),
+        ]
+        resolution = solve.solve_with_finders(
+            environment_registry,
+            finders,
+            requirements,
+        )
+        if resolution is None:
+            LOGGER.error("Can not solve for '%s'", environment_name)
+            break
+        selections[environment_name] = dict(resolution.mapping)
+    else:
+        lock_ = Lock(environments, selections)
+    #
+    return lock_
+
+
+# EOF
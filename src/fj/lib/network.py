@@ -0,0 +1,728 @@
+#
+
+"""HTTP traffic, shared by the index finders and the downloads."""
+
+from __future__ import annotations
+
+import dataclasses
+import hashlib
+import io
+import json
+import logging
+import os
+import re
+import tempfile
+import threading
+import time
+import typing
+
+import requests
+import requests.adapters
+import urllib3.util.retry
+
+if typing.TYPE_CHECKING:
+    import pathlib
+    #
+    from . import cache
+
+LOGGER = logging.getLogger(__name__)
+
+DOWNLOAD_CHUNK_SIZE = 1024 * 1024
+
+_CONTENT_RANGE_REGEX = re.compile(r'bytes (\d+)-\d+/(?:\d+|\*)')
+
+PYPI_SIMPLE_URL = 'https://pypi.org/simple/'
+
+RETRY_STATUS_CODES = (
+    429,
+    500,
+    502,
+    503,
+    504,
+)
+
+
+@dataclasses.dataclass
+class IndexSettings:
+    """Settings for an index, maybe served by several mirrors."""
+
+    urls: typing.List[str]
+    # Indexes with a lower value come first
+    priority: int = 0
+
+
+@dataclasses.dataclass
+class NetworkSettings:  # pylint: disable=too-many-instance-attributes
+    """Settings for the HTTP traffic."""
+
+    # Count of connections kept alive for each host
+    pool_size: int = 10
+    retries: int = 3
+    backoff_factor: float = 0.5
+    # Seconds to wait for the server, to connect or between bytes
+    timeout: float = 30.0
+    # Seconds during which a cached index page is used without revalidation
+    index_cache_max_age: float = 0.0
+    # Bytes on disk for the cached index pages, before the least recently
+    # used ones are evicted
+    index_cache_max_size: int = 256 * 1024 * 1024
+    indexes: typing.List[IndexSettings] = dataclasses.field(
+        default_factory=lambda: [IndexSettings([PYPI_SIMPLE_URL])],
+    )
+    # Use only what is already in the caches, never the network
+    is_offline: bool = False
+    # Count of distribution files downloaded concurrently, in total and from
+    # each host
+    downloads_count: int = 8
+    downloads_per_host: int = 4
+    # Local directories of distribution files, searched before the indexes
+    find_links: typing.List[pathlib.Path] = dataclasses.field(
+        default_factory=list,
+    )
+
+
+class CanNotUseNetworkOffline(Exception):
+    """Can not use the network in offline mode."""
+
+
+class HttpSession:
+    """HTTP session with connections kept alive and pooled per host.
+
+    Requests are retried with a backoff on connection errors and on server
+    errors. All the bytes received are counted.
+    In offline mode, every request fails, and its URL is recorded as missing
+    from the caches.
+    """
+
+    def __init__(
+            self,
+            settings: typing.Optional[NetworkSettings] = None,
+    ) -> None:
+        """Initialize."""
+        self._settings = settings if settings else NetworkSettings()
+        #
+        self._lock = threading.Lock()
+        self._session: typing.Optional[requests.Session] = None
+        #
+        self.missing_urls: typing.List[str] = []
+        self.received_bytes_count = 0
+
+    @property
+    def settings(self) -> NetworkSettings:
+        """Settings."""
+        return self._settings
+
+    @property
+    def is_offline(self) -> bool:
+        """Is in offline mode."""
+        return self._settings.is_offline
+
+    def close(self) -> None:
+        """Close the connections."""
+        with self._lock:
+            if self._session:
+                self._session.close()
+                self._session = None
+
+    def get(
+            self,
+            url: str,
+            **kwargs: typing.Any,
+    ) -> requests.Response:
+        """Send a GET request.
+
+        Unless the response is streamed, its content is read and counted.
+        """
+        if self._settings.is_offline:
+            self.record_missing_url(url)
+            raise CanNotUseNetworkOffline(url)
+        #
+        kwargs.setdefault('timeout', self._settings.timeout)
+        response = self._get_session().get(url, **kwargs)
+        if not kwargs.get('stream'):
+            self.count_received_bytes(len(response.content))
+        return response
+
+    def iter_content(
+            self,
+            response: requests.Response,
+            chunk_size: int,
+    ) -> typing.Iterator[bytes]:
+        """Iterate over the content of a streamed response, counting bytes."""
+        for chunk in response.iter_content(chunk_size=chunk_size):
+            self.count_received_bytes(len(chunk))
+            yield chunk
+
+    def record_missing_url(self, url: str) -> None:
+        """Record URL that is missing from the caches, in offline mode."""
+        with self._lock:
+            self.missing_urls.append(url)
+
+    def count_received_bytes(self, bytes_count: int) -> None:
+        """Count bytes received."""
+        with self._lock:
+            self.received_bytes_count += bytes_count
+
+    def _get_session(self) -> requests.Session:
+        with self._lock:
+            if self._session is None:
+                self._session = self._make_session()
+            session = self._session
+        return session
+
+    def _make_session(self) -> requests.Session:
+        #
+        retry = urllib3.util.retry.Retry(
+            total=self._settings.retries,
+            backoff_factor=self._settings.backoff_factor,
+            status_forcelist=RETRY_STATUS_CODES,
+            allowed_methods=('GET', 'HEAD'),
+            raise_on_status=False,
+        )
+        adapter = requests.adapters.HTTPAdapter(
+            pool_connections=self._settings.pool_size,
+            pool_maxsize=self._settings.pool_size,
+            max_retries=retry,
+        )
+        #
+        session = requests.Session()
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        #
+        return session
+
+
+class CircuitBreaker:
+    """Stop using a server for a while, after consecutive failures.
+
+    Once the cooldown is over, the server is tried again, and one more
+    failure is enough to stop using it again.
+    """
+
+    COOLDOWN_SECONDS = 30.0
+    FAILURES_THRESHOLD = 3
+
+    def __init__(self) -> None:
+        """Initialize."""
+        self._lock = threading.Lock()
+        self._failures_count = 0
+        self._opened_at: typing.Optional[float] = None
+
+    @property
+    def is_closed(self) -> bool:
+        """Check if the server can be used."""
+        with self._lock:
+            is_closed = (
+                self._opened_at is None
+                or
+                time.monotonic() - self._opened_at >= self.COOLDOWN_SECONDS
+            )
+        return is_closed
+
+    def record_failure(self) -> None:
+        """Record a failure."""
+        with self._lock:
+            self._failures_count += 1
+            if self._failures_count >= self.FAILURES_THRESHOLD:
+                self._opened_at = time.monotonic()
+
+    def record_success(self) -> None:
+        """Record a success."""
+        with self._lock:
+            self._failures_count = 0
+            self._opened_at = None
+
+
+class CanNotRequestRange(Exception):
+    """Can not request a range of bytes."""
+
+
+class LazyRemoteFile(io.RawIOBase):
+    """Read-only remote file, fetching only the parts that are read.
+
+    Parts are fetched in blocks with HTTP range requests, and kept in memory.
+    The tail of the file is fetched first, since this is where the index of
+    a zip archive is.
+    """
+
+    BLOCK_SIZE = 64 * 1024
+    TAIL_SIZE = 4 * BLOCK_SIZE
+
+    def __init__(
+            self,
+            http_session: HttpSession,
+            url: str,
+    ) -> None:
+        """Initialize."""
+        super().__init__()
+        #
+        self._http_session = http_session
+        self._url = url
+        #
+        self._blocks: typing.Dict[int, bytes] = {}
+        self._position = 0
+        self._size = self._fetch_tail()
+
+    def readable(self) -> bool:
+        """Override."""
+        return True
+
+    def readinto(self, buffer: typing.Any) -> int:
+        """Override."""
+        #
+        start = self._position
+        end = min(start + len(buffer), self._size)
+        #
+        data = self._read_range(start, end) if start < end else b''
+        buffer[:len(data)] = data
+        self._position += len(data)
+        #
+        return len(data)
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        """Override."""
+        #
+        if whence == io.SEEK_CUR:
+            offset += self._position
+        elif whence == io.SEEK_END:
+            offset += self._size
+        #
+        if offset < 0:
+            raise ValueError(f"Negative seek position {offset}")
+        self._position = offset
+        #
+        return self._position
+
+    def seekable(self) -> bool:
+        """Override."""
+        return True
+
+    def tell(self) -> int:
+        """Override."""
+        return self._position
+
+    def _fetch_tail(self) -> int:
+        """Fetch the tail of the file, to learn its size at the same time."""
+        #
+        headers = {'Range': f'bytes=-{self.TAIL_SIZE}'}
+        response = self._request(headers)
+        #
+        # For example 'bytes 1000-2047/2048'
+        content_range = response.headers.get('Content-Range', '')
+        size_str = content_range.rpartition('/')[2]
+        if not size_str.isdigit():
+            raise CanNotRequestRange(self._url)
+        #
+        size = int(size_str)
+        tail_start = size - len(response.content)
+        first_block_index = -(-tail_start // self.BLOCK_SIZE)
+        for block_index in range(
+                first_block_index,
+                -(-size // self.BLOCK_SIZE),
+        ):
+            block_start = block_index * self.BLOCK_SIZE - tail_start
+            self._blocks[block_index] = response.content[
+                block_start:block_start + self.BLOCK_SIZE
+            ]
+        #
+        return size
+
+    def _fetch_blocks(self, first_index: int, last_index: int) -> None:
+        """Fetch the span of blocks in one request."""
+        #
+        start = first_index * self.BLOCK_SIZE
+        end = min((last_index + 1) * self.BLOCK_SIZE, self._size)
+        response = self._request({'Range': f'bytes={start}-{end - 1}'})
+        #
+        for block_index in range(first_index, last_index + 1):
+            block_start = (block_index - first_index) * self.BLOCK_SIZE
+            self._blocks[block_index] = response.content[
+                block_start:block_start + self.BLOCK_SIZE
+            ]
+
+    def _read_range(self, start: int, end: int) -> bytes:
+        #
+        first_index = start // self.BLOCK_SIZE
+        last_index = (end - 1) // self.BLOCK_SIZE
+        #
+        missing_indexes = [
+            block_index
+            for block_index in range(first_index, last_index + 1)
+            if block_index not in self._blocks
+        ]
+        if missing_indexes:
+            self._fetch_blocks(missing_indexes[0], missing_indexes[-1])
+        #
+        data = b''.join(
+            self._blocks[block_index]
+            for block_index in range(first_index, last_index + 1)
+        )
+        offset = first_index * self.BLOCK_SIZE
+        #
+        return data[start - offset:end - offset]
+
+    def _request(self, headers: typing.Dict[str, str]) -> requests.Response:
+        """Send range request, without reading the content unless partial."""
+        #
+        try:
+            response = self._http_session.get(
+                self._url,
+                headers=headers,
+                stream=True,
+            )
+        except requests.RequestException as exc:
+            raise CanNotRequestRange(self._url) from exc
+        #
+        if response.status_code != 206:
+            response.close()
+            raise CanNotRequestRange(self._url)
+        #
+        self._http_session.count_received_bytes(len(response.content))
+        #
+        return response
+
+
+class CanNotDownloadFile(Exception):
+    """Can not download file."""
+
+
+def download_to_part_file(
+        http_session: HttpSession,
+        url: str,
+        part_path: pathlib.Path,
+        file_hashes: typing.Sequence[hashlib._Hash],
+        expected_hash_str: typing.Optional[str],
+) -> None:
+    """Download to a '.part' file, resume it if it is left from before.
+
+    The part is kept if the download is interrupted. Next time only the
+    missing bytes are requested, if the server supports range requests and
+    the file did not change in between, according to its 'ETag'. The
+    whole file goes through the hash, including the part already there.
+    """
+    #
+    meta_path = part_path.with_name(part_path.name + '.json')
+    meta = _read_meta(meta_path) or {}
+    #
+    offset = 0
+    headers = {}
+    if meta.get('url') == url and meta.get('hash') == expected_hash_str:
+        offset = part_path.stat().st_size if part_path.is_file() else 0
+        validator = meta.get('etag') or meta.get('last_modified')
+        if offset and validator:
+            headers['If-Range'] = validator
+            headers['Range'] = f'bytes={offset}-'
+    #
+    response = http_session.get(url, headers=headers, stream=True)
+    if offset and not _is_range_served(response, offset):
+        # Complete or stale part, for example after a crash right before
+        # its meta file was deleted
+        response.close()
+        LOGGER.info("Can not resume download of '%s', restarting it", url)
+        _discard_part_file(part_path)
+        offset = 0
+        response = http_session.get(url, stream=True)
+    with response:
+        if response.status_code == 206 and offset:
+            LOGGER.info("Resuming download of '%s' at %d bytes", url, offset)
+            hash_file(part_path, file_hashes)
+            mode = 'ab'
+        elif response.status_code == 200:
+            offset = 0
+            mode = 'wb'
+        else:
+            raise CanNotDownloadFile(f"'{url}' {response.status_code}")
+        #
+        # The length of encoded content is not the length of the file
+        content_length_str = None
+        if not response.headers.get('Content-Encoding'):
+            content_length_str = response.headers.get('Content-Length')
+        meta = {
+            'etag': response.headers.get('ETag'),
+            'hash': expected_hash_str,
+            'last_modified': response.headers.get('Last-Modified'),
+            'size': (
+                offset + int(content_length_str)
+                if content_length_str
+                else None
+            ),
+            'url': url,
+        }
+        write_file_atomically(meta_path, json.dumps(meta).encode())
+        #
+        with part_path.open(mode) as part_file:
+            for chunk in http_session.iter_content(
+                    response,
+                    DOWNLOAD_CHUNK_SIZE,
+            ):
+                _update_hashes(file_hashes, chunk)
+                part_file.write(chunk)
+    #
+    if meta['size'] is not None and part_path.stat().st_size != meta['size']:
+        _discard_part_file(part_path)
+        raise CanNotDownloadFile(f"'{url}' incomplete")
+    #
+    meta_path.unlink()
+
+
+def _is_range_served(response: requests.Response, offset: int) -> bool:
+    """Check that the response is not a refusal or a wrong range."""
+    #
+    is_range_served = response.status_code != 416
+    #
+    if response.status_code == 206:
+        content_range_str = response.headers.get('Content-Range', '')
+        match = _CONTENT_RANGE_REGEX.fullmatch(content_range_str)
+        is_range_served = (
+            match is not None and int(match.group(1)) == offset
+        )
+    #
+    return is_range_served
+
+
+def _discard_part_file(part_path: pathlib.Path) -> None:
+    """Delete the '.part' file and its meta file."""
+    meta_path = part_path.with_name(part_path.name + '.json')
+    for file_path in (part_path, meta_path):
+        try:
+            file_path.unlink()
+        except FileNotFoundError:
+            pass
+
+
+def hash_file(
+        file_path: pathlib.Path,
+        file_hashes: typing.Sequence[hashlib._Hash],
+) -> None:
+    """Update hashes with the content of the file."""
+    with file_path.open('rb') as file_:
+        for chunk in iter(lambda: file_.read(DOWNLOAD_CHUNK_SIZE), b''):
+            _update_hashes(file_hashes, chunk)
+
+
+def _update_hashes(
+        file_hashes: typing.Sequence[hashlib._Hash],
+        chunk: bytes,
+) -> None:
+    for file_hash in file_hashes:
+        file_hash.update(chunk)
+
+
+@dataclasses.dataclass
+class Page:
+    """Content of a page."""
+
+    url: str
+    content: bytes
+    content_type: str
+    status_code: int = 200
+
+
+class PageCache:
+    """Cache pages on disk, revalidating them with conditional requests.
+
+    Each page is stored as a body file next to a JSON file with its 'ETag'
+    and 'Last-Modified' validators. A page younger than the maximum age is
+    used as is, an older one is revalidated with 'If-None-Match' and
+    'If-Modified-Since', so that an unchanged page is not sent again.
+    """
+
+    BODY_SUFFIX = '.body'
+    META_SUFFIX = '.json'
+
+    def __init__(
+            self,
+            dir_path: pathlib.Path,
+            http_session: HttpSession,
+            cache_stats: typing.Optional[cache.CacheStats] = None,
+    ) -> None:
+        """Initialize."""
+        self._dir_path = dir_path
+        self._http_session = http_session
+        self._cache_stats = cache_stats
+        #
+        self._is_used = False
+
+    def close(self) -> None:
+        """Evict pages if the cache grew too big."""
+        if self._is_used and self._dir_path.is_dir():
+            self._prune()
+        self._is_used = False
+
+    def get(
+            self,
+            url: str,
+            headers: typing.Optional[typing.Mapping[str, str]] = None,
+    ) -> Page:
+        """Get page from the cache, or from the network."""
+        #
+        self._is_used = True
+        headers = dict(headers) if headers else {}
+        #
+        entry_key = _make_entry_key(url, headers)
+        body_path = self._dir_path.joinpath(entry_key + self.BODY_SUFFIX)
+        meta_path = self._dir_path.joinpath(entry_key + self.META_SUFFIX)
+        #
+        page = None
+        #
+        # Without its body, the validators of a page are useless
+        meta = _read_page_meta(meta_path) if body_path.is_file() else None
+        if meta:
+            max_age = self._http_session.settings.index_cache_max_age
+            is_fresh = time.time() - meta['fetched_at'] < max_age
+            if is_fresh or self._http_session.is_offline:
+                page = _read_page(body_path, meta)
+            else:
+                if meta.get('etag'):
+                    headers['If-None-Match'] = meta['etag']
+                if meta.get('last_modified'):
+                    headers['If-Modified-Since'] = meta['last_modified']
+        #
+        if page is None:
+            response = self._http_session.get(url, headers=headers)
+            if response.status_code == 304 and meta:
+                LOGGER.debug("Page not modified: %s", url)
+                meta['fetched_at'] = time.time()
+                write_file_atomically(meta_path, json.dumps(meta).encode())
+                page = _read_page(body_path, meta)
+                self._record_hit(page)
+            else:
+                page = Page(
+                    url,
+                    response.content,
+                    response.headers.get('Content-Type', ''),
+                    response.status_code,
+                )
+                if response.status_code == 200:
+                    self._store(response, body_path, meta_path)
+                if self._cache_stats:
+                    self._cache_stats.record_miss('index', len(page.content))
+        else:
+            self._record_hit(page)
+        #
+        return page
+
+    def _record_hit(self, page: Page) -> None:
+        if self._cache_stats:
+            self._cache_stats.record_hit('index', len(page.content))
+
+    def _store(
+            self,
+            response: requests.Response,
+            body_path: pathlib.Path,
+            meta_path: pathlib.Path,
+    ) -> None:
+        #
+        meta = {
+            'content_type': response.headers.get('Content-Type', ''),
+            'etag': response.headers.get('ETag'),
+            'fetched_at': time.time(),
+            'last_modified': response.headers.get('Last-Modified'),
+            'url': response.url,
+        }
+        #
+        self._dir_path.mkdir(parents=True, exist_ok=True)
+        write_file_atomically(body_path, response.content)
+        write_file_atomically(meta_path, json.dumps(meta).encode())
+
+    def _prune(self) -> None:
+        """Evict the least recently fetched pages, above the maximum size."""
+        #
+        max_size = self._http_session.settings.index_cache_max_size
+        #
+        entries = []
+        total_size = 0
+        for body_path in self._dir_path.glob('*' + self.BODY_SUFFIX):
+            meta_path = body_path.with_suffix(self.META_SUFFIX)
+            try:
+                body_stat, meta_stat = (body_path.stat(), meta_path.stat())
+            except FileNotFoundError:
+                continue
+            entry_size = body_stat.st_size + meta_stat.st_size
+            entries.append((body_stat.st_mtime, entry_size, body_path))
+            total_size += entry_size
+        #
+        for _, entry_size, body_path in sorted(entries):
+            if total_size <= max_size:
+                break
+            LOGGER.debug("Evicting cached page: %s", body_path)
+            body_path.with_suffix(self.META_SUFFIX).unlink(missing_ok=True)
+            body_path.unlink(missing_ok=True)
+            total_size -= entry_size
+
+
+def _make_entry_key(url: str, headers: typing.Mapping[str, str]) -> str:
+    key_str = json.dumps([url, sorted(headers.items())])
+    entry_key = hashlib.sha256(key_str.encode()).hexdigest()
+    return entry_key
+
+
+def _read_meta(
+        meta_path: pathlib.Path,
+) -> typing.Optional[typing.Dict[str, typing.Any]]:
+    #
+    meta = None
+    #
+    try:
+        meta = json.loads(meta_path.read_bytes())
+    except FileNotFoundError:
+        pass
+    except ValueError:
+        LOGGER.warning("Ignoring invalid cache entry: %s", meta_path)
+    #
+    return meta
+
+
+def _read_page_meta(
+        meta_path: pathlib.Path,
+) -> typing.Optional[typing.Dict[str, typing.Any]]:
+    #
+    meta = _read_meta(meta_path)
+    #
+    if meta is not None and not _is_page_meta_valid(meta):
+        LOGGER.warning("Ignoring invalid cache entry: %s", meta_path)
+        meta = None
+    #
+    return meta
+
+
+def _is_page_meta_valid(meta: typing.Any) -> bool:
+    is_valid = (
+        isinstance(meta, dict)
+        and
+        isinstance(meta.get('fetched_at'), (int, float))
+        and
+        isinstance(meta.get('url'), str)
+        and
+        isinstance(meta.get('content_type'), str)
+    )
+    return is_valid
+
+
+def _read_page(
+        body_path: pathlib.Path,
+        meta: typing.Dict[str, typing.Any],
+) -> Page:
+    # Mark as recently used, for the eviction
+    os.utime(body_path)
+    page = Page(meta['url'], body_path.read_bytes(), meta['content_type'])
+    return page
+
+
+def write_file_atomically(file_path: pathlib.Path, content: bytes) -> None:
+    """Write to a temporary file first, so readers never see partial files."""
+    with tempfile.NamedTemporaryFile(
+            dir=file_path.parent,
+            prefix='.tmp-',
+            delete=False,
+    ) as temp_file:
+        try:
+            temp_file.write(content)
+        except BaseException:
+            temp_file.close()
+            os.unlink(temp_file.name)
+            raise
+    os.replace(temp_file.name, file_path)
+
+
+# EOF
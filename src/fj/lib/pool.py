@@ -11,6 +11,7 @@ import typing
 import packaging
 
 from . import base
+from . import fetch
 from . import installers
 from . import solve
 from . import wheel
@@ -174,6 +175,7 @@ def add(
     resolution = solve.solve_for_pool(registry, requirements, False)
     if resolution:
         candidates = resolution.mapping.values()
+        fetch.fetch_candidates(registry, candidates)
         add_candidates(registry, candidates)
     else:
         LOGGER.info("Can not solve requirements!")
@@ -0,0 +1,310 @@
+#
+
+"""Instrumentation of the dependency solver."""
+
+from __future__ import annotations
+
+import contextlib
+import dataclasses
+import json
+import logging
+import os
+import threading
+import time
+import typing
+
+import resolvelib
+
+from . import base
+
+if typing.TYPE_CHECKING:
+    import pathlib
+    #
+    Report = typing.Dict[str, typing.Any]
+
+LOGGER = logging.getLogger(__name__)
+
+COUNTER_KEYS = (
+    'backtracks',
+    'network_bytes',
+    'pins',
+    'resolutions',
+    'rounds',
+)
+
+
+@dataclasses.dataclass
+class _Event:
+    """Completed span of time, as a Chrome trace 'complete' event."""
+
+    category: str
+    name: str
+    start: float
+    duration: float
+    thread_id: int
+    args: typing.Dict[str, str]
+
+
+@dataclasses.dataclass
+class _Timing:
+    """Aggregated timing for a kind of event."""
+
+    calls: int = 0
+    total_seconds: float = 0.0
+    max_seconds: float = 0.0
+
+    def add(self, duration: float) -> None:
+        """Add a duration."""
+        self.calls += 1
+        self.total_seconds += duration
+        self.max_seconds = max(self.max_seconds, duration)
+
+
+class SolveProfile:
+    """Record wall time and counters across dependency resolutions."""
+
+    def __init__(self) -> None:
+        """Initialize."""
+        self._lock = threading.Lock()
+        self._origin = time.perf_counter()
+        #
+        self.counters: typing.Dict[str, int] = dict.fromkeys(COUNTER_KEYS, 0)
+        self.events: typing.List[_Event] = []
+        self.timings: typing.Dict[str, typing.Dict[str, _Timing]] = {}
+
+    def increment(self, counter_key: str, value: int = 1) -> None:
+        """Increment a counter."""
+        with self._lock:
+            self.counters[counter_key] = (
+                self.counters.get(counter_key, 0) + value
+            )
+
+    @contextlib.contextmanager
+    def measure(
+            self,
+            category: str,
+            name: str,
+            **args: str,
+    ) -> typing.Iterator[None]:
+        """Measure the wall time spent in the context."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            duration = time.perf_counter() - start
+            event = _Event(
+                category,
+                name,
+                start - self._origin,
+                duration,
+                threading.get_ident(),
+                args,
+            )
+            with self._lock:
+                self.events.append(event)
+                category_timings = self.timings.setdefault(category, {})
+                category_timings.setdefault(name, _Timing()).add(duration)
+
+    @contextlib.contextmanager
+    def measure_resolution(
+            self,
+            registry: base.Registry,
+    ) -> typing.Iterator[None]:
+        """Measure a whole resolution, including the network traffic."""
+        network_bytes_start = registry.network_bytes_count
+        with self.measure('solve', 'resolve'):
+            try:
+                yield
+            finally:
+                self.increment('resolutions')
+                self.increment(
+                    'network_bytes',
+                    registry.network_bytes_count - network_bytes_start,
+                )
+
+    def make_report(self) -> Report:
+        """Make a JSON serializable report."""
+        with self._lock:
+            report = {
+                'counters': dict(self.counters),
+                'timings': {
+                    category: {
+                        name: dataclasses.asdict(timing)
+                        for name, timing in sorted(category_timings.items())
+                    }
+                    for category, category_timings
+                    in sorted(self.timings.items())
+                },
+                'wall_seconds': time.perf_counter() - self._origin,
+            }
+        return report
+
+    def make_chrome_trace(self) -> Report:
+        """Make a trace in the Chrome 'Trace Event Format'."""
+        process_id = os.getpid()
+        with self._lock:
+            trace_events = [
+                {
+                    'args': event.args,
+                    'cat': event.category,
+                    'dur': int(event.duration * 1_000_000),
+                    'name': event.name,
+                    'ph': 'X',
+                    'pid': process_id,
+                    'tid': event.thread_id,
+                    'ts': int(event.start * 1_000_000),
+                }
+                for event in self.events
+            ]
+        trace = {
+            'displayTimeUnit': 'ms',
+            'traceEvents': trace_events,
+        }
+        return trace
+
+    def write_chrome_trace(self, trace_file_path: pathlib.Path) -> None:
+        """Write a trace file, to be loaded in 'chrome://tracing'."""
+        LOGGER.info("Writing solver trace to '%s'", trace_file_path)
+        with trace_file_path.open('w', encoding='utf-8') as trace_file:
+            json.dump(self.make_chrome_trace(), trace_file)
+
+
+class ProfilingReporter(resolvelib.BaseReporter):  # type: ignore[misc]
+    """Reporter counting the rounds, pins, and backtracks of the solver."""
+
+    def __init__(self, profile: SolveProfile) -> None:
+        """Initialize."""
+        super().__init__()
+        self._profile = profile
+
+    def starting_round(self, index: int) -> None:
+        """Override."""
+        self._profile.increment('rounds')
+
+    def backtracking(self, candidate: base.Candidate) -> None:
+        """Override."""
+        self._profile.increment('backtracks')
+
+    def pinning(self, candidate: base.Candidate) -> None:
+        """Override."""
+        self._profile.increment('pins')
+
+
+class ProfilingFinder(
+        base.CandidateFinder,
+):  # pylint: disable=too-few-public-methods
+    """Wrap a candidate finder to measure the time spent finding candidates."""
+
+    def __init__(
+            self,
+            finder: base.CandidateFinder,
+            profile: SolveProfile,
+    ) -> None:
+        """Initialize."""
+        self._finder = finder
+        self._profile = profile
+        #
+        self.is_concurrency_safe = finder.is_concurrency_safe
+        self.yields_sorted_candidates = finder.yields_sorted_candidates
+
+    def find_candidates(
+            self,
+            project_key: base.ProjectKey,
+            requirements: typing.Iterable[base.Requirement],
+            extras: base.Extras,
+    ) -> typing.Iterator[base.Candidate]:
+        """Implement abstract."""
+        #
+        # Finders are lazy, so the candidates have to be consumed while
+        # measuring.
+        #
+        finder_name = self._finder.__class__.__qualname__
+        with self._profile.measure('finder', finder_name, key=project_key):
+            candidates = list(
+                self._finder.find_candidates(
+                    project_key,
+                    requirements,
+                    extras,
+                ),
+            )
+        return iter(candidates)
+
+
+class ProfilingProvider(
+        resolvelib.providers.AbstractProvider,  # type: ignore[misc]
+):
+    """Wrap a provider to measure the time spent in its hooks."""
+
+    def __init__(
+            self,
+            provider: resolvelib.providers.AbstractProvider,
+            profile: SolveProfile,
+    ) -> None:
+        """Initialize."""
+        self._provider = provider
+        self._profile = profile
+
+    def identify(self, dependency: base.Requirement) -> base.ProjectKey:
+        """Implement abstract."""
+        project_key: base.ProjectKey = self._provider.identify(dependency)
+        return project_key
+
+    def find_matches(
+            self,
+            requirements: typing.Sequence[base.Requirement],
+    ) -> typing.List[base.Candidate]:
+        """Implement abstract."""
+        project_key = self.identify(requirements[0])
+        with self._profile.measure(
+                'provider',
+                'find_matches',
+                key=project_key,
+        ):
+            matches: typing.List[base.Candidate] = (
+                self._provider.find_matches(requirements)
+            )
+        return matches
+
+    def get_preference(
+            self,
+            resolution: typing.Optional[base.Candidate],
+            candidates: typing.Sized,
+            information: typing.Any,
+    ) -> int:
+        """Implement abstract."""
+        preference: int = self._provider.get_preference(
+            resolution,
+            candidates,
+            information,
+        )
+        return preference
+
+    def get_dependencies(
+            self,
+            candidate: base.Candidate,
+    ) -> typing.List[base.Requirement]:
+        """Implement abstract."""
+        with self._profile.measure(
+                'provider',
+                'get_dependencies',
+                key=str(candidate),
+        ):
+            dependencies: typing.List[base.Requirement] = (
+                self._provider.get_dependencies(candidate)
+            )
+        return dependencies
+
+    def is_satisfied_by(
+            self,
+            requirement: base.Requirement,
+            candidate: base.Candidate,
+    ) -> bool:
+        """Implement abstract."""
+        is_satisfied: bool = self._provider.is_satisfied_by(
+            requirement,
+            candidate,
+        )
+        return is_satisfied
+
+
+# EOF
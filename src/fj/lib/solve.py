@@ -9,6 +9,7 @@ import typing
 
 import resolvelib
 
+from . import profiling
 from . import _solver
 
 if typing.TYPE_CHECKING:
@@ -26,21 +27,76 @@ def _solve(
     #
     resolution = None
     #
-    provider = _solver.provider.Provider(registry, finders, skip_depencencies)
-    reporter = resolvelib.BaseReporter()
-    solver = resolvelib.Resolver(provider, reporter)
+    resolver = _make_resolver(registry, finders, skip_depencencies)
     #
     try:
-        resolution = solver.resolve(requirements)
+        resolution = _resolve(registry, resolver, requirements)
     except resolvelib.resolvers.ResolutionImpossible:
-        pass
+        _report_offline_misses(registry)
     #
-    if resolution:
-        _display_resolution(requirements, resolution)
+    return resolution
+
+
+def _make_resolver(
+        registry: base.Registry,
+        finders: typing.Iterable[base.CandidateFinder],
+        skip_depencencies: bool,
+) -> resolvelib.Resolver:
+    """Make resolver, instrumented if the solver is profiled."""
+    #
+    profile = registry.services.solve_profile
+    if profile:
+        profiling_finders = [
+            profiling.ProfilingFinder(finder, profile) for finder in finders
+        ]
+        profiling_provider = profiling.ProfilingProvider(
+            _solver.provider.Provider(
+                registry,
+                profiling_finders,
+                skip_depencencies,
+            ),
+            profile,
+        )
+        resolver = resolvelib.Resolver(
+            profiling_provider,
+            profiling.ProfilingReporter(profile),
+        )
+    else:
+        provider = _solver.provider.Provider(
+            registry,
+            finders,
+            skip_depencencies,
+        )
+        resolver = resolvelib.Resolver(provider, resolvelib.BaseReporter())
+    #
+    return resolver
+
+
+def _resolve(
+        registry: base.Registry,
+        resolver: resolvelib.Resolver,
+        requirements: typing.Iterable[base.Requirement],
+) -> resolvelib.resolvers.Result:
+    #
+    profile = registry.services.solve_profile
+    if profile:
+        with profile.measure_resolution(registry):
+            resolution = resolver.resolve(requirements)
+    else:
+        resolution = resolver.resolve(requirements)
     #
     return resolution
 
 
+def _report_offline_misses(registry: base.Registry) -> None:
+    http_session = registry.services.http_session
+    if http_session.is_offline and http_session.missing_urls:
+        LOGGER.error(
+            "Can not solve offline, missing from the caches:\n%s",
+            '\n'.join(sorted(set(http_session.missing_urls))),
+        )
+
+
 def _display_resolution(
         requirements: typing.Iterable[base.Requirement],
         resolution: resolvelib.resolvers.Result,
@@ -59,6 +115,20 @@ def _display_resolution(
         print(f"{name} -> {targets}")
 
 
+def solve_with_finders(
+        registry: base.Registry,
+        finders: typing.Iterable[base.CandidateFinder],
+        requirements: typing.Iterable[base.Requirement],
+        skip_depencencies: bool = False,
+) -> typing.Optional[resolvelib.resolvers.Result]:
+    """Solve dependencies for the requirements with these finders.
+
+    Nothing is displayed, the resolution is for the caller to use.
+    """
+    resolution = _solve(registry, finders, requirements, skip_depencencies)
+    return resolution
+
+
 def solve_for_pool(
         registry: base.Registry,
         requirements: typing.Iterable[base.Requirement],
@@ -67,9 +137,12 @@ def solve_for_pool(
     """Solve dependency for the requirements."""
     finders = [
         _solver.pool.PoolCandidateFinder(registry),
-        _solver.pep503.SimpleIndexFinder(registry),
+        *_solver.local.make_local_finders(registry),
+        *_solver.pep503.make_index_finders(registry),
     ]
     resolution = _solve(registry, finders, requirements, skip_depencencies)
+    if resolution:
+        _display_resolution(requirements, resolution)
     return resolution
 
 
@@ -85,6 +158,8 @@ def solve_for_environment(
         _solver.pool.PoolCandidateFinder(registry),
     ]
     resolution = _solve(registry, finders, requirements, skip_depencencies)
+    if resolution:
+        _display_resolution(requirements, resolution)
     return resolution
 
 
@@ -98,9 +173,12 @@ def solve(
         _solver.direct.DirectCandidateFinder(registry, requirements),
         _solver.active.ActiveFinder(registry),
         _solver.pool.PoolCandidateFinder(registry),
-        _solver.pep503.SimpleIndexFinder(registry),
+        *_solver.local.make_local_finders(registry),
+        *_solver.pep503.make_index_finders(registry),
     ]
     resolution = _solve(registry, finders, requirements, skip_depencencies)
+    if resolution:
+        _display_resolution(requirements, resolution)
     return resolution
 
 
@@ -4,21 +4,37 @@
 
 from __future__ import annotations
 
+import base64
+import compileall
+import configparser
+import csv
 import dataclasses
 import email.parser
+import functools
+import hashlib
+import importlib.util
+import io
 import logging
+import mmap
+import os
+import pathlib
+import platform
+import re
+import struct
+import sys
 import typing
+import urllib.parse
 import zipfile
+import zlib
 
 import packaging
-import pep517.envbuild
 
 from . import base
+from . import buildenv
 from . import distribution
+from . import network
 
 if typing.TYPE_CHECKING:
-    import pathlib
-    #
     _ProjectKey = typing.Optional[base.ProjectKey]
     _Tags = typing.Optional[base.Tags]
     _Version = typing.Optional[base.Version]
@@ -26,6 +42,32 @@ if typing.TYPE_CHECKING:
 
 LOGGER = logging.getLogger(__name__)
 
+# Structures of the ZIP format, without the variable length fields
+_CENTRAL_DIRECTORY_END = struct.Struct('<4s4H2LH')
+_CENTRAL_DIRECTORY_HEADER = struct.Struct('<4s6H3L5H2L')
+_LOCAL_FILE_HEADER = struct.Struct('<4s5H3L2H')
+
+_HEADERS_END_REGEX = re.compile(b'\r?\n\r?\n')
+
+_METADATA_CHUNK_SIZE = 4096
+
+# As written by 'pip', for console and GUI scripts alike
+_SCRIPT_LAUNCHER_TEMPLATE = '''#!{executable}
+# -*- coding: utf-8 -*-
+import re
+import sys
+from {module_name} import {import_name}
+if __name__ == '__main__':
+    sys.argv[0] = re.sub(r'(-script\\.pyw|\\.exe)?$', '', sys.argv[0])
+    sys.exit({object_name}())
+'''
+
+_SCRIPT_SHEBANG_REGEX = re.compile(rb'#!python(w?)(\s.*)?', re.DOTALL)
+
+# Categories of the '.data' directory that can be installed, the other ones
+# ('data', 'headers') are left to the other installers.
+_WHEEL_DATA_CATEGORIES = ('platlib', 'purelib', 'scripts')
+
 
 class WheelCandidate(
         distribution.DistFileCandidate,
@@ -56,7 +98,37 @@ class WheelCandidate(
         self._tags = tags
 
     def _get_metadata(self) -> typing.Optional[base.Metadata]:
-        metadata_ = get_metadata(self.path)
+        #
+        metadata_ = None
+        #
+        if not self.is_available_locally:
+            try:
+                metadata_ = self._get_remote_metadata()
+            except (network.CanNotRequestRange, zipfile.BadZipFile) as exc:
+                LOGGER.info(
+                    "Can not read metadata of '%s' remotely: %r",
+                    self,
+                    exc,
+                )
+        #
+        if metadata_ is None:
+            metadata_ = get_metadata(self.path)
+        #
+        return metadata_
+
+    def _get_remote_metadata(self) -> typing.Optional[base.Metadata]:
+        """Read metadata with range requests, without downloading the wheel."""
+        #
+        LOGGER.info("Reading metadata remotely from '%s'", self._uri_str)
+        with network.LazyRemoteFile(
+                self._registry.services.http_session,
+                self._uri_str,
+        ) as wheel_file:
+            metadata_ = get_metadata(
+                wheel_file,
+                _get_file_name(self._uri_str),
+            )
+        #
         return metadata_
 
     @property
@@ -98,22 +170,634 @@ class WheelCandidate(
         return is_compatible
 
 
-def get_metadata(wheel_path: pathlib.Path) -> typing.Optional[base.Metadata]:
-    """Get metadata for a 'wheel' distribution file."""
+def _get_file_name(uri_str: str) -> str:
+    return pathlib.PurePosixPath(urllib.parse.urlparse(uri_str).path).name
+
+
+def _get_metadata_member_name(file_name: str) -> typing.Optional[str]:
+    """Get name of the 'METADATA' file, as expected from the wheel's name."""
+    #
+    member_name = None
+    #
+    if file_name.endswith('.whl'):
+        parts = file_name[:-4].split('-')
+        # Maybe with a build tag
+        if len(parts) in (5, 6):
+            member_name = f'{parts[0]}-{parts[1]}.dist-info/METADATA'
+    #
+    return member_name
+
+
+def parse_metadata(content: bytes) -> base.Metadata:
+    """Parse the headers of a 'METADATA' (or 'WHEEL') file."""
+    email_parser = email.parser.BytesParser()
+    metadata = email_parser.parsebytes(content, headersonly=True)
+    return metadata  # type: ignore[return-value]
+
+
+def _find_central_directory_header(
+        mapped: mmap.mmap,
+        member_name_bytes: bytes,
+) -> typing.Optional[typing.Tuple[typing.Any, ...]]:
+    """Search the name in the central directory, without parsing it all."""
+    #
+    header = None
+    #
+    end_offset = mapped.rfind(
+        b'PK\x05\x06',
+        max(0, len(mapped) - _CENTRAL_DIRECTORY_END.size - 0xFFFF),
+    )
+    if end_offset >= 0:
+        directory_size, directory_offset = (
+            _CENTRAL_DIRECTORY_END.unpack_from(mapped, end_offset)[5:7]
+        )
+        # Otherwise it is a 'ZIP64' file, or it has a prefix
+        if directory_offset + directory_size == end_offset:
+            name_offset = mapped.find(
+                member_name_bytes,
+                directory_offset,
+                end_offset,
+            )
+            while name_offset >= 0 and header is None:
+                header_offset = name_offset - _CENTRAL_DIRECTORY_HEADER.size
+                if header_offset >= directory_offset:
+                    fields = _CENTRAL_DIRECTORY_HEADER.unpack_from(
+                        mapped,
+                        header_offset,
+                    )
+                    if (
+                            fields[0] == b'PK\x01\x02'
+                            and fields[10] == len(member_name_bytes)
+                    ):
+                        header = fields
+                name_offset = mapped.find(
+                    member_name_bytes,
+                    name_offset + 1,
+                    end_offset,
+                )
+    #
+    return header
+
+
+def _read_headers(
+        mapped: mmap.mmap,
+        data_offset: int,
+        compressed_size: int,
+        compression: int,
+) -> bytes:
+    """Decompress only until the end of the headers, skip the description."""
+    #
+    content = b''
+    #
+    decompressor = zlib.decompressobj(-zlib.MAX_WBITS)
+    end_offset = data_offset + compressed_size
+    for chunk_offset in range(data_offset, end_offset, _METADATA_CHUNK_SIZE):
+        chunk = mapped[
+            chunk_offset:min(chunk_offset + _METADATA_CHUNK_SIZE, end_offset)
+        ]
+        if compression == zipfile.ZIP_DEFLATED:
+            chunk = decompressor.decompress(chunk)
+        content += chunk
+        headers_end_match = _HEADERS_END_REGEX.search(content)
+        if headers_end_match:
+            content = content[:headers_end_match.end()]
+            break
+    #
+    return content
+
+
+def _read_mapped_metadata(
+        mapped: mmap.mmap,
+        member_name: str,
+) -> typing.Optional[base.Metadata]:
     #
     metadata = None
     #
-    with zipfile.ZipFile(wheel_path) as zip_file:
-        for file_name in zip_file.namelist():
-            if file_name.endswith('.dist-info/METADATA'):
-                email_parser = email.parser.BytesParser()
-                metadata = email_parser.parse(
-                    zip_file.open(file_name),  # type: ignore[arg-type]
-                    headersonly=True,
+    header = _find_central_directory_header(mapped, member_name.encode())
+    if header:
+        flags, compression = header[3:5]
+        compressed_size = header[8]
+        local_header_offset = header[16]
+        is_readable = (
+            not flags & 0x1  # encrypted
+            and compression in (zipfile.ZIP_STORED, zipfile.ZIP_DEFLATED)
+            and compressed_size != 0xFFFFFFFF  # 'ZIP64'
+        )
+        if is_readable:
+            local_fields = _LOCAL_FILE_HEADER.unpack_from(
+                mapped,
+                local_header_offset,
+            )
+            if local_fields[0] == b'PK\x03\x04':
+                data_offset = (
+                    local_header_offset
+                    + _LOCAL_FILE_HEADER.size
+                    + local_fields[9]  # name length
+                    + local_fields[10]  # extra field length
+                )
+                metadata = parse_metadata(
+                    _read_headers(
+                        mapped,
+                        data_offset,
+                        compressed_size,
+                        compression,
+                    ),
                 )
-                break
     #
-    return metadata  # type: ignore[return-value]
+    return metadata
+
+
+def _get_metadata_directly(
+        wheel_path: pathlib.Path,
+        member_name: str,
+) -> typing.Optional[base.Metadata]:
+    """Read metadata at its expected location, through a memory map."""
+    #
+    metadata = None
+    #
+    with wheel_path.open('rb') as wheel_file:
+        if os.fstat(wheel_file.fileno()).st_size > 0:
+            with mmap.mmap(
+                    wheel_file.fileno(),
+                    0,
+                    access=mmap.ACCESS_READ,
+            ) as mapped:
+                metadata = _read_mapped_metadata(mapped, member_name)
+    #
+    return metadata
+
+
+def _get_metadata_from_zip_file(
+        wheel: typing.Union[pathlib.Path, typing.IO[bytes], io.RawIOBase],
+        member_name: typing.Optional[str],
+) -> typing.Optional[base.Metadata]:
+    #
+    metadata = None
+    #
+    with zipfile.ZipFile(wheel) as zip_file:
+        file_names = zip_file.namelist()
+        if member_name not in file_names:
+            # Only a 'dist-info' directory at the top level
+            member_name = next(
+                (
+                    file_name for file_name in file_names
+                    if file_name.endswith('.dist-info/METADATA')
+                    and file_name.count('/') == 1
+                ),
+                None,
+            )
+        if member_name:
+            metadata = parse_metadata(zip_file.read(member_name))
+    #
+    return metadata
+
+
+def get_metadata(
+        wheel: typing.Union[pathlib.Path, typing.IO[bytes], io.RawIOBase],
+        file_name: typing.Optional[str] = None,
+) -> typing.Optional[base.Metadata]:
+    """Get metadata for a 'wheel' distribution file.
+
+    The wheel can also be given as a seekable file object, then with the
+    name of the file. The 'METADATA' file is looked up directly where the
+    name of the wheel says it is, only the headers are parsed.
+    """
+    #
+    metadata = None
+    #
+    if isinstance(wheel, pathlib.Path):
+        file_name = wheel.name
+    member_name = _get_metadata_member_name(file_name) if file_name else None
+    #
+    if member_name and isinstance(wheel, pathlib.Path):
+        metadata = _get_metadata_directly(wheel, member_name)
+    if metadata is None:
+        metadata = _get_metadata_from_zip_file(wheel, member_name)
+    #
+    return metadata
+
+
+class CanNotInstallWheel(Exception):
+    """Can not install wheel."""
+
+
+class _InstalledFiles:
+    """Files written while installing a wheel, to list in its 'RECORD'."""
+
+    def __init__(self, target_dir_path: pathlib.Path) -> None:
+        """Initialize."""
+        self._target_dir_path = target_dir_path
+        self._records: typing.List[typing.Tuple[str, str, str]] = []
+
+    def add(self, file_path: pathlib.Path, content: bytes) -> None:
+        """Record file written with that content."""
+        self._add(file_path, hashlib.sha256(content), len(content))
+
+    def copy(
+            self,
+            source_file: typing.IO[bytes],
+            file_path: pathlib.Path,
+    ) -> None:
+        """Copy from file object, and record it."""
+        file_hash = hashlib.sha256()
+        size = 0
+        with file_path.open('wb') as target_file:
+            for chunk in iter(lambda: source_file.read(1024 * 1024), b''):
+                target_file.write(chunk)
+                file_hash.update(chunk)
+                size += len(chunk)
+        self._add(file_path, file_hash, size)
+
+    def write(self, file_path: pathlib.Path, content: bytes) -> None:
+        """Write file, and record it."""
+        file_path.write_bytes(content)
+        self.add(file_path, content)
+
+    def write_record(self, record_path: pathlib.Path) -> None:
+        """Write the 'RECORD' file, listing itself without hash."""
+        with record_path.open('w', encoding='utf-8', newline='') as file_:
+            writer = csv.writer(file_)
+            writer.writerows(sorted(self._records))
+            writer.writerow((self._get_record_path(record_path), '', ''))
+
+    def _add(
+            self,
+            file_path: pathlib.Path,
+            file_hash: hashlib._Hash,
+            size: int,
+    ) -> None:
+        hash_str = (
+            base64.urlsafe_b64encode(file_hash.digest()).rstrip(b'=').decode()
+        )
+        self._records.append(
+            (
+                self._get_record_path(file_path),
+                f'sha256={hash_str}',
+                str(size),
+            ),
+        )
+
+    def _get_record_path(self, file_path: pathlib.Path) -> str:
+        record_path = os.path.relpath(file_path, self._target_dir_path)
+        return record_path.replace(os.sep, '/')
+
+
+def _find_dist_info_dir_name(
+        file_names: typing.Iterable[str],
+        wheel_file_name: str,
+) -> typing.Optional[str]:
+    #
+    dist_info_dir_name = None
+    #
+    member_name = _get_metadata_member_name(wheel_file_name)
+    file_names = set(file_names)
+    if member_name in file_names:
+        dist_info_dir_name = member_name.partition('/')[0]
+    else:
+        dist_info_dir_name = next(
+            (
+                file_name.partition('/')[0] for file_name in file_names
+                if file_name.endswith('.dist-info/METADATA')
+                and file_name.count('/') == 1
+            ),
+            None,
+        )
+    #
+    return dist_info_dir_name
+
+
+def _is_wheel_installable(
+        zip_file: zipfile.ZipFile,
+        dist_info_dir_name: str,
+) -> bool:
+    """Check that nothing in this wheel needs another installer."""
+    #
+    wheel_file = parse_metadata(
+        zip_file.read(f'{dist_info_dir_name}/WHEEL'),
+    )
+    is_installable = str(wheel_file['Wheel-Version']).startswith('1.')
+    #
+    data_dir_prefix = dist_info_dir_name[:-len('.dist-info')] + '.data/'
+    for file_name in zip_file.namelist():
+        if file_name.startswith(data_dir_prefix):
+            category = file_name[len(data_dir_prefix):].partition('/')[0]
+            if category not in _WHEEL_DATA_CATEGORIES:
+                is_installable = False
+    #
+    if os.name == 'nt':
+        # Launchers are executables there
+        if _get_script_entry_points(zip_file, dist_info_dir_name):
+            is_installable = False
+    #
+    return is_installable
+
+
+def _get_script_entry_points(
+        zip_file: zipfile.ZipFile,
+        dist_info_dir_name: str,
+) -> typing.Dict[str, str]:
+    """Get the entry points of console and GUI scripts, by script name."""
+    #
+    entry_points: typing.Dict[str, str] = {}
+    #
+    entry_points_file_name = f'{dist_info_dir_name}/entry_points.txt'
+    if entry_points_file_name in zip_file.namelist():
+        parser = configparser.ConfigParser(delimiters=('=',))
+        parser.optionxform = str  # type: ignore[assignment,method-assign]
+        parser.read_string(zip_file.read(entry_points_file_name).decode())
+        for section_name in ('console_scripts', 'gui_scripts'):
+            if parser.has_section(section_name):
+                entry_points.update(parser.items(section_name))
+    #
+    return entry_points
+
+
+def _get_target_file_path(
+        file_name: str,
+        data_dir_prefix: str,
+        target_dir_path: pathlib.Path,
+        scripts_dir_path: pathlib.Path,
+) -> typing.Tuple[pathlib.Path, bool]:
+    """Get path to install the file at, and if it is a script."""
+    #
+    is_script = False
+    #
+    parts = pathlib.PurePosixPath(file_name).parts
+    if pathlib.PurePosixPath(file_name).is_absolute() or '..' in parts:
+        raise CanNotInstallWheel(file_name)
+    #
+    file_path = target_dir_path.joinpath(*parts)
+    if file_name.startswith(data_dir_prefix):
+        is_script = parts[1] == 'scripts'
+        file_path = (
+            scripts_dir_path if is_script else target_dir_path
+        ).joinpath(*parts[2:])
+    #
+    return file_path, is_script
+
+
+def _make_executable(file_path: pathlib.Path) -> None:
+    mode = file_path.stat().st_mode
+    # Executable for whoever can read it
+    file_path.chmod(mode | (mode & 0o444) >> 2)
+
+
+def _get_gui_executable_path(
+        python_executable_path: pathlib.Path,
+) -> pathlib.Path:
+    """Get the interpreter without console, if there is one next to it."""
+    gui_executable_path = python_executable_path.with_name(
+        python_executable_path.name.replace('python', 'pythonw', 1),
+    )
+    if not gui_executable_path.is_file():
+        gui_executable_path = python_executable_path
+    return gui_executable_path
+
+
+def _install_script(
+        installed_files: _InstalledFiles,
+        script_file: typing.IO[bytes],
+        file_path: pathlib.Path,
+        python_executable_path: pathlib.Path,
+) -> None:
+    """Install script, with the interpreter for its '#!python' line."""
+    first_line = script_file.readline()
+    match = _SCRIPT_SHEBANG_REGEX.fullmatch(first_line)
+    if match:
+        is_gui, rest = match.groups()
+        if is_gui:
+            python_executable_path = (
+                _get_gui_executable_path(python_executable_path)
+            )
+        first_line = (
+            b'#!' + str(python_executable_path).encode() + (rest or b'')
+        )
+    installed_files.write(file_path, first_line + script_file.read())
+    _make_executable(file_path)
+
+
+def _write_script_launchers(
+        installed_files: _InstalledFiles,
+        entry_points: typing.Dict[str, str],
+        scripts_dir_path: pathlib.Path,
+        python_executable_path: pathlib.Path,
+) -> None:
+    for script_name, entry_point_str in entry_points.items():
+        module_name, _, object_name = (
+            entry_point_str.partition('[')[0].strip().partition(':')
+        )
+        script_path = scripts_dir_path.joinpath(script_name)
+        script_path.parent.mkdir(parents=True, exist_ok=True)
+        installed_files.write(
+            script_path,
+            _SCRIPT_LAUNCHER_TEMPLATE.format(
+                executable=python_executable_path,
+                import_name=object_name.strip().partition('.')[0],
+                module_name=module_name.strip(),
+                object_name=object_name.strip(),
+            ).encode(),
+        )
+        _make_executable(script_path)
+
+
+def _compile_bytecode(
+        installed_files: _InstalledFiles,
+        file_paths: typing.Iterable[pathlib.Path],
+) -> None:
+    for file_path in file_paths:
+        if file_path.suffix == '.py':
+            if compileall.compile_file(str(file_path), quiet=2):
+                cache_file_path = pathlib.Path(
+                    importlib.util.cache_from_source(str(file_path)),
+                )
+                installed_files.add(
+                    cache_file_path,
+                    cache_file_path.read_bytes(),
+                )
+
+
+def _is_installed_elsewhere(
+        target_dir_path: pathlib.Path,
+        dist_info_dir_name: str,
+) -> bool:
+    """Check if another release of the project is installed there."""
+    #
+    is_installed = False
+    #
+    project_key = packaging.utils.canonicalize_name(
+        dist_info_dir_name.partition('-')[0],
+    )
+    if target_dir_path.is_dir():
+        for item in target_dir_path.iterdir():
+            if item.suffix == '.dist-info' and item.name != dist_info_dir_name:
+                item_project_key = packaging.utils.canonicalize_name(
+                    item.name.partition('-')[0],
+                )
+                if item_project_key == project_key:
+                    is_installed = True
+                    break
+    #
+    return is_installed
+
+
+def _install_wheel_files(  # pylint: disable=too-many-arguments
+        zip_file: zipfile.ZipFile,
+        dist_info_dir_name: str,
+        target_dir_path: pathlib.Path,
+        scripts_dir_path: pathlib.Path,
+        python_executable_path: pathlib.Path,
+        installer_name: str,
+        is_compiling: bool,
+) -> None:
+    #
+    installed_files = _InstalledFiles(target_dir_path)
+    data_dir_prefix = dist_info_dir_name[:-len('.dist-info')] + '.data/'
+    #
+    file_paths = []
+    for zip_info in zip_file.infolist():
+        if zip_info.is_dir() or zip_info.filename.startswith(
+                (
+                    f'{dist_info_dir_name}/RECORD',
+                    f'{dist_info_dir_name}/INSTALLER',
+                ),
+        ):
+            # Also the 'RECORD.jws' and 'RECORD.p7s' signatures
+            continue
+        file_path, is_script = _get_target_file_path(
+            zip_info.filename,
+            data_dir_prefix,
+            target_dir_path,
+            scripts_dir_path,
+        )
+        file_path.parent.mkdir(parents=True, exist_ok=True)
+        with zip_file.open(zip_info) as member_file:
+            if is_script:
+                _install_script(
+                    installed_files,
+                    member_file,
+                    file_path,
+                    python_executable_path,
+                )
+            else:
+                installed_files.copy(member_file, file_path)
+                if zip_info.external_attr >> 16 & 0o111:
+                    _make_executable(file_path)
+                file_paths.append(file_path)
+    #
+    _write_script_launchers(
+        installed_files,
+        _get_script_entry_points(zip_file, dist_info_dir_name),
+        scripts_dir_path,
+        python_executable_path,
+    )
+    if is_compiling:
+        _compile_bytecode(installed_files, file_paths)
+    #
+    dist_info_dir_path = target_dir_path.joinpath(dist_info_dir_name)
+    installed_files.write(
+        dist_info_dir_path.joinpath('INSTALLER'),
+        f'{installer_name}\n'.encode(),
+    )
+    installed_files.write_record(dist_info_dir_path.joinpath('RECORD'))
+
+
+class WheelInstaller(base.Installer):
+    """Install 'wheel' distribution files, in process.
+
+    Anything a bit out of the ordinary, for example an editable
+    installation or a wheel with 'data' or 'headers' files, is left to the
+    next installers.
+    """
+
+    def install_path(
+            self,
+            registry: base.Registry,
+            path: pathlib.Path,
+            target_dir_path: typing.Optional[pathlib.Path],
+            editable: bool,
+    ) -> bool:
+        """Implement abstract."""
+        #
+        is_installed = False
+        #
+        # The scripts need the interpreter of the target environment
+        python_executable_path = (
+            registry.environment.install_destination.python_executable_path
+        )
+        #
+        if (
+                not editable
+                and target_dir_path
+                and python_executable_path
+                and path.suffix == '.whl'
+        ):
+            with zipfile.ZipFile(path) as zip_file:
+                dist_info_dir_name = _find_dist_info_dir_name(
+                    zip_file.namelist(),
+                    path.name,
+                )
+                is_installable = bool(
+                    dist_info_dir_name
+                    and _is_wheel_installable(zip_file, dist_info_dir_name)
+                    and not _is_installed_elsewhere(
+                        target_dir_path,
+                        dist_info_dir_name,
+                    )
+                )
+                if dist_info_dir_name and is_installable:
+                    LOGGER.info(
+                        "Installing '%s' in '%s'",
+                        path,
+                        target_dir_path,
+                    )
+                    _install_wheel_files(
+                        zip_file,
+                        dist_info_dir_name,
+                        target_dir_path,
+                        _get_scripts_dir_path(registry, target_dir_path),
+                        python_executable_path,
+                        registry.application_name,
+                        _is_current_interpreter(registry.environment),
+                    )
+                    is_installed = True
+        #
+        return is_installed
+
+    def install_requirement(
+            self,
+            registry: base.Registry,
+            requirement: base.Requirement,
+            target_dir_path: pathlib.Path,
+    ) -> bool:
+        """Implement abstract."""
+        # Only local wheels
+        return False
+
+
+def _get_scripts_dir_path(
+        registry: base.Registry,
+        target_dir_path: pathlib.Path,
+) -> pathlib.Path:
+    """Get the scripts directory of the environment, or one in the target.
+
+    In the target directory, the same as 'pip install --target'.
+    """
+    destination = registry.environment.install_destination
+    scripts_dir_path = target_dir_path.joinpath('bin')
+    if target_dir_path == destination.purelib_dir_path:
+        scripts_dir_path = destination.scripts_dir_path or scripts_dir_path
+    return scripts_dir_path
+
+
+def _is_current_interpreter(environment: base.Environment) -> bool:
+    """Check if bytecode compiled by this interpreter is of any use there."""
+    python_version = environment.python_version
+    is_current_interpreter = (
+        (python_version.major, python_version.minor) == sys.version_info[:2]
+        and environment.python_implementation_str
+        == platform.python_implementation()
+    )
+    return is_current_interpreter
 
 
 class CanNotBuildWheel(Exception):
@@ -124,10 +808,20 @@ class CanNotFindBuiltWheel(Exception):
     """Can not find the built wheel."""
 
 
+def _build_wheel_with_hooks(
+        registry: base.Registry,
+        source_dir_path: pathlib.Path,
+        target_dir_path: pathlib.Path,
+) -> str:
+    hook_caller = buildenv.make_wheel_hook_caller(registry, source_dir_path)
+    wheel_file_name = hook_caller.build_wheel(str(target_dir_path))
+    return typing.cast(str, wheel_file_name)
+
+
 class Pep517WheelBuilder(
         base.WheelBuilder,
 ):  # pylint: disable=too-few-public-methods
-    """Wheel builder based on PEP517."""
+    """Wheel builder based on PEP517, legacy 'setup.py' projects included."""
 
     def build(
             self,
@@ -139,14 +833,16 @@ class Pep517WheelBuilder(
         #
         wheel_path = None
         #
-        pyproject_toml_file_path = source_dir_path.joinpath('pyproject.toml')
-        #
-        if pyproject_toml_file_path.is_file():
+        if any(
+                source_dir_path.joinpath(file_name).is_file()
+                for file_name in ('pyproject.toml', 'setup.py')
+        ):
             #
             try:
-                wheel_file_name = pep517.envbuild.build_wheel(
-                    str(source_dir_path),
-                    str(target_dir_path),
+                wheel_file_name = _build_wheel_with_hooks(
+                    registry,
+                    source_dir_path,
+                    target_dir_path,
                 )
             except Exception as exc:
                 raise CanNotBuildWheel(source_dir_path) from exc
@@ -245,6 +941,38 @@ class WheelCandidateMaker(base.CandidateMaker):
         return parser_result
 
 
+@functools.lru_cache(maxsize=None)
+def make_tags_lookup(tags: base.Tags) -> typing.FrozenSet[str]:
+    """Make lookup of the tags as strings, to match them in file names."""
+    return frozenset(str(tag) for tag in tags)
+
+
+def is_file_name_compatible(
+        file_name: str,
+        tags_lookup: typing.FrozenSet[str],
+) -> bool:
+    """Check cheaply if a 'wheel' file name has one of the tags.
+
+    Only string operations, no parsing of the name or of the version. Any
+    other file name is considered compatible, it is up to other checks.
+    """
+    #
+    is_compatible = True
+    #
+    if file_name.endswith('.whl'):
+        parts = file_name[:-4].lower().rsplit('-', 3)
+        if len(parts) == 4:
+            _, interpreters_str, abis_str, platforms_str = parts
+            is_compatible = any(
+                f'{interpreter}-{abi}-{platform}' in tags_lookup
+                for interpreter in interpreters_str.split('.')
+                for abi in abis_str.split('.')
+                for platform in platforms_str.split('.')
+            )
+    #
+    return is_compatible
+
+
 def parse_file_path(file_path: pathlib.Path) -> _FilePathParserResult:
     """Parse 'wheel' file path to extract project's key, tags and version."""
     #
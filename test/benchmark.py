@@ -0,0 +1,189 @@
+#
+
+"""Benchmarks, to run on demand, for example with 'make benchmark'."""
+
+import functools
+import json
+import email.parser
+import pathlib
+import tempfile
+import timeit
+import typing
+import zipfile
+
+import packaging.tags
+
+import fj
+
+Files = typing.List[typing.Dict[str, typing.Any]]
+
+PROJECT_URL = 'https://index.example/simple/thing/'
+
+
+def _make_files(files_count: int) -> Files:
+    files = []
+    for index in range(files_count):
+        version_str = f'{index // 100}.{index % 100}'
+        file_name = f'Thing-{version_str}-cp39-cp39-manylinux2014_x86_64.whl'
+        files.append(
+            {
+                'filename': file_name,
+                'hashes': {'sha256': f'{index:064x}'},
+                'requires-python': '>=3.6' if index % 2 else '>=3.7, <4',
+                'url': f'../../packages/{index:04x}/{file_name}',
+                'yanked': bool(index % 50 == 0),
+            },
+        )
+    return files
+
+
+def _make_html_page(files: Files) -> bytes:
+    lines = ['<!DOCTYPE html>', '<html>', '<body>']
+    for file_details in files:
+        yanked_str = ' data-yanked=""' if file_details['yanked'] else ''
+        requires_python_str = (
+            file_details['requires-python']
+            .replace('<', '&lt;')
+            .replace('>', '&gt;')
+        )
+        sha256_str = file_details['hashes']['sha256']
+        href = f"{file_details['url']}#sha256={sha256_str}"
+        lines.append(
+            f'<a href="{href}" data-requires-python="{requires_python_str}"'
+            f'{yanked_str}>{file_details["filename"]}</a>',
+        )
+    lines.extend(['</body>', '</html>'])
+    return '\n'.join(lines).encode()
+
+
+def _make_json_page(files: Files) -> bytes:
+    project_details = {
+        'files': files,
+        'meta': {'api-version': '1.0'},
+        'name': 'thing',
+    }
+    return json.dumps(project_details).encode()
+
+
+def benchmark_parse_links() -> None:
+    """Compare cost of parsing HTML and JSON project pages."""
+    pep503 = fj.lib._solver.pep503  # pylint: disable=protected-access
+    for files_count in (1_000, 10_000):
+        files = _make_files(files_count)
+        for page_format, content, parse in (
+                ('html', _make_html_page(files), pep503.parse_html_links),
+                ('json', _make_json_page(files), pep503.parse_json_links),
+        ):
+            assert len(parse(PROJECT_URL, content)) == files_count
+            timer = timeit.Timer(
+                functools.partial(parse, PROJECT_URL, content),
+            )
+            loops_count, _ = timer.autorange()
+            best_seconds = min(timer.repeat(3, loops_count)) / loops_count
+            print(
+                f'parse_links {page_format} files={files_count} '
+                f'bytes={len(content)} seconds={best_seconds:.4f}',
+            )
+
+
+def benchmark_prefilter_file_names() -> None:
+    """Compare cost of pre-filtering and of parsing names of wheels."""
+    tags_lookup = fj.lib.wheel.make_tags_lookup(
+        frozenset(packaging.tags.sys_tags()),
+    )
+    platforms = ('manylinux2014_x86_64', 'macosx_11_0_arm64', 'win_amd64')
+    file_names = [
+        f'Thing-1.{index}-cp39-cp39-{platforms[index % len(platforms)]}.whl'
+        for index in range(10_000)
+    ]
+    for name, function in (
+            (
+                'is_file_name_compatible',
+                functools.partial(
+                    fj.lib.wheel.is_file_name_compatible,
+                    tags_lookup=tags_lookup,
+                ),
+            ),
+            (
+                'parse_file_path',
+                lambda file_name: fj.lib.wheel.parse_file_path(
+                    pathlib.Path(file_name),
+                ),
+            ),
+    ):
+        timer = timeit.Timer(
+            functools.partial(
+                lambda function_: [function_(item) for item in file_names],
+                function,
+            ),
+        )
+        loops_count, _ = timer.autorange()
+        best_seconds = min(timer.repeat(3, loops_count)) / loops_count
+        print(
+            f'{name} files={len(file_names)} seconds={best_seconds:.4f}',
+        )
+
+
+def _get_metadata_by_scanning(wheel_path: pathlib.Path) -> typing.Any:
+    """Scan the names of all members, as before the direct lookup."""
+    with zipfile.ZipFile(wheel_path) as zip_file:
+        for file_name in zip_file.namelist():
+            if file_name.endswith('.dist-info/METADATA'):
+                return email.parser.BytesParser().parsebytes(
+                    zip_file.read(file_name),
+                    headersonly=True,
+                )
+    return None
+
+
+def benchmark_wheel_metadata() -> None:
+    """Compare cost of looking up 'METADATA' directly and of scanning."""
+    metadata_content = (
+        b'Metadata-Version: 2.1\nName: Thing\nVersion: 1.0\n\n'
+        + b'Long description.\n' * 10_000
+    )
+    with tempfile.TemporaryDirectory() as temp_dir_name:
+        for members_count in (100, 10_000, 50_000):
+            wheel_path = pathlib.Path(
+                temp_dir_name,
+                f'Thing-1.0-{members_count}-py3-none-any.whl',
+            )
+            with zipfile.ZipFile(
+                    wheel_path,
+                    'w',
+                    compression=zipfile.ZIP_DEFLATED,
+            ) as zip_file:
+                for index in range(members_count):
+                    zip_file.writestr(f'thing/module_{index}.py', b'')
+                zip_file.writestr(
+                    'Thing-1.0.dist-info/METADATA',
+                    metadata_content,
+                )
+            for name, function in (
+                    ('get_metadata', fj.lib.wheel.get_metadata),
+                    ('scan_namelist', _get_metadata_by_scanning),
+            ):
+                metadata = function(wheel_path)
+                assert metadata and metadata['Name'] == 'Thing'
+                timer = timeit.Timer(functools.partial(function, wheel_path))
+                loops_count, _ = timer.autorange()
+                best_seconds = (
+                    min(timer.repeat(3, loops_count)) / loops_count
+                )
+                print(
+                    f'{name} members={members_count} '
+                    f'seconds={best_seconds:.6f}',
+                )
+
+
+def main() -> None:
+    """Run all benchmarks."""
+    benchmark_parse_links()
+    benchmark_prefilter_file_names()
+    benchmark_wheel_metadata()
+
+
+if __name__ == '__main__':
+    main()
+
+# EOF
@@ -0,0 +1,183 @@
+#
+
+"""Local HTTP server for the tests, serving canned responses by path."""
+
+import dataclasses
+import http.server
+import threading
+import typing
+import unittest
+
+
+@dataclasses.dataclass
+class Response:
+    """Response served for a path."""
+
+    content: bytes = b''
+    status_code: int = 200
+    headers: typing.Dict[str, str] = dataclasses.field(default_factory=dict)
+    # Answer requests for a range of the content with '206'
+    is_range_supported: bool = True
+    # Close the connection instead of answering
+    is_dropped: bool = False
+    # Seconds to wait before answering
+    delay: float = 0.0
+
+
+@dataclasses.dataclass
+class Request:
+    """Request received by the server."""
+
+    path: str
+    headers: typing.Dict[str, str]
+    # Port of the client, the same one for requests on the same connection
+    client_port: int
+
+
+# A list of responses is served in turn, its last one for all the next
+# requests.
+Responses = typing.Dict[str, typing.Union[Response, typing.List[Response]]]
+
+
+def _parse_range(range_str: str, size: int) -> typing.Tuple[int, int]:
+    """Parse 'bytes=<start>-<end>', 'bytes=<start>-' or 'bytes=-<length>'."""
+    start_str, _, end_str = range_str[len('bytes='):].partition('-')
+    if not start_str:
+        start = max(size - int(end_str), 0)
+        end = size - 1
+    else:
+        start = int(start_str)
+        end = min(int(end_str), size - 1) if end_str else size - 1
+    return (start, end)
+
+
+class _RequestHandler(http.server.BaseHTTPRequestHandler):
+    """Serve the responses of the server, '404' for the unknown paths.
+
+    A request with the 'ETag' of the response in 'If-None-Match' is
+    answered with '304'. A range request is answered with '206', unless its
+    'If-Range' is not the 'ETag' of the response.
+    """
+
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self) -> None:  # pylint: disable=invalid-name
+        """Serve GET request."""
+        server = typing.cast(LocalServer, self.server)
+        response = server.receive(
+            Request(self.path, dict(self.headers), self.client_address[1]),
+        )
+        try:
+            self._answer(response)
+        finally:
+            server.release()
+
+    def log_message(self, *args: object) -> None:
+        """Override."""
+
+    def _answer(self, response: Response) -> None:
+        if response.delay:
+            threading.Event().wait(response.delay)
+        if response.is_dropped:
+            self.close_connection = True
+        else:
+            self._send(response)
+
+    def _send(self, response: Response) -> None:
+        content = response.content
+        status_code = response.status_code
+        headers = dict(response.headers)
+        #
+        etag = headers.get('ETag')
+        range_str = self.headers.get('Range')
+        if etag and self.headers.get('If-None-Match') == etag:
+            status_code = 304
+            content = b''
+        elif (
+                status_code == 200
+                and range_str
+                and response.is_range_supported
+                and self.headers.get('If-Range', etag) == etag
+        ):
+            size = len(content)
+            start, end = _parse_range(range_str, size)
+            if start < size:
+                status_code = 206
+                headers['Content-Range'] = f'bytes {start}-{end}/{size}'
+                content = content[start:end + 1]
+            else:
+                status_code = 416
+                headers['Content-Range'] = f'bytes */{size}'
+                content = b''
+        #
+        self.send_response(status_code)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header('Content-Length', str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+
+class LocalServer(http.server.ThreadingHTTPServer):
+    """HTTP server on a free local port, recording the requests."""
+
+    def __init__(self, responses: Responses) -> None:
+        """Initialize."""
+        super().__init__(('127.0.0.1', 0), _RequestHandler)
+        #
+        self._lock = threading.Lock()
+        self._active_requests_count = 0
+        #
+        self.max_active_requests_count = 0
+        self.requests: typing.List[Request] = []
+        self.responses = responses
+
+    @property
+    def base_url(self) -> str:
+        """URL of the root of the server, without trailing '/'."""
+        return f'http://127.0.0.1:{self.server_address[1]}'
+
+    @property
+    def paths(self) -> typing.List[str]:
+        """Paths of the requests received so far."""
+        return [request.path for request in self.requests]
+
+    def receive(self, request: Request) -> Response:
+        """Record the request, get its response."""
+        with self._lock:
+            self.requests.append(request)
+            self._active_requests_count += 1
+            self.max_active_requests_count = max(
+                self.max_active_requests_count,
+                self._active_requests_count,
+            )
+            responses = self.responses.get(
+                request.path,
+                Response(status_code=404),
+            )
+            if not isinstance(responses, list):
+                response = responses
+            elif len(responses) > 1:
+                response = responses.pop(0)
+            else:
+                response = responses[0]
+        return response
+
+    def release(self) -> None:
+        """Count the request as answered."""
+        with self._lock:
+            self._active_requests_count -= 1
+
+
+def start_server(
+        test_case: unittest.TestCase,
+        responses: Responses,
+) -> LocalServer:
+    """Start a server, stopped when the test case is cleaned up."""
+    server = LocalServer(responses)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    test_case.addCleanup(server.server_close)
+    test_case.addCleanup(server.shutdown)
+    return server
+
+# EOF
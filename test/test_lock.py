@@ -0,0 +1,206 @@
+#
+
+"""Unit tests for the locks for multiple environments."""
+
+import contextlib
+import os
+import tempfile
+import unittest
+import unittest.mock
+
+import packaging.tags
+import packaging.utils
+import packaging.version
+
+import fj
+
+
+class TestParseEnvironmentSpec(unittest.TestCase):
+    """Parse specifications of target environments."""
+
+    def setUp(self) -> None:
+        """Set up a registry for the current environment."""
+        exit_stack = contextlib.ExitStack()
+        self.addCleanup(exit_stack.close)
+        temp_dir_name = exit_stack.enter_context(tempfile.TemporaryDirectory())
+        exit_stack.enter_context(
+            unittest.mock.patch.dict(
+                os.environ,
+                {'XDG_CACHE_HOME': temp_dir_name},
+            ),
+        )
+        self.registry = exit_stack.enter_context(
+            fj.lib.base.build_registry('fj-test'),
+        )
+
+    def _parse(self, environment_spec_str: str) -> fj.lib.base.Environment:
+        environment = fj.lib.lock.parse_environment_spec(
+            self.registry,
+            environment_spec_str,
+        )
+        return environment
+
+    def test_tags(self) -> None:
+        """Get the tags of the target, none of the current interpreter."""
+        for environment_spec_str, included_tag_strs, excluded_tag_strs in (
+                (
+                    'cp38-manylinux2014_x86_64',
+                    [
+                        'cp38-cp38-manylinux_2_17_x86_64',
+                        'cp38-cp38-manylinux1_x86_64',
+                        'cp36-abi3-manylinux2010_x86_64',
+                        'py3-none-any',
+                    ],
+                    [
+                        'cp38-cp38m-manylinux2014_x86_64',
+                        'cp39-cp39-manylinux2014_x86_64',
+                        'cp38-cp38-manylinux_2_24_x86_64',
+                    ],
+                ),
+                (
+                    'cp37-win_amd64.win32',
+                    ['cp37-cp37m-win_amd64', 'cp37-cp37m-win32'],
+                    ['cp37-cp37-win_amd64'],
+                ),
+                (
+                    'pp38-pypy38_pp73-macosx_11_0_arm64',
+                    [
+                        'pp38-pypy38_pp73-macosx_11_0_arm64',
+                        'pp38-pypy38_pp73-macosx_10_15_universal2',
+                        'pp38-none-macosx_11_0_arm64',
+                        'py38-none-any',
+                    ],
+                    ['pp38-pypy38_pp73-macosx_12_0_arm64'],
+                ),
+                (
+                    'pp38-manylinux2014_x86_64',
+                    ['pp38-none-manylinux2014_x86_64'],
+                    [],
+                ),
+        ):
+            with self.subTest(environment_spec_str=environment_spec_str):
+                tag_strs = {
+                    str(tag) for tag in self._parse(environment_spec_str).tags
+                }
+                for tag_str in included_tag_strs:
+                    self.assertIn(tag_str, tag_strs)
+                for tag_str in excluded_tag_strs:
+                    self.assertNotIn(tag_str, tag_strs)
+                # Nothing of the ABI of the current interpreter
+                abi = next(packaging.tags.sys_tags()).abi
+                if not environment_spec_str.startswith(abi):
+                    self.assertFalse(
+                        [
+                            tag_str for tag_str in tag_strs
+                            if f'-{abi}-' in tag_str
+                        ],
+                    )
+
+    def test_markers(self) -> None:
+        """Evaluate markers against the target."""
+        environment = self._parse('pp39-win_amd64')
+        marker_environment = fj.lib.base.get_marker_environment(environment)
+        self.assertEqual(
+            {
+                key: marker_environment[key]
+                for key in (
+                    'implementation_name',
+                    'os_name',
+                    'platform_machine',
+                    'platform_python_implementation',
+                    'platform_system',
+                    'python_full_version',
+                    'python_version',
+                    'sys_platform',
+                )
+            },
+            {
+                'implementation_name': 'pypy',
+                'os_name': 'nt',
+                'platform_machine': 'AMD64',
+                'platform_python_implementation': 'PyPy',
+                'platform_system': 'Windows',
+                'python_full_version': '3.9.0',
+                'python_version': '3.9',
+                'sys_platform': 'win32',
+            },
+        )
+
+    def test_bad_specs(self) -> None:
+        """Refuse what can not be parsed."""
+        for environment_spec_str in (
+                'cp38',
+                'cp38-',
+                'python3-manylinux2014_x86_64',
+                'xy38-manylinux2014_x86_64',
+                'cp38-cp38-manylinux2014_x86_64-extra',
+                'cp38-solaris_sparc',
+        ):
+            with self.subTest(environment_spec_str=environment_spec_str):
+                with self.assertRaises(fj.lib.lock.CanNotParseEnvironmentSpec):
+                    self._parse(environment_spec_str)
+
+
+class TestLockOutput(unittest.TestCase):
+    """Merge the resolutions for each environment into one lock."""
+
+    def test_to_dict(self) -> None:
+        """List each release once, with a marker if not everywhere."""
+        environments = {
+            'linux': unittest.mock.Mock(),
+            'windows': unittest.mock.Mock(),
+        }
+        for environment, marker_environment in (
+                (
+                    environments['linux'],
+                    {'platform_machine': 'x86_64', 'sys_platform': 'linux'},
+                ),
+                (
+                    environments['windows'],
+                    {'platform_machine': 'AMD64', 'sys_platform': 'win32'},
+                ),
+        ):
+            environment.python_implementation_str = 'CPython'
+            environment.python_version = packaging.version.Version('3.8.0')
+            environment.marker_environment = marker_environment
+
+        def candidate(version_str: str) -> unittest.mock.Mock:
+            return unittest.mock.Mock(
+                release_version=packaging.version.Version(version_str),
+            )
+
+        thing = packaging.utils.canonicalize_name('thing')
+        colors = packaging.utils.canonicalize_name('colors')
+        lock = fj.lib.lock.Lock(
+            environments,  # type: ignore[arg-type]
+            {
+                'linux': {thing: candidate('1.0')},
+                'windows': {thing: candidate('1.0'), colors: candidate('2.0')},
+            },
+        )
+        self.assertEqual(
+            lock.to_dict(),
+            {
+                'environments': ['linux', 'windows'],
+                'packages': [
+                    {
+                        'environments': ['windows'],
+                        'marker': (
+                            '(python_version == "3.8"'
+                            ' and sys_platform == "win32"'
+                            ' and platform_machine == "AMD64")'
+                        ),
+                        'name': 'colors',
+                        'version': '2.0',
+                    },
+                    {
+                        'environments': ['linux', 'windows'],
+                        'name': 'thing',
+                        'version': '1.0',
+                    },
+                ],
+            },
+        )
+
+
+# EOF
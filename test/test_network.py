@@ -0,0 +1,490 @@
+#
+
+"""Unit tests for the HTTP traffic and its caches."""
+
+import contextlib
+import hashlib
+import io
+import json
+import os
+import pathlib
+import random
+import tempfile
+import typing
+import unittest
+import unittest.mock
+import zipfile
+
+import requests
+
+import local_server
+
+import fj
+
+
+class TestHttpSession(unittest.TestCase):
+    """Keep the connections alive, retry on transient failures."""
+
+    def _make_http_session(self, retries: int) -> fj.lib.network.HttpSession:
+        http_session = fj.lib.network.HttpSession(
+            fj.lib.network.NetworkSettings(retries=retries, backoff_factor=0),
+        )
+        self.addCleanup(http_session.close)
+        return http_session
+
+    def test_connection_reuse(self) -> None:
+        """Send all the requests to a host on the same connection."""
+        server = local_server.start_server(
+            self,
+            {'/thing/': local_server.Response(b'page')},
+        )
+        http_session = self._make_http_session(0)
+        for _ in range(3):
+            response = http_session.get(server.base_url + '/thing/')
+            self.assertEqual(response.content, b'page')
+        self.assertEqual(len(server.requests), 3)
+        self.assertEqual(
+            len({request.client_port for request in server.requests}),
+            1,
+        )
+        self.assertEqual(http_session.received_bytes_count, 3 * len(b'page'))
+
+    def test_retries(self) -> None:
+        """Retry on server errors and dropped connections, up to the limit."""
+        for failure in (
+                local_server.Response(status_code=503),
+                local_server.Response(is_dropped=True),
+        ):
+            with self.subTest(failure=failure):
+                server = local_server.start_server(
+                    self,
+                    {
+                        '/thing/': [
+                            failure,
+                            failure,
+                            local_server.Response(b'page'),
+                        ],
+                    },
+                )
+                http_session = self._make_http_session(2)
+                response = http_session.get(server.base_url + '/thing/')
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(response.content, b'page')
+                self.assertEqual(len(server.requests), 3)
+
+    def test_retries_exhausted(self) -> None:
+        """Raise on connection errors, return the last server error."""
+        server = local_server.start_server(
+            self,
+            {
+                '/error/': local_server.Response(status_code=503),
+                '/dropped/': local_server.Response(is_dropped=True),
+            },
+        )
+        http_session = self._make_http_session(2)
+        #
+        # The status code is left for the caller to check
+        response = http_session.get(server.base_url + '/error/')
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(server.paths, 3 * ['/error/'])
+        #
+        with self.assertRaises(requests.ConnectionError):
+            http_session.get(server.base_url + '/dropped/')
+        self.assertEqual(server.paths[3:], 3 * ['/dropped/'])
+
+
+LAST_MODIFIED = 'Mon, 19 Oct 2026 10:00:00 GMT'
+
+
+def _make_page(path: str, version: str) -> local_server.Response:
+    page = local_server.Response(
+        f'{path} {version}'.encode(),
+        headers={
+            'Content-Type': 'text/html',
+            'ETag': f'"{version}"',
+            'Last-Modified': LAST_MODIFIED,
+        },
+    )
+    return page
+
+
+class TestPageCache(unittest.TestCase):
+    """Cache index pages on disk, revalidate them."""
+
+    def setUp(self) -> None:
+        """Start a server, and make a cache directory."""
+        self.responses: local_server.Responses = {}
+        self._set_version('v1')
+        self.server = local_server.start_server(self, self.responses)
+        self.base_url = self.server.base_url + '/'
+        #
+        exit_stack = contextlib.ExitStack()
+        self.addCleanup(exit_stack.close)
+        self.cache_dir_path = pathlib.Path(
+            exit_stack.enter_context(tempfile.TemporaryDirectory()),
+        )
+
+    def _set_version(self, version: str) -> None:
+        for path in ['/thing/'] + [f'/thing{index}/' for index in range(4)]:
+            self.responses[path] = _make_page(path, version)
+
+    def _make_page_cache(
+            self,
+            **settings: typing.Any,
+    ) -> fj.lib.network.PageCache:
+        http_session = fj.lib.network.HttpSession(
+            fj.lib.network.NetworkSettings(retries=0, **settings),
+        )
+        self.addCleanup(http_session.close)
+        page_cache = fj.lib.network.PageCache(
+            self.cache_dir_path,
+            http_session,
+        )
+        return page_cache
+
+    def test_revalidation(self) -> None:
+        """Send the validators, use the cached page if not modified."""
+        page_cache = self._make_page_cache(index_cache_max_age=0)
+        url = self.base_url + 'thing/'
+        #
+        for expected_content, expected_validators in (
+                (b'/thing/ v1', (None, None)),
+                (b'/thing/ v1', ('"v1"', LAST_MODIFIED)),
+                (b'/thing/ v2', ('"v1"', LAST_MODIFIED)),
+                (b'/thing/ v2', ('"v2"', LAST_MODIFIED)),
+        ):
+            if expected_content.endswith(b'v2'):
+                self._set_version('v2')
+            page = page_cache.get(url)
+            self.assertEqual(page.status_code, 200)
+            self.assertEqual(page.content, expected_content)
+            request_headers = self.server.requests[-1].headers
+            self.assertEqual(
+                (
+                    request_headers.get('If-None-Match'),
+                    request_headers.get('If-Modified-Since'),
+                ),
+                expected_validators,
+            )
+        self.assertEqual(len(self.server.requests), 4)
+
+    def test_max_age(self) -> None:
+        """Use a cached page younger than the maximum age as is."""
+        page_cache = self._make_page_cache(index_cache_max_age=3600)
+        url = self.base_url + 'thing/'
+        #
+        for _ in range(3):
+            self.assertEqual(page_cache.get(url).content, b'/thing/ v1')
+        self.assertEqual(len(self.server.requests), 1)
+        #
+        # Older than the maximum age
+        for meta_path in self.cache_dir_path.glob('*.json'):
+            meta = json.loads(meta_path.read_bytes())
+            meta['fetched_at'] -= 3601
+            meta_path.write_text(json.dumps(meta))
+        self._set_version('v2')
+        self.assertEqual(page_cache.get(url).content, b'/thing/ v2')
+        self.assertEqual(len(self.server.requests), 2)
+
+    def test_invalid_meta(self) -> None:
+        """Fetch the page again if its cached metadata is not valid."""
+        page_cache = self._make_page_cache(index_cache_max_age=3600)
+        url = self.base_url + 'thing/'
+        page_cache.get(url)
+        #
+        for meta_content in (b'{}', b'[]', b'{"fetched_at": "now"}', b'{'):
+            with self.subTest(meta_content=meta_content):
+                for meta_path in self.cache_dir_path.glob('*.json'):
+                    meta_path.write_bytes(meta_content)
+                requests_count = len(self.server.requests)
+                with self.assertLogs(fj.lib.network.LOGGER, 'WARNING'):
+                    page = page_cache.get(url)
+                self.assertEqual(page.content, b'/thing/ v1')
+                self.assertEqual(
+                    len(self.server.requests),
+                    requests_count + 1,
+                )
+                # Conditional request not possible without the validators
+                self.assertNotIn(
+                    'If-None-Match',
+                    self.server.requests[-1].headers,
+                )
+
+    def test_prune_on_close(self) -> None:
+        """Evict the least recently used pages, above the maximum size."""
+        page_cache = self._make_page_cache(
+            index_cache_max_age=3600,
+            index_cache_max_size=500,
+        )
+        urls = [self.base_url + f'thing{index}/' for index in range(4)]
+        for index, url in enumerate(urls):
+            page_cache.get(url)
+            # Used in that order, the first one last
+            used_at = 1000000000 + (index if index else 10)
+            for body_path in self.cache_dir_path.glob('*.body'):
+                if body_path.read_bytes() == f'/thing{index}/ v1'.encode():
+                    os.utime(body_path, (used_at, used_at))
+        entries_size = sum(
+            path.stat().st_size for path in self.cache_dir_path.iterdir()
+        )
+        self.assertGreater(entries_size, 500)
+        #
+        page_cache.close()
+        #
+        cached_contents = sorted(
+            body_path.read_bytes()
+            for body_path in self.cache_dir_path.glob('*.body')
+        )
+        self.assertEqual(cached_contents, [b'/thing0/ v1', b'/thing3/ v1'])
+        remaining_size = sum(
+            path.stat().st_size for path in self.cache_dir_path.iterdir()
+        )
+        self.assertLessEqual(remaining_size, 500)
+
+
+def _make_random_bytes(size: int) -> bytes:
+    content = random.Random(0).getrandbits(8 * size).to_bytes(size, 'little')
+    return content
+
+
+class TestLazyRemoteFile(unittest.TestCase):
+    """Read remote files with range requests."""
+
+    def setUp(self) -> None:
+        """Start a server."""
+        self.responses: local_server.Responses = {}
+        self.server = local_server.start_server(self, self.responses)
+        self.base_url = self.server.base_url + '/'
+
+    def test_range_reads(self) -> None:
+        """Read anywhere, fetch only the missing blocks."""
+        block_size = fj.lib.network.LazyRemoteFile.BLOCK_SIZE
+        content = _make_random_bytes(10 * block_size + 123)
+        self.responses['/thing.bin'] = local_server.Response(content)
+        http_session = fj.lib.network.HttpSession(
+            fj.lib.network.NetworkSettings(retries=0),
+        )
+        self.addCleanup(http_session.close)
+        #
+        with fj.lib.network.LazyRemoteFile(
+                http_session,
+                self.base_url + 'thing.bin',
+        ) as remote_file:
+            # The tail is fetched first
+            self.assertEqual(len(self.server.requests), 1)
+            self.assertEqual(remote_file.seek(0, io.SEEK_END), len(content))
+            for start, size, expected_requests_count in (
+                    # In the tail, already fetched
+                    (len(content) - 1000, 1000, 1),
+                    (len(content) - 10, 100, 1),
+                    # Across the first two blocks, in one request
+                    (block_size - 10, 20, 2),
+                    (0, 2 * block_size, 2),
+                    (3 * block_size + 5, block_size, 3),
+                    (len(content) + 10, 10, 3),
+            ):
+                with self.subTest(start=start, size=size):
+                    remote_file.seek(start)
+                    self.assertEqual(
+                        remote_file.read(size),
+                        content[start:start + size],
+                    )
+                    self.assertEqual(
+                        len(self.server.requests),
+                        expected_requests_count,
+                    )
+        self.assertLess(http_session.received_bytes_count, len(content))
+
+    def test_range_ignored(self) -> None:
+        """Refuse a server that answers with the whole file."""
+        self.responses['/thing.bin'] = local_server.Response(
+            b'0123456789' * 1000,
+            is_range_supported=False,
+        )
+        http_session = fj.lib.network.HttpSession(
+            fj.lib.network.NetworkSettings(retries=0),
+        )
+        self.addCleanup(http_session.close)
+        with self.assertRaises(fj.lib.network.CanNotRequestRange):
+            fj.lib.network.LazyRemoteFile(
+                http_session,
+                self.base_url + 'thing.bin',
+            )
+
+    def test_wheel_metadata(self) -> None:
+        """Read metadata of remote wheels, download them if not possible."""
+        wheel_file = io.BytesIO()
+        with zipfile.ZipFile(wheel_file, 'w') as zip_file:
+            zip_file.writestr(
+                'thing/data.bin',
+                _make_random_bytes(
+                    4 * fj.lib.network.LazyRemoteFile.TAIL_SIZE,
+                ),
+            )
+            zip_file.writestr(
+                'Thing-1.0.dist-info/METADATA',
+                b'Metadata-Version: 2.1\nName: Thing\nVersion: 1.0\n'
+                b'Requires-Dist: Other\n',
+            )
+        content = wheel_file.getvalue()
+        url = self.base_url + 'Thing-1.0-py3-none-any.whl'
+        #
+        for is_range_supported in (True, False):
+            with self.subTest(is_range_supported=is_range_supported), \
+                    tempfile.TemporaryDirectory() as temp_dir_name:
+                self.responses['/Thing-1.0-py3-none-any.whl'] = (
+                    local_server.Response(
+                        content,
+                        is_range_supported=is_range_supported,
+                    )
+                )
+                environ = {'XDG_CACHE_HOME': temp_dir_name}
+                with unittest.mock.patch.dict(os.environ, environ), \
+                        fj.lib.base.build_registry('fj-test') as registry:
+                    candidate = (
+                        fj.lib.wheel.WheelCandidateMaker.make_from_uri(
+                            registry,
+                            url,
+                            set(),
+                            False,
+                        )
+                    )
+                    assert candidate is not None
+                    self.assertEqual(
+                        candidate.metadata.get_all('Requires-Dist'),
+                        ['Other'],
+                    )
+                    is_downloaded = bool(
+                        registry.services.distribution_cache.list_(),
+                    )
+                    self.assertIsNot(is_downloaded, is_range_supported)
+                    if is_range_supported:
+                        self.assertLess(
+                            registry.network_bytes_count,
+                            len(content),
+                        )
+
+
+class TestCoreMetadata(unittest.TestCase):
+    """Read metadata from PEP658 '.metadata' files, fall back to wheels."""
+
+    def test_core_metadata(self) -> None:
+        """Verify the hash, fall back to the wheel if not possible."""
+        wheel_file = io.BytesIO()
+        with zipfile.ZipFile(wheel_file, 'w') as zip_file:
+            zip_file.writestr(
+                'Thing-1.0.dist-info/METADATA',
+                b'Name: Thing\nVersion: 1.0\nRequires-Dist: FromWheel\n',
+            )
+        metadata_content = (
+            b'Name: Thing\nVersion: 1.0\nRequires-Dist: FromMetadataFile\n'
+        )
+        wheel_path_str = '/Thing-1.0-py3-none-any.whl'
+        metadata_path_str = wheel_path_str + '.metadata'
+        responses: local_server.Responses = {
+            wheel_path_str: local_server.Response(wheel_file.getvalue()),
+        }
+        server = local_server.start_server(self, responses)
+        wheel_uri_str = (
+            server.base_url
+            + wheel_path_str
+            + f'#sha256={hashlib.sha256(wheel_file.getvalue()).hexdigest()}'
+        )
+        #
+        with tempfile.TemporaryDirectory() as temp_dir_name:
+            environ = {'XDG_CACHE_HOME': temp_dir_name}
+            with unittest.mock.patch.dict(os.environ, environ):
+                for (
+                        served_content,
+                        cached_content,
+                        is_connection_error,
+                        expected_require,
+                ) in (
+                        # No '.metadata' file
+                        (None, None, False, 'FromWheel'),
+                        (metadata_content, None, True, 'FromWheel'),
+                        (b'Corrupted', None, False, 'FromWheel'),
+                        (metadata_content, None, False, 'FromMetadataFile'),
+                        # From the cache, no request
+                        (None, metadata_content, False, 'FromMetadataFile'),
+                        (
+                            metadata_content,
+                            b'Corrupted',
+                            False,
+                            'FromMetadataFile',
+                        ),
+                ):
+                    with self.subTest(
+                            served_content=served_content,
+                            cached_content=cached_content,
+                            is_connection_error=is_connection_error,
+                    ):
+                        if served_content is None:
+                            responses.pop(metadata_path_str, None)
+                        else:
+                            responses[metadata_path_str] = (
+                                local_server.Response(served_content)
+                            )
+                        self.assertEqual(
+                            self._get_requires(
+                                wheel_uri_str,
+                                metadata_content,
+                                cached_content,
+                                is_connection_error,
+                            ),
+                            [expected_require],
+                        )
+        # The fragment of the URL is not part of the path of '.metadata'
+        self.assertIn(metadata_path_str, server.paths)
+
+    def _get_requires(
+            self,
+            uri_str: str,
+            metadata_content: bytes,
+            cached_content: typing.Optional[bytes],
+            is_connection_error: bool,
+    ) -> typing.Optional[typing.List[str]]:
+        with fj.lib.base.build_registry('fj-test') as registry:
+            candidate = fj.lib.wheel.WheelCandidateMaker.make_from_uri(
+                registry,
+                uri_str,
+                set(),
+                False,
+            )
+            assert isinstance(candidate, fj.lib.wheel.WheelCandidate)
+            candidate.core_metadata_hashes = {
+                'sha256': hashlib.sha256(metadata_content).hexdigest(),
+            }
+            cache_path = (
+                registry.get_core_metadata_cache_dir_path().joinpath(
+                    'Thing-1.0-py3-none-any.whl.metadata',
+                )
+            )
+            if cached_content is None:
+                cache_path.unlink(missing_ok=True)
+            else:
+                cache_path.parent.mkdir(parents=True, exist_ok=True)
+                cache_path.write_bytes(cached_content)
+            # Never from the wheel kept in the cache of a previous round
+            registry.services.distribution_cache.remove(['*'])
+            #
+            http_session_get = registry.services.http_session.get
+
+            def get(url: str, **kwargs: typing.Any) -> typing.Any:
+                if is_connection_error and url.endswith('.metadata'):
+                    raise requests.ConnectionError(url)
+                return http_session_get(url, **kwargs)
+
+            with unittest.mock.patch.object(
+                    registry.services.http_session,
+                    'get',
+                    get,
+            ):
+                requires = candidate.metadata.get_all('Requires-Dist')
+            #
+            # Only verified metadata is kept in the cache
+            if cache_path.is_file():
+                self.assertEqual(cache_path.read_bytes(), metadata_content)
+        return requires
+
+# EOF
@@ -0,0 +1,479 @@
+#
+
+"""Unit tests for the dependency solver."""
+
+import concurrent.futures
+import dataclasses
+import io
+import os
+import pathlib
+import tempfile
+import threading
+import typing
+import unittest
+import unittest.mock
+import zipfile
+
+import packaging.requirements
+import packaging.utils
+import packaging.version
+import resolvelib
+
+import local_server
+
+import fj
+
+
+def _make_candidate(
+        version_str: str,
+        is_direct: bool = False,
+) -> unittest.mock.Mock:
+    candidate = unittest.mock.Mock(
+        release_version=packaging.version.Version(version_str),
+        is_direct=is_direct,
+    )
+    return candidate
+
+
+class _Finder(  # pylint: disable=too-few-public-methods
+        fj.lib.base.CandidateFinder,
+):
+    """Find the given candidates, or raise the given error."""
+
+    def __init__(
+            self,
+            candidates: typing.Iterable[unittest.mock.Mock] = (),
+            error: typing.Optional[Exception] = None,
+            is_concurrency_safe: bool = True,
+    ) -> None:
+        """Initialize."""
+        self._candidates = list(candidates)
+        self._error = error
+        self.is_concurrency_safe = is_concurrency_safe
+        self.calls_count = 0
+
+    def find_candidates(
+            self,
+            project_key: packaging.utils.NormalizedName,
+            requirements: typing.Iterable[packaging.requirements.Requirement],
+            extras: typing.Set[str],
+    ) -> typing.Iterator[fj.lib.base.Candidate]:
+        """Implement abstract."""
+        self.calls_count += 1
+        if self._error:
+            raise self._error
+        return iter(self._candidates)
+
+
+class TestProviderFindMatches(unittest.TestCase):
+    """Merge the candidates of the finders in order of priority."""
+
+    def setUp(self) -> None:
+        """Set up a registry with a real executor for the finders."""
+        executor = concurrent.futures.ThreadPoolExecutor()
+        self.addCleanup(executor.shutdown)
+        self.registry = unittest.mock.Mock()
+        self.registry.get_executor.return_value = executor
+        self.requirements = [packaging.requirements.Requirement('Thing')]
+
+    def _find_matches(
+            self,
+            finders: typing.Iterable[fj.lib.base.CandidateFinder],
+    ) -> typing.List[fj.lib.base.Candidate]:
+        # pylint: disable=protected-access
+        provider = fj.lib._solver.provider.Provider(
+            self.registry,
+            finders,
+            False,
+        )
+        matches = provider.find_matches(self.requirements)
+        return matches
+
+    def test_merged_order(self) -> None:
+        """Keep the order of the finders, sort the candidates of each."""
+        candidates = [
+            _make_candidate(version_str)
+            for version_str in ('1.0', '1.0', '3.0', '2.0', '0.1')
+        ]
+        matches = self._find_matches(
+            [
+                _Finder(candidates[0:1], is_concurrency_safe=False),
+                _Finder(candidates[1:2]),
+                _Finder([candidates[3], candidates[2]]),
+                _Finder(candidates[4:5], is_concurrency_safe=False),
+            ],
+        )
+        self.assertEqual(
+            matches,
+            [
+                candidates[0],
+                candidates[1],
+                candidates[2],
+                candidates[3],
+                candidates[4],
+            ],
+        )
+
+    def test_direct_candidate(self) -> None:
+        """Do not start the other finders for a direct candidate."""
+        direct_candidate = _make_candidate('1.0', is_direct=True)
+        index_finders = [_Finder([_make_candidate('2.0')]) for _ in range(2)]
+        matches = self._find_matches(
+            [
+                _Finder([direct_candidate], is_concurrency_safe=False),
+                *index_finders,
+            ],
+        )
+        self.assertEqual(matches, [direct_candidate])
+        for index_finder in index_finders:
+            self.assertEqual(index_finder.calls_count, 0)
+        self.registry.get_executor.assert_not_called()
+
+    def test_errors(self) -> None:
+        """Raise errors of needed finders, log the ones of the others."""
+        with self.subTest(case='needed'):
+            with self.assertRaises(RuntimeError):
+                self._find_matches(
+                    [
+                        _Finder([_make_candidate('1.0')]),
+                        _Finder(error=RuntimeError('needed')),
+                    ],
+                )
+        #
+        with self.subTest(case='unneeded'):
+            direct_candidate = _make_candidate('1.0', is_direct=True)
+            is_started = threading.Event()
+
+            class _WaitingFinder(  # pylint: disable=too-few-public-methods
+                    _Finder,
+            ):
+
+                def find_candidates(
+                        self,
+                        *args: typing.Any,
+                ) -> typing.Iterator[fj.lib.base.Candidate]:
+                    # So that the other finder can not be cancelled anymore
+                    is_started.wait(10)
+                    return super().find_candidates(*args)
+
+            class _StartedFinder(  # pylint: disable=too-few-public-methods
+                    _Finder,
+            ):
+
+                def find_candidates(
+                        self,
+                        *args: typing.Any,
+                ) -> typing.Iterator[fj.lib.base.Candidate]:
+                    is_started.set()
+                    return super().find_candidates(*args)
+
+            with self.assertLogs('fj.lib._solver.provider') as logs:
+                matches = self._find_matches(
+                    [
+                        _WaitingFinder([direct_candidate]),
+                        _StartedFinder(error=RuntimeError('unneeded')),
+                    ],
+                )
+            self.assertEqual(matches, [direct_candidate])
+            self.assertEqual(len(logs.records), 1)
+            self.assertIn('unneeded', logs.output[0])
+
+
+class TestSolveProfile(unittest.TestCase):
+    """Measure the dependency resolutions."""
+
+    def test_report(self) -> None:
+        """Count rounds and pins, time the finders and the provider."""
+        candidate = _make_candidate('1.0')
+        candidate.project_key = 'thing'
+        profile = fj.lib.profiling.SolveProfile()
+        with fj.lib.base.build_registry('fj-test') as registry:
+            registry.services.solve_profile = profile
+            resolution = fj.lib.solve.solve_with_finders(
+                registry,
+                [_Finder([candidate])],
+                [packaging.requirements.Requirement('Thing')],
+                skip_depencencies=True,
+            )
+        assert resolution is not None
+        self.assertEqual(list(resolution.mapping.values()), [candidate])
+        #
+        report = profile.make_report()
+        self.assertEqual(report['counters']['resolutions'], 1)
+        self.assertEqual(report['counters']['pins'], 1)
+        self.assertEqual(report['counters']['backtracks'], 0)
+        self.assertGreaterEqual(report['counters']['rounds'], 1)
+        self.assertEqual(
+            {
+                category: {
+                    name: timing['calls']
+                    for name, timing in category_timings.items()
+                }
+                for category, category_timings in report['timings'].items()
+            },
+            {
+                'finder': {'_Finder': 1},
+                'provider': {'find_matches': 1, 'get_dependencies': 1},
+                'solve': {'resolve': 1},
+            },
+        )
+        #
+        trace_events = profile.make_chrome_trace()['traceEvents']
+        self.assertEqual(
+            sorted(trace_event['name'] for trace_event in trace_events),
+            ['_Finder', 'find_matches', 'get_dependencies', 'resolve'],
+        )
+        self.assertEqual(
+            {trace_event['ph'] for trace_event in trace_events},
+            {'X'},
+        )
+
+    def test_reporter(self) -> None:
+        """Count the backtracks of the solver."""
+        profile = fj.lib.profiling.SolveProfile()
+        reporter = fj.lib.profiling.ProfilingReporter(profile)
+        for _ in range(2):
+            reporter.backtracking(_make_candidate('1.0'))
+        reporter.starting_round(0)
+        self.assertEqual(
+            profile.make_report()['counters'],
+            {
+                'backtracks': 2,
+                'network_bytes': 0,
+                'pins': 0,
+                'resolutions': 0,
+                'rounds': 1,
+            },
+        )
+
+
+class TestActiveFinder(unittest.TestCase):
+    """Index the active distributions by project key."""
+
+    @staticmethod
+    def _make_search_path(temp_dir_path: pathlib.Path) -> typing.List[str]:
+        site_dir_path = temp_dir_path.joinpath('site')
+        dist_info_dir_path = site_dir_path.joinpath('Some_Thing-1.0.dist-info')
+        dist_info_dir_path.mkdir(parents=True)
+        dist_info_dir_path.joinpath('METADATA').write_text(
+            'Metadata-Version: 2.1\nName: Some_Thing\nVersion: 1.0\n',
+            encoding='utf-8',
+        )
+        egg_info_dir_path = site_dir_path.joinpath('Other.egg-info')
+        egg_info_dir_path.mkdir()
+        egg_info_dir_path.joinpath('PKG-INFO').write_text(
+            'Metadata-Version: 1.1\nName: Other\nVersion: 2.0\n',
+            encoding='utf-8',
+        )
+        site_dir_path.joinpath('Single-3.0-py3.8.egg-info').write_text(
+            'Metadata-Version: 1.1\nName: Single\nVersion: 3.0\n',
+            encoding='utf-8',
+        )
+        # Neither a metadata directory nor an old metadata file
+        site_dir_path.joinpath('Ignored-1.0.dist-info').write_bytes(b'')
+        #
+        zip_path = temp_dir_path.joinpath('zipped.zip')
+        with zipfile.ZipFile(zip_path, 'w') as zip_file:
+            zip_file.writestr(
+                'Zipped-4.0.dist-info/METADATA',
+                'Metadata-Version: 2.1\nName: Zipped\nVersion: 4.0\n',
+            )
+        #
+        search_path = [str(site_dir_path), str(zip_path)]
+        return search_path
+
+    def test_index(self) -> None:
+        """Parse versions from the names, read metadata only without."""
+        with tempfile.TemporaryDirectory() as temp_dir_name:
+            search_path = self._make_search_path(pathlib.Path(temp_dir_name))
+            # pylint: disable=protected-access
+            distributions = fj.lib._solver.active._index_distributions(
+                search_path,
+            )
+            self.assertEqual(
+                {
+                    project_key: [
+                        (
+                            str(release_version) if release_version else None,
+                            distribution.metadata['Version'],
+                        )
+                        for _, release_version, distribution in items
+                    ]
+                    for project_key, items in distributions.items()
+                },
+                {
+                    'other': [(None, '2.0')],
+                    'single': [('3.0', '3.0')],
+                    'some-thing': [('1.0', '1.0')],
+                    'zipped': [(None, '4.0')],
+                },
+            )
+
+    def test_find_candidates(self) -> None:
+        """Look up the candidates by normalized project key."""
+        with tempfile.TemporaryDirectory() as temp_dir_name, \
+                fj.lib.base.build_registry('fj-test') as registry:
+            environment = dataclasses.replace(
+                registry.environment,
+                search_path=self._make_search_path(
+                    pathlib.Path(temp_dir_name),
+                ),
+            )
+            # pylint: disable=protected-access
+            finder = fj.lib._solver.active.ActiveFinder(
+                registry.derive(environment),
+            )
+            for requirement_str, expected_version_strs in (
+                    ('Some.Thing', ['1.0']),
+                    ('some-thing<1', []),
+                    ('SINGLE', ['3.0']),
+                    ('Zipped>=4', ['4.0']),
+                    ('Missing', []),
+            ):
+                with self.subTest(requirement_str=requirement_str):
+                    requirement = packaging.requirements.Requirement(
+                        requirement_str,
+                    )
+                    candidates = finder.find_candidates(
+                        packaging.utils.canonicalize_name(requirement.name),
+                        [requirement],
+                        set(),
+                    )
+                    self.assertEqual(
+                        [
+                            str(candidate.release_version)
+                            for candidate in candidates
+                        ],
+                        expected_version_strs,
+                    )
+
+
+def _make_wheel_content(name: str, version_str: str, *requires: str) -> bytes:
+    metadata_content = (
+        f'Metadata-Version: 2.1\nName: {name}\nVersion: {version_str}\n'
+        + ''.join(f'Requires-Dist: {require}\n' for require in requires)
+    )
+    wheel_file = io.BytesIO()
+    with zipfile.ZipFile(wheel_file, 'w') as zip_file:
+        zip_file.writestr(
+            f'{name}-{version_str}.dist-info/METADATA',
+            metadata_content,
+        )
+    return wheel_file.getvalue()
+
+
+def _make_index_responses(
+        files: typing.Dict[str, bytes],
+) -> local_server.Responses:
+    """Serve the project pages and the wheels of a small index."""
+    pages: typing.Dict[str, str] = {}
+    responses: local_server.Responses = {}
+    for file_name, content in sorted(files.items()):
+        project_key = packaging.utils.canonicalize_name(
+            file_name.partition('-')[0],
+        )
+        pages[project_key] = (
+            pages.get(project_key, '')
+            + f'<a href="/files/{file_name}">{file_name}</a>'
+        )
+        # Whole downloads, so that the wheels are kept in the cache
+        responses[f'/files/{file_name}'] = local_server.Response(
+            content,
+            is_range_supported=False,
+        )
+    for page_key, page in pages.items():
+        responses[f'/simple/{page_key}/'] = local_server.Response(
+            page.encode(),
+            headers={'Content-Type': 'text/html'},
+        )
+    return responses
+
+
+class TestOfflineResolution(unittest.TestCase):
+    """Solve with only what is already in the caches."""
+
+    def test_offline(self) -> None:
+        """Send no request, report the files missing from the caches."""
+        files = {
+            'Thing-1.0-py3-none-any.whl': _make_wheel_content(
+                'Thing',
+                '1.0',
+                'Other',
+            ),
+            'Other-1.0-py3-none-any.whl': _make_wheel_content('Other', '1.0'),
+            'Other-2.0-py3-none-any.whl': _make_wheel_content('Other', '2.0'),
+        }
+        server = local_server.start_server(
+            self,
+            _make_index_responses(files),
+        )
+        index_url = server.base_url + '/simple/'
+        #
+        with tempfile.TemporaryDirectory() as temp_dir_name:
+            environ = {'XDG_CACHE_HOME': temp_dir_name}
+            with unittest.mock.patch.dict(os.environ, environ):
+                # Online, to fill the caches
+                resolution = self._solve(
+                    index_url,
+                    False,
+                    ['Thing', 'Other<2'],
+                )
+                assert resolution is not None
+                self.assertEqual(
+                    sorted(
+                        str(candidate.release_version)
+                        for candidate in resolution.mapping.values()
+                    ),
+                    ['1.0', '1.0'],
+                )
+                requests_count = len(server.requests)
+                self.assertGreater(requests_count, 0)
+                #
+                resolution = self._solve(
+                    index_url,
+                    True,
+                    ['Thing', 'Other<2'],
+                )
+                self.assertIsNotNone(resolution)
+                #
+                with self.assertLogs(fj.lib.solve.LOGGER, 'ERROR') as logs:
+                    resolution = self._solve(index_url, True, ['Other>=2'])
+                self.assertIsNone(resolution)
+                self.assertIn(
+                    '/files/Other-2.0-py3-none-any.whl',
+                    logs.output[0],
+                )
+                #
+                self.assertEqual(len(server.requests), requests_count)
+
+    @staticmethod
+    def _solve(
+            index_url: str,
+            is_offline: bool,
+            requirement_strs: typing.Iterable[str],
+    ) -> typing.Optional[resolvelib.resolvers.Result]:
+        network_settings = fj.lib.network.NetworkSettings(
+            indexes=[fj.lib.network.IndexSettings([index_url])],
+            is_offline=is_offline,
+            retries=0,
+        )
+        with fj.lib.base.build_registry(
+                'fj-test',
+                network_settings=network_settings,
+        ) as registry:
+            registry.direct_uri_candidate_makers = [
+                fj.lib.wheel.WheelCandidateMaker(),
+            ]
+            # pylint: disable=protected-access
+            finders = fj.lib._solver.pep503.make_index_finders(registry)
+            resolution = fj.lib.solve.solve_with_finders(
+                registry,
+                finders,
+                [
+                    packaging.requirements.Requirement(requirement_str)
+                    for requirement_str in requirement_strs
+                ],
+            )
+        return resolution
+
+# EOF
@@ -2,7 +2,28 @@
 
 """Unit tests."""
 
+import functools
+import hashlib
+import itertools
+import json
+import os
+import pathlib
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import typing
 import unittest
+import unittest.mock
+
+import packaging.requirements
+import packaging.tags
+import packaging.utils
+import packaging.version
+
+import local_server
 
 import fj
 
@@ -81,4 +102,787 @@ class TestParseDistributionExtras(unittest.TestCase):
                 self.assertEqual(test_item[1][1], extras)
 
 
+class TestVersionIndex(unittest.TestCase):
+    """Index of releases sorted by version."""
+
+    VERSION_STRS = [
+        '0.1',
+        '1!0.5',
+        '1.0',
+        '1.0+local.1',
+        '1.0.dev0',
+        '1.0.post1',
+        '1.0a1',
+        '1.1',
+        '1.2',
+        '1.2.0.post2',
+        '1.2.5',
+        '1.2.5+abc',
+        '1.2rc1',
+        '1.3',
+        '1.3.dev4',
+        '10.0',
+        '2.0',
+        '2.0.0+x',
+    ]
+
+    SPECIFIER_STRS = [
+        '',
+        '!=1.2',
+        '<1.2',
+        '<1.3.dev4',
+        '<=1.2',
+        '==1!0.5',
+        '==1.*',
+        '==1.0',
+        '==1.0+local.1',
+        '==1.2.*',
+        '==2.0.0',
+        '===1.0',
+        '>1.0',
+        '>1.0.post1',
+        '>=1!0',
+        '>=1.0',
+        '>=1.0,<2',
+        '>=1.0a1',
+        '~=1.0a1',
+        '~=1.2',
+        '~=1.2.0',
+    ]
+
+    def test_find_matches_specifiers(self) -> None:
+        """Find same releases as checking each version individually."""
+        versions = [
+            packaging.version.Version(version_str)
+            for version_str in self.VERSION_STRS
+        ]
+        version_index_class = (
+            # pylint: disable=protected-access
+            fj.lib._solver.versions.VersionIndex
+        )
+        version_index = version_index_class(
+            (version, str(version)) for version in versions
+        )
+        #
+        specifier_pairs = itertools.product(self.SPECIFIER_STRS, repeat=2)
+        for specifier_pair in specifier_pairs:
+            with self.subTest(specifier_pair=specifier_pair):
+                requirements = [
+                    packaging.requirements.Requirement(f'Thing{specifier}')
+                    for specifier in specifier_pair
+                ]
+                expected_versions = sorted(
+                    (
+                        version
+                        for version in versions
+                        if all(
+                            version in requirement.specifier
+                            for requirement in requirements
+                        )
+                    ),
+                    reverse=True,
+                )
+                found_versions = [
+                    version for version, _ in version_index.find(requirements)
+                ]
+                self.assertEqual(expected_versions, found_versions)
+
+
+class TestParseIndexLinks(unittest.TestCase):
+    """Parse links from the project pages of an index."""
+
+    PAGE_URL = 'https://index.example/simple/thing/'
+
+    HTML_CONTENT = b"""<!DOCTYPE html>
+<html>
+<body>
+<a href="../../files/Thing-1.0.tar.gz#sha256=abc">Thing-1.0.tar.gz</a>
+<a href="https://files.example/Thing-1.1-py3-none-any.whl"
+    data-dist-info-metadata="sha256=def"
+    data-requires-python="&gt;=3.8">Thing-1.1-py3-none-any.whl</a>
+<a href="../../files/Thing-1.2.tar.gz" data-yanked="">Thing-1.2.tar.gz</a>
+</body>
+</html>
+"""
+
+    JSON_CONTENT = json.dumps(
+        {
+            'files': [
+                {
+                    'filename': 'Thing-1.0.tar.gz',
+                    'hashes': {'sha256': 'abc'},
+                    'url': '../../files/Thing-1.0.tar.gz',
+                },
+                {
+                    'core-metadata': {'sha256': 'def'},
+                    'filename': 'Thing-1.1-py3-none-any.whl',
+                    'hashes': {},
+                    'requires-python': '>=3.8',
+                    'url': 'https://files.example/Thing-1.1-py3-none-any.whl',
+                },
+                {
+                    'filename': 'Thing-1.2.tar.gz',
+                    'hashes': {},
+                    'url': '../../files/Thing-1.2.tar.gz',
+                    'yanked': '',
+                },
+            ],
+            'meta': {'api-version': '1.0'},
+            'name': 'thing',
+        },
+    ).encode()
+
+    def test_parse_html_and_json(self) -> None:
+        """Parse same links from HTML and JSON pages."""
+        pep503 = fj.lib._solver.pep503  # pylint: disable=protected-access
+        #
+        html_links = pep503.parse_html_links(self.PAGE_URL, self.HTML_CONTENT)
+        json_links = pep503.parse_json_links(self.PAGE_URL, self.JSON_CONTENT)
+        #
+        self.assertEqual(html_links, json_links)
+        self.assertEqual(
+            [link.url for link in json_links],
+            [
+                'https://index.example/files/Thing-1.0.tar.gz',
+                'https://files.example/Thing-1.1-py3-none-any.whl',
+                'https://index.example/files/Thing-1.2.tar.gz',
+            ],
+        )
+        self.assertEqual(
+            [link.is_yanked for link in json_links],
+            [False, False, True],
+        )
+        self.assertEqual(
+            [link.core_metadata_hashes for link in json_links],
+            [None, {'sha256': 'def'}, None],
+        )
+
+
+class TestIndexMirrors(unittest.TestCase):
+    """Fetch project pages from several mirrors of an index."""
+
+    def _start_server(
+            self,
+            status_code: int,
+    ) -> typing.Tuple[str, local_server.LocalServer]:
+        threshold = fj.lib.network.CircuitBreaker.FAILURES_THRESHOLD
+        responses: local_server.Responses = {}
+        for project_key in ['thing'] + [
+                f'thing{index}' for index in range(threshold + 2)
+        ]:
+            file_name = f'{project_key}-1.0-py3-none-any.whl'
+            responses[f'/simple/{project_key}/'] = local_server.Response(
+                f'<a href="{file_name}">{file_name}</a>'.encode(),
+                status_code,
+                {'Content-Type': 'text/html'},
+            )
+        server = local_server.start_server(self, responses)
+        url = server.base_url + '/simple/'
+        return url, server
+
+    def test_failing_mirror_is_left_out(self) -> None:
+        """Use the healthy mirror, leave out the failing one for a while."""
+        failing_url, failing_server = self._start_server(503)
+        healthy_url, healthy_server = self._start_server(200)
+        #
+        network_settings = fj.lib.network.NetworkSettings(retries=0)
+        with fj.lib.base.build_registry(
+                'fj-test',
+                network_settings=network_settings,
+        ) as registry, tempfile.TemporaryDirectory() as cache_dir_name:
+            registry.direct_uri_candidate_makers = [
+                fj.lib.wheel.WheelCandidateMaker(),
+            ]
+            registry.services.index_page_cache = fj.lib.network.PageCache(
+                pathlib.Path(cache_dir_name),
+                registry.services.http_session,
+            )
+            pep503 = fj.lib._solver.pep503  # pylint: disable=protected-access
+            finder = pep503.SimpleIndexFinder(
+                registry,
+                failing_url,
+                [healthy_url],
+            )
+            threshold = fj.lib.network.CircuitBreaker.FAILURES_THRESHOLD
+            for index in range(threshold + 2):
+                project_key = packaging.utils.canonicalize_name(
+                    f'thing{index}',
+                )
+                requirement = packaging.requirements.Requirement(project_key)
+                candidates = list(
+                    finder.find_candidates(project_key, [requirement], set()),
+                )
+                self.assertEqual(
+                    [str(item.release_version) for item in candidates],
+                    ['1.0'],
+                )
+            #
+            self.assertEqual(len(healthy_server.paths), threshold + 2)
+            # The failures are recorded in the background, so there might be
+            # one more request than the threshold.
+            self.assertLessEqual(len(failing_server.paths), threshold + 1)
+
+    def test_base_urls_and_failures(self) -> None:
+        """Add missing trailing '/' to base URLs, log each failure once."""
+        healthy_url, healthy_server = self._start_server(200)
+        # Nothing listens on that port anymore
+        with socket.socket() as unused_socket:
+            unused_socket.bind(('127.0.0.1', 0))
+            unused_port = unused_socket.getsockname()[1]
+        unreachable_url = f'http://127.0.0.1:{unused_port}/simple'
+        #
+        network_settings = fj.lib.network.NetworkSettings(retries=0)
+        with fj.lib.base.build_registry(
+                'fj-test',
+                network_settings=network_settings,
+        ) as registry, tempfile.TemporaryDirectory() as cache_dir_name:
+            registry.direct_uri_candidate_makers = [
+                fj.lib.wheel.WheelCandidateMaker(),
+            ]
+            registry.services.index_page_cache = fj.lib.network.PageCache(
+                pathlib.Path(cache_dir_name),
+                registry.services.http_session,
+            )
+            pep503 = fj.lib._solver.pep503  # pylint: disable=protected-access
+            project_key = packaging.utils.canonicalize_name('thing')
+            requirement = packaging.requirements.Requirement(project_key)
+            #
+            finder = pep503.SimpleIndexFinder(
+                registry,
+                healthy_url.rstrip('/'),
+            )
+            candidates = list(
+                finder.find_candidates(project_key, [requirement], set()),
+            )
+            self.assertEqual(len(candidates), 1)
+            self.assertEqual(healthy_server.paths, ['/simple/thing/'])
+            #
+            finder = pep503.SimpleIndexFinder(
+                registry,
+                unreachable_url,
+                [unreachable_url + '/'],
+            )
+            with self.assertLogs(pep503.LOGGER, 'WARNING') as logs:
+                with self.assertRaises(pep503.CanNotFetchProjectPage):
+                    list(
+                        finder.find_candidates(
+                            project_key,
+                            [requirement],
+                            set(),
+                        ),
+                    )
+            self.assertEqual(len(logs.records), 2)
+
+
+class TestLocalDirectoryFinder(unittest.TestCase):
+    """Find candidates in a local directory of distribution files."""
+
+    def test_index_is_refreshed(self) -> None:
+        """Index file names by project, refresh when directory changes."""
+        local = fj.lib._solver.local  # pylint: disable=protected-access
+        project_key = packaging.utils.canonicalize_name('thing')
+        requirement = packaging.requirements.Requirement('Thing')
+        #
+        with tempfile.TemporaryDirectory() as temp_dir_name:
+            temp_dir_path = pathlib.Path(temp_dir_name)
+            dir_path = temp_dir_path.joinpath('find-links')
+            dir_path.mkdir()
+            for file_name in (
+                    'README.txt',
+                    'Other-1.0.tar.gz',
+                    'Thing-1.0.tar.gz',
+                    'Thing-2.0-py3-none-any.whl',
+                    'Thing-2.0.tar.gz',
+            ):
+                dir_path.joinpath(file_name).touch()
+            #
+            environ = {'XDG_CACHE_HOME': str(temp_dir_path.joinpath('cache'))}
+            with unittest.mock.patch.dict(os.environ, environ):
+                with fj.lib.base.build_registry('fj-test') as registry:
+                    registry.direct_uri_candidate_makers = [
+                        fj.ext.sdist.SdistCandidateMaker(),
+                        fj.lib.wheel.WheelCandidateMaker(),
+                    ]
+                    for file_names, expected_names in (
+                            (
+                                [],
+                                [
+                                    'thing-2.0(WheelCandidate)',
+                                    'thing-1.0(SdistCandidate)',
+                                ],
+                            ),
+                            (
+                                ['Thing-3.0.zip'],
+                                [
+                                    'thing-3.0(SdistCandidate)',
+                                    'thing-2.0(WheelCandidate)',
+                                    'thing-1.0(SdistCandidate)',
+                                ],
+                            ),
+                    ):
+                        with self.subTest(file_names=file_names):
+                            for file_name in file_names:
+                                dir_path.joinpath(file_name).touch()
+                                os.utime(dir_path, ns=(0, 0))
+                            finder = local.LocalDirectoryFinder(
+                                registry,
+                                dir_path,
+                            )
+                            candidates = finder.find_candidates(
+                                project_key,
+                                [requirement],
+                                set(),
+                            )
+                            self.assertEqual(
+                                [str(candidate) for candidate in candidates],
+                                expected_names,
+                            )
+                    #
+                    file_names_index = local.load_file_names_index(
+                        registry,
+                        dir_path,
+                    )
+            #
+            self.assertEqual(
+                sorted(file_names_index),
+                ['other', 'thing'],
+            )
+
+
+class TestDownloadDistribution(unittest.TestCase):
+    """Download distribution files to the cache."""
+
+    def _start_server(self, content: bytes) -> str:
+        server = local_server.start_server(
+            self,
+            {'/Thing-1.0-py3-none-any.whl': local_server.Response(content)},
+        )
+        url = server.base_url + '/Thing-1.0-py3-none-any.whl'
+        return url
+
+    def test_hash_is_verified(self) -> None:
+        """Publish only verified files, fetch corrupt cached files again."""
+        content = b'wheel content'
+        url = self._start_server(content)
+        #
+        good_hash_str = hashlib.sha256(content).hexdigest()
+        bad_hash_str = hashlib.sha256(b'other content').hexdigest()
+        #
+        with tempfile.TemporaryDirectory() as temp_dir_name:
+            environ = {'XDG_CACHE_HOME': temp_dir_name}
+            with unittest.mock.patch.dict(os.environ, environ), \
+                    fj.lib.base.build_registry('fj-test') as registry:
+                distribution_cache = registry.services.distribution_cache
+                make_candidate = functools.partial(
+                    fj.lib.wheel.WheelCandidateMaker.make_from_uri,
+                    registry,
+                    extras=set(),
+                    is_direct=False,
+                )
+                #
+                candidate = make_candidate(f'{url}#sha256={bad_hash_str}')
+                assert isinstance(candidate, fj.lib.wheel.WheelCandidate)
+                with self.assertRaises(fj.lib.distribution.CanNotVerifyHash):
+                    _ = candidate.path
+                self.assertEqual(distribution_cache.list_(), [])
+                #
+                for _ in range(2):
+                    candidate = make_candidate(
+                        f'{url}#sha256={good_hash_str}',
+                    )
+                    assert isinstance(
+                        candidate,
+                        fj.lib.wheel.WheelCandidate,
+                    )
+                    self.assertEqual(candidate.path.read_bytes(), content)
+                    self.assertEqual(
+                        [entry.path for entry in distribution_cache.list_()],
+                        [candidate.path],
+                    )
+                    # Corrupt it, for the next round
+                    candidate.path.write_bytes(b'truncated')
+
+    def test_hash_without_sha256(self) -> None:
+        """Verify the strongest of the hashes, even without 'sha256'."""
+        content = b'wheel content'
+        url = self._start_server(content)
+        #
+        with tempfile.TemporaryDirectory() as temp_dir_name:
+            environ = {'XDG_CACHE_HOME': temp_dir_name}
+            with unittest.mock.patch.dict(os.environ, environ), \
+                    fj.lib.base.build_registry('fj-test') as registry:
+                for fragment, is_verified in (
+                        (
+                            f'sha512={hashlib.sha512(b"other").hexdigest()}'
+                            f'&md5={hashlib.md5(content).hexdigest()}',
+                            False,
+                        ),
+                        (
+                            f'md5={hashlib.md5(b"other").hexdigest()}'
+                            f'&sha384={hashlib.sha384(content).hexdigest()}',
+                            True,
+                        ),
+                ):
+                    with self.subTest(fragment=fragment):
+                        candidate = (
+                            fj.lib.wheel.WheelCandidateMaker.make_from_uri(
+                                registry,
+                                f'{url}#{fragment}',
+                                set(),
+                                False,
+                            )
+                        )
+                        assert isinstance(
+                            candidate,
+                            fj.lib.wheel.WheelCandidate,
+                        )
+                        if is_verified:
+                            self.assertEqual(
+                                candidate.path.read_bytes(),
+                                content,
+                            )
+                        else:
+                            with self.assertRaises(
+                                    fj.lib.distribution.CanNotVerifyHash,
+                            ):
+                                _ = candidate.path
+
+
+class TestFetchCandidates(unittest.TestCase):
+    """Fetch the distribution files of a resolution concurrently."""
+
+    def test_downloads_per_host_are_limited(self) -> None:
+        """Download all files, not more at once than allowed for a host."""
+        server = local_server.start_server(
+            self,
+            {
+                f'/Thing{index}-1.0-py3-none-any.whl': local_server.Response(
+                    b'content',
+                    delay=0.1,
+                )
+                for index in range(6)
+            },
+        )
+        #
+        network_settings = fj.lib.network.NetworkSettings(
+            downloads_per_host=2,
+        )
+        with tempfile.TemporaryDirectory() as temp_dir_name:
+            environ = {'XDG_CACHE_HOME': temp_dir_name}
+            with unittest.mock.patch.dict(os.environ, environ), \
+                    fj.lib.base.build_registry(
+                        'fj-test',
+                        network_settings=network_settings,
+                    ) as registry:
+                candidates = [
+                    fj.lib.wheel.WheelCandidateMaker.make_from_uri(
+                        registry,
+                        f'{server.base_url}/Thing{index}-1.0-py3-none-any.whl',
+                        set(),
+                        False,
+                    )
+                    for index in range(6)
+                ]
+                fj.lib.fetch.fetch_candidates(
+                    registry,
+                    [item for item in candidates if item],
+                )
+                self.assertEqual(
+                    len(registry.services.distribution_cache.list_()),
+                    6,
+                )
+        #
+        self.assertEqual(server.max_active_requests_count, 2)
+
+
+class TestResumeDownload(unittest.TestCase):
+    """Resume interrupted downloads of distribution files."""
+
+    def test_part_is_resumed(self) -> None:
+        """Request only the missing bytes, unless the file changed."""
+        content = b'0123456789' * 1000
+        server = local_server.start_server(
+            self,
+            {
+                '/Thing-1.0-py3-none-any.whl': local_server.Response(
+                    content,
+                    headers={'ETag': '"v1"'},
+                ),
+            },
+        )
+        url = server.base_url + '/Thing-1.0-py3-none-any.whl'
+        hash_str = hashlib.sha256(content).hexdigest()
+        #
+        for etag, part_size, expected_bytes_count in (
+                ('"v1"', 4000, len(content) - 4000),
+                ('"v0"', 4000, len(content)),
+                # Left complete, the range can not be served
+                ('"v1"', len(content), len(content)),
+        ):
+            with self.subTest(etag=etag, part_size=part_size), \
+                    tempfile.TemporaryDirectory() as temp_dir_name:
+                environ = {'XDG_CACHE_HOME': temp_dir_name}
+                with unittest.mock.patch.dict(os.environ, environ), \
+                        fj.lib.base.build_registry('fj-test') as registry:
+                    distribution_cache = registry.services.distribution_cache
+                    part_path = distribution_cache.get_part_path(
+                        url,
+                        url.rpartition('/')[2],
+                    )
+                    part_path.parent.mkdir(parents=True)
+                    part_path.write_bytes(content[:part_size])
+                    part_path.with_name(part_path.name + '.json').write_text(
+                        json.dumps(
+                            {
+                                'etag': etag,
+                                'hash': hash_str,
+                                'size': len(content),
+                                'url': url,
+                            },
+                        ),
+                        encoding='utf-8',
+                    )
+                    candidate = (
+                        fj.lib.wheel.WheelCandidateMaker.make_from_uri(
+                            registry,
+                            f'{url}#sha256={hash_str}',
+                            set(),
+                            False,
+                        )
+                    )
+                    assert isinstance(candidate, fj.lib.wheel.WheelCandidate)
+                    self.assertEqual(candidate.path.read_bytes(), content)
+                    self.assertEqual(
+                        registry.network_bytes_count,
+                        expected_bytes_count,
+                    )
+                    self.assertEqual(
+                        [entry.path for entry in distribution_cache.list_()],
+                        [candidate.path],
+                    )
+                    self.assertEqual(list(part_path.parent.iterdir()), [])
+
+
+class TestDistributionCache(unittest.TestCase):
+    """Cache distribution files by hash of their content."""
+
+    def test_prune_least_recently_used(self) -> None:
+        """Share files with the same content, evict least recently used."""
+        with tempfile.TemporaryDirectory() as temp_dir_name:
+            temp_dir_path = pathlib.Path(temp_dir_name)
+            distribution_cache = fj.lib.cache.DistributionCache(
+                temp_dir_path.joinpath('cache'),
+            )
+            for index, url in enumerate(
+                    (
+                        'https://a.example/Thing-1.0.tar.gz',
+                        'https://b.example/Thing-1.0.tar.gz',
+                        'https://a.example/Other-1.0.tar.gz',
+                    ),
+            ):
+                content = url.encode() * 100
+                part_path = temp_dir_path.joinpath(f'{index}.part')
+                part_path.write_bytes(content)
+                distribution_cache.add(
+                    url,
+                    url.rpartition('/')[2],
+                    hashlib.sha256(content).hexdigest(),
+                    part_path,
+                )
+            #
+            thing_path = distribution_cache.get(
+                'https://mirror.example/Thing-1.0.tar.gz',
+                hashlib.sha256(
+                    b'https://a.example/Thing-1.0.tar.gz' * 100,
+                ).hexdigest(),
+            )
+            assert thing_path is not None
+            self.assertEqual(
+                thing_path.read_bytes(),
+                b'https://a.example/Thing-1.0.tar.gz' * 100,
+            )
+            #
+            removed_entries = distribution_cache.prune(max_size=3500)
+            self.assertEqual(
+                [entry.url for entry in removed_entries],
+                [
+                    'https://b.example/Thing-1.0.tar.gz',
+                    'https://a.example/Other-1.0.tar.gz',
+                ],
+            )
+            self.assertEqual(
+                [entry.path for entry in distribution_cache.list_()],
+                [thing_path],
+            )
+
+    def test_prune_shared_files(self) -> None:
+        """Count a file shared by several URLs once, evict it at once."""
+        with tempfile.TemporaryDirectory() as temp_dir_name:
+            temp_dir_path = pathlib.Path(temp_dir_name)
+            cache_dir_path = temp_dir_path.joinpath('cache')
+            distribution_cache = fj.lib.cache.DistributionCache(
+                cache_dir_path,
+            )
+            content = b'thing' * 1000
+            for url in (
+                    'https://a.example/Thing-1.0.tar.gz',
+                    'https://b.example/Thing-1.0.tar.gz',
+            ):
+                part_path = temp_dir_path.joinpath('thing.part')
+                part_path.write_bytes(content)
+                distribution_cache.add(
+                    url,
+                    'Thing-1.0.tar.gz',
+                    hashlib.sha256(content).hexdigest(),
+                    part_path,
+                )
+            # Fits, as long as the shared file is counted once
+            self.assertEqual(distribution_cache.prune(max_size=6000), [])
+            removed_entries = distribution_cache.prune(max_size=4000)
+            self.assertEqual(len(removed_entries), 2)
+            self.assertEqual(distribution_cache.list_(), [])
+            self.assertFalse(removed_entries[0].path.exists())
+
+    def test_prune_stale_files(self) -> None:
+        """Remove abandoned downloads, and files of the older layout."""
+        with tempfile.TemporaryDirectory() as temp_dir_name:
+            cache_dir_path = pathlib.Path(temp_dir_name, 'cache')
+            distribution_cache = fj.lib.cache.DistributionCache(
+                cache_dir_path,
+            )
+            # Creates the index
+            self.assertIsNone(
+                distribution_cache.get('https://a.example/Old-1.0.tar.gz'),
+            )
+            stale_part_path = distribution_cache.get_part_path(
+                'https://a.example/Old-1.0.tar.gz',
+                'Old-1.0.tar.gz',
+            )
+            fresh_part_path = distribution_cache.get_part_path(
+                'https://a.example/New-1.0.tar.gz',
+                'New-1.0.tar.gz',
+            )
+            locked_part_path = distribution_cache.get_part_path(
+                'https://a.example/Locked-1.0.tar.gz',
+                'Locked-1.0.tar.gz',
+            )
+            stale_meta_path = stale_part_path.with_name(
+                stale_part_path.name + '.json',
+            )
+            flat_file_path = cache_dir_path.joinpath('Flat-1.0.tar.gz')
+            for path in (
+                    stale_part_path,
+                    stale_meta_path,
+                    fresh_part_path,
+                    locked_part_path,
+                    flat_file_path,
+            ):
+                path.parent.mkdir(parents=True, exist_ok=True)
+                path.write_bytes(b'part')
+            two_days_ago = time.time() - 2 * 24 * 60 * 60
+            for path in (stale_part_path, stale_meta_path, locked_part_path):
+                os.utime(path, (two_days_ago, two_days_ago))
+            #
+            with distribution_cache.lock(
+                    'https://a.example/Locked-1.0.tar.gz',
+            ):
+                removed_paths = distribution_cache.prune_stale_files()
+            self.assertEqual(
+                sorted(removed_paths),
+                sorted([stale_part_path, stale_meta_path, flat_file_path]),
+            )
+            for path in (fresh_part_path, locked_part_path):
+                self.assertTrue(path.is_file())
+            index_file_path = cache_dir_path.joinpath(
+                fj.lib.cache.INDEX_FILE_NAME,
+            )
+            self.assertTrue(index_file_path.is_file())
+
+    def test_prune_keeps_fresh_parts(self) -> None:
+        """Keep downloads in progress, whatever the maximum age."""
+        with tempfile.TemporaryDirectory() as temp_dir_name:
+            environ = {'XDG_CACHE_HOME': temp_dir_name}
+            with unittest.mock.patch.dict(os.environ, environ), \
+                    fj.lib.base.build_registry('fj-test') as registry:
+                distribution_cache = registry.services.distribution_cache
+                part_path = distribution_cache.get_part_path(
+                    'https://a.example/Thing-1.0.tar.gz',
+                    'Thing-1.0.tar.gz',
+                )
+                part_path.parent.mkdir(parents=True)
+                part_path.write_bytes(b'part')
+                one_minute_ago = time.time() - 60
+                os.utime(part_path, (one_minute_ago, one_minute_ago))
+                #
+                self.assertEqual(fj.lib.cache.prune(registry, None, 1), [])
+                self.assertTrue(part_path.is_file())
+
+
+class TestLockEntry(unittest.TestCase):
+    """Lock entries of the caches across processes."""
+
+    def test_other_process_waits(self) -> None:
+        """Acquire the lock only after the other process released it."""
+        with tempfile.TemporaryDirectory() as temp_dir_name:
+            lock_path = pathlib.Path(temp_dir_name, 'locks', 'entry.lock')
+            code = (
+                'import pathlib, sys, fj.lib.cache\n'
+                'with fj.lib.cache.lock_entry(pathlib.Path(sys.argv[1])):\n'
+                '    print("locked", flush=True)\n'
+                '    sys.stdin.read()\n'
+            )
+            with subprocess.Popen(
+                    [sys.executable, '-c', code, str(lock_path)],
+                    stdin=subprocess.PIPE,
+                    stdout=subprocess.PIPE,
+            ) as process:
+                assert process.stdin and process.stdout
+                self.assertEqual(process.stdout.readline(), b'locked\n')
+                #
+                is_locked = threading.Event()
+
+                def lock() -> None:
+                    with fj.lib.cache.lock_entry(lock_path):
+                        is_locked.set()
+
+                thread = threading.Thread(target=lock)
+                thread.start()
+                self.assertFalse(is_locked.wait(0.5))
+                process.stdin.close()
+                thread.join(10)
+                self.assertTrue(is_locked.is_set())
+
+
+class TestCacheStats(unittest.TestCase):
+    """Count hits and misses of the caches, across runs."""
+
+    def test_hit_rates(self) -> None:
+        """Add up counters of runs, by day and category."""
+        with tempfile.TemporaryDirectory() as temp_dir_name:
+            stats_path = pathlib.Path(temp_dir_name).joinpath('stats.sqlite3')
+            for hits_count in (1, 2):
+                cache_stats = fj.lib.cache.CacheStats(stats_path)
+                cache_stats.command_name = 'install'
+                for _ in range(hits_count):
+                    cache_stats.record_hit('distributions', 100)
+                cache_stats.record_miss('distributions', 10)
+                cache_stats.record_miss('pool')
+                cache_stats.close()
+            #
+            days = fj.lib.cache.CacheStats(stats_path).load()
+            self.assertEqual(len(days), 1)
+            counters = next(iter(days.values()))
+            self.assertEqual(
+                counters['distributions'].to_dict(),
+                {
+                    'fetched_bytes': 20,
+                    'hit_rate': 0.6,
+                    'hits': 3,
+                    'misses': 2,
+                    'served_bytes': 300,
+                },
+            )
+            self.assertEqual(counters['pool'].hit_rate, 0)
+
+
 # EOF
@@ -0,0 +1,575 @@
+#
+
+"""Unit tests for the handling of wheels."""
+
+import base64
+import csv
+import dataclasses
+import hashlib
+import io
+import itertools
+import os
+import pathlib
+import subprocess
+import sys
+import sysconfig
+import tarfile
+import tempfile
+import typing
+import unittest
+import unittest.mock
+import zipfile
+
+import packaging.tags
+import packaging.version
+
+import fj
+
+
+class TestWheelFileNameCompatibility(unittest.TestCase):
+    """Pre-filter file names of wheels by their tags."""
+
+    def test_is_file_name_compatible(self) -> None:
+        """Check against tags, whatever the case and compressed tag sets."""
+        tags = frozenset(
+            itertools.chain(
+                packaging.tags.parse_tag('cp39-cp39-manylinux2014_x86_64'),
+                packaging.tags.parse_tag('py3-none-any'),
+            ),
+        )
+        tags_lookup = fj.lib.wheel.make_tags_lookup(tags)
+        for file_name, is_compatible in (
+                ('Thing-1.0-cp39-cp39-manylinux2014_x86_64.whl', True),
+                ('Thing-1.0-cp39-cp39-manylinux2014_aarch64.whl', False),
+                ('Thing-1.0-cp38-cp38-manylinux2014_x86_64.whl', False),
+                (
+                    'Thing-1.0-cp39-cp39-'
+                    'manylinux_2_17_x86_64.manylinux2014_x86_64.whl',
+                    True,
+                ),
+                ('Thing-1.0-1build-cp39-cp39-win_amd64.whl', False),
+                ('Thing-1.0-py2.py3-none-any.whl', True),
+                ('Thing-1.0-PY3-NONE-ANY.whl', True),
+                ('Thing-1.0.tar.gz', True),
+        ):
+            with self.subTest(file_name=file_name):
+                self.assertEqual(
+                    fj.lib.wheel.is_file_name_compatible(
+                        file_name,
+                        tags_lookup,
+                    ),
+                    is_compatible,
+                )
+
+
+class TestWheelMetadata(unittest.TestCase):
+    """Read metadata of wheels."""
+
+    def test_metadata_is_looked_up_directly(self) -> None:
+        """Read the top level 'METADATA' only, compressed or not."""
+        metadata_content = (
+            b'Metadata-Version: 2.1\nName: Thing\nVersion: 1.0\n\n'
+            + b'Long description.\n' * 1000
+        )
+        with tempfile.TemporaryDirectory() as temp_dir_name:
+            for compression, file_name in itertools.product(
+                    (zipfile.ZIP_STORED, zipfile.ZIP_DEFLATED),
+                    (
+                        'Thing-1.0-py3-none-any.whl',
+                        'Thing-1.0-1build-py3-none-any.whl',
+                        # Not the name of the 'dist-info' directory
+                        'thing-1.0-py3-none-any.whl',
+                    ),
+            ):
+                with self.subTest(
+                        compression=compression,
+                        file_name=file_name,
+                ):
+                    wheel_path = pathlib.Path(temp_dir_name, file_name)
+                    with zipfile.ZipFile(
+                            wheel_path,
+                            'w',
+                            compression=compression,
+                    ) as zip_file:
+                        zip_file.writestr(
+                            'thing/_vendor/Other-2.0.dist-info/METADATA',
+                            b'Name: Other\nVersion: 2.0\n',
+                        )
+                        zip_file.writestr('thing/__init__.py', b'')
+                        zip_file.writestr(
+                            'Thing-1.0.dist-info/METADATA',
+                            metadata_content,
+                        )
+                    for wheel in (
+                            wheel_path,
+                            io.BytesIO(wheel_path.read_bytes()),
+                    ):
+                        metadata = fj.lib.wheel.get_metadata(wheel, file_name)
+                        assert metadata is not None
+                        self.assertEqual(metadata['Name'], 'Thing')
+                        self.assertEqual(metadata['Version'], '1.0')
+
+
+class TestWheelInstaller(unittest.TestCase):
+    """Install wheels in process."""
+
+    def test_wheel_is_installed(self) -> None:
+        """Install files, scripts, and record them all."""
+        with tempfile.TemporaryDirectory() as temp_dir_name:
+            temp_dir_path = pathlib.Path(temp_dir_name)
+            wheel_path = temp_dir_path.joinpath('Thing-1.0-py3-none-any.whl')
+            with zipfile.ZipFile(wheel_path, 'w') as zip_file:
+                zip_file.writestr(
+                    'thing/__init__.py',
+                    'def main():\n    print("thing main")\n',
+                )
+                zip_file.writestr(
+                    'Thing-1.0.data/scripts/thing-script',
+                    '#!python\nprint("thing script")\n',
+                )
+                zip_file.writestr(
+                    'Thing-1.0.dist-info/METADATA',
+                    'Name: Thing\nVersion: 1.0\n',
+                )
+                zip_file.writestr(
+                    'Thing-1.0.dist-info/WHEEL',
+                    'Wheel-Version: 1.0\nRoot-Is-Purelib: true\n',
+                )
+                zip_file.writestr(
+                    'Thing-1.0.dist-info/entry_points.txt',
+                    '[console_scripts]\nthing = thing:main\n',
+                )
+                zip_file.writestr('Thing-1.0.dist-info/RECORD', '')
+            #
+            target_dir_path = temp_dir_path.joinpath('target')
+            environ = {'XDG_CACHE_HOME': temp_dir_name}
+            with unittest.mock.patch.dict(os.environ, environ), \
+                    fj.lib.base.build_registry('fj-test') as registry:
+                is_installed = fj.lib.wheel.WheelInstaller().install_path(
+                    registry,
+                    wheel_path,
+                    target_dir_path,
+                    False,  # editable
+                )
+            self.assertTrue(is_installed)
+            #
+            for script_name, output in (
+                    ('thing', b'thing main\n'),
+                    ('thing-script', b'thing script\n'),
+            ):
+                self.assertEqual(
+                    subprocess.run(
+                        [str(target_dir_path.joinpath('bin', script_name))],
+                        check=True,
+                        env=dict(os.environ, PYTHONPATH=str(target_dir_path)),
+                        stdout=subprocess.PIPE,
+                    ).stdout,
+                    output,
+                )
+            #
+            self._assert_files_are_recorded(
+                target_dir_path,
+                target_dir_path.joinpath('Thing-1.0.dist-info'),
+            )
+
+    def _assert_files_are_recorded(
+            self,
+            target_dir_path: pathlib.Path,
+            dist_info_dir_path: pathlib.Path,
+    ) -> None:
+        self.assertEqual(
+            dist_info_dir_path.joinpath('INSTALLER').read_text('utf-8'),
+            'fj-test\n',
+        )
+        records = {
+            record[0]: record[1:]
+            for record in csv.reader(
+                dist_info_dir_path.joinpath('RECORD')
+                .read_text('utf-8')
+                .splitlines(),
+            )
+        }
+        self.assertEqual(
+            set(records),
+            {
+                path.relative_to(target_dir_path).as_posix()
+                for path in target_dir_path.rglob('*')
+                if path.is_file()
+            },
+        )
+        self.assertIn('thing/__pycache__', ' '.join(records))
+        for file_name, (hash_str, size_str) in records.items():
+            content = target_dir_path.joinpath(file_name).read_bytes()
+            if file_name != 'Thing-1.0.dist-info/RECORD':
+                self.assertEqual(size_str, str(len(content)))
+                self.assertEqual(
+                    hash_str,
+                    'sha256=' + base64.urlsafe_b64encode(
+                        hashlib.sha256(content).digest(),
+                    ).rstrip(b'=').decode(),
+                )
+
+    def test_scripts_use_interpreter_of_environment(self) -> None:
+        """Point scripts at the interpreter of the target environment."""
+        with tempfile.TemporaryDirectory() as temp_dir_name:
+            temp_dir_path = pathlib.Path(temp_dir_name)
+            wheel_path = temp_dir_path.joinpath('Thing-1.0-py3-none-any.whl')
+            with zipfile.ZipFile(wheel_path, 'w') as zip_file:
+                zip_file.writestr('thing/__init__.py', 'def main(): pass\n')
+                zip_file.writestr(
+                    'Thing-1.0.data/scripts/thing-gui',
+                    '#!pythonw -u\n',
+                )
+                zip_file.writestr('Thing-1.0.dist-info/METADATA', '')
+                zip_file.writestr(
+                    'Thing-1.0.dist-info/WHEEL',
+                    'Wheel-Version: 1.0\n',
+                )
+                zip_file.writestr(
+                    'Thing-1.0.dist-info/entry_points.txt',
+                    '[console_scripts]\nthing = thing:main\n',
+                )
+            #
+            target_dir_path = temp_dir_path.joinpath('target')
+            environ = {'XDG_CACHE_HOME': temp_dir_name}
+            with unittest.mock.patch.dict(os.environ, environ), \
+                    fj.lib.base.build_registry('fj-test') as registry:
+                for python_executable_path, expected_is_installed in (
+                        (None, False),
+                        (pathlib.Path('/venv/bin/python3'), True),
+                ):
+                    environment = dataclasses.replace(
+                        registry.environment,
+                        install_destination=dataclasses.replace(
+                            registry.environment.install_destination,
+                            python_executable_path=python_executable_path,
+                        ),
+                    )
+                    is_installed = fj.lib.wheel.WheelInstaller().install_path(
+                        registry.derive(environment),
+                        wheel_path,
+                        target_dir_path,
+                        False,  # editable
+                    )
+                    self.assertEqual(is_installed, expected_is_installed)
+            #
+            for script_name, first_line in (
+                    ('thing', '#!/venv/bin/python3'),
+                    # No 'pythonw3' there, so the same interpreter
+                    ('thing-gui', '#!/venv/bin/python3 -u'),
+            ):
+                self.assertEqual(
+                    target_dir_path.joinpath('bin', script_name)
+                    .read_text('utf-8').splitlines()[0],
+                    first_line,
+                )
+
+    def test_data_files_are_left_to_other_installers(self) -> None:
+        """Install nothing if the wheel has files for the 'data' scheme."""
+        with tempfile.TemporaryDirectory() as temp_dir_name:
+            temp_dir_path = pathlib.Path(temp_dir_name)
+            wheel_path = temp_dir_path.joinpath('Thing-1.0-py3-none-any.whl')
+            with zipfile.ZipFile(wheel_path, 'w') as zip_file:
+                zip_file.writestr('Thing-1.0.data/data/share/thing.txt', '')
+                zip_file.writestr('Thing-1.0.dist-info/METADATA', '')
+                zip_file.writestr(
+                    'Thing-1.0.dist-info/WHEEL',
+                    'Wheel-Version: 1.0\n',
+                )
+            #
+            target_dir_path = temp_dir_path.joinpath('target')
+            environ = {'XDG_CACHE_HOME': temp_dir_name}
+            with unittest.mock.patch.dict(os.environ, environ), \
+                    fj.lib.base.build_registry('fj-test') as registry:
+                is_installed = fj.lib.wheel.WheelInstaller().install_path(
+                    registry,
+                    wheel_path,
+                    target_dir_path,
+                    False,  # editable
+                )
+            self.assertFalse(is_installed)
+            self.assertFalse(target_dir_path.exists())
+
+
+class TestBuiltWheelCache(unittest.TestCase):
+    """Cache wheels built from sources."""
+
+    def test_wheel_is_built_once(self) -> None:
+        """Build again only for other sources or build requirements."""
+        built_wheel_names: typing.List[str] = []
+
+        def build(target_dir_path: pathlib.Path) -> pathlib.Path:
+            wheel_path = target_dir_path.joinpath(
+                f'Thing-1.{len(built_wheel_names)}-py3-none-any.whl',
+            )
+            wheel_path.write_bytes(b'')
+            built_wheel_names.append(wheel_path.name)
+            return wheel_path
+
+        with tempfile.TemporaryDirectory() as temp_dir_name:
+            environ = {'XDG_CACHE_HOME': temp_dir_name}
+            with unittest.mock.patch.dict(os.environ, environ), \
+                    fj.lib.base.build_registry('fj-test') as registry:
+                for source_hash_str, pyproject_toml_content in (
+                        ('a', None),
+                        (
+                            'a',
+                            b'[build-system]\n'
+                            b'requires = ["Wheel", "setuptools >= 40.8.0"]\n',
+                        ),
+                        (
+                            'a',
+                            b'[build-system]\nrequires = ["flit_core"]\n',
+                        ),
+                        ('b', b''),
+                ):
+                    built_wheel_dir_path = (
+                        fj.lib.build.get_built_wheel_dir_path(
+                            registry,
+                            source_hash_str,
+                            fj.lib.build.get_build_requires(
+                                pyproject_toml_content,
+                            ),
+                        )
+                    )
+                    fj.lib.build.get_or_build_wheel(
+                        registry,
+                        built_wheel_dir_path,
+                        build,
+                    )
+        self.assertEqual(
+            built_wheel_names,
+            [
+                'Thing-1.0-py3-none-any.whl',
+                'Thing-1.1-py3-none-any.whl',
+                'Thing-1.2-py3-none-any.whl',
+            ],
+        )
+
+
+class TestDirectSdistInstall(unittest.TestCase):
+    """Install direct 'sdist' requirements from their built wheels."""
+
+    def test_sdist_is_built_once(self) -> None:
+        """Install the cached wheel, instead of building the 'sdist' again."""
+        built_wheel_paths: typing.List[pathlib.Path] = []
+        installed_paths: typing.List[pathlib.Path] = []
+
+        def build_wheel(
+                _registry: fj.lib.base.Registry,
+                _source_dir_path: pathlib.Path,
+                target_dir_path: pathlib.Path,
+        ) -> pathlib.Path:
+            wheel_path = target_dir_path.joinpath('Thing-1.0-py3-none-any.whl')
+            wheel_path.write_bytes(b'')
+            built_wheel_paths.append(wheel_path)
+            return wheel_path
+
+        def install_path(
+                _registry: fj.lib.base.Registry,
+                path: pathlib.Path,
+        ) -> bool:
+            installed_paths.append(path)
+            return True
+
+        install_candidates = (
+            # pylint: disable=protected-access
+            fj.lib.install._install_candidates
+        )
+        #
+        with tempfile.TemporaryDirectory() as temp_dir_name:
+            sdist_path = pathlib.Path(temp_dir_name, 'Thing-1.0.tar.gz')
+            with tarfile.open(sdist_path, 'w:gz') as tar_file:
+                tar_info = tarfile.TarInfo('Thing-1.0/setup.py')
+                tar_file.addfile(tar_info, io.BytesIO(b''))
+            environ = {'XDG_CACHE_HOME': temp_dir_name}
+            with unittest.mock.patch.dict(os.environ, environ), \
+                    unittest.mock.patch.object(
+                        fj.lib.wheel,
+                        'build_wheel',
+                        build_wheel,
+                    ), \
+                    unittest.mock.patch.object(
+                        fj.lib.installers,
+                        'install_path',
+                        install_path,
+                    ):
+                for _ in range(2):
+                    with fj.lib.base.build_registry('fj-test') as registry:
+                        candidate = (
+                            fj.ext.sdist.SdistCandidateMaker.make_from_uri(
+                                registry,
+                                sdist_path.as_uri(),
+                                set(),
+                                True,
+                            )
+                        )
+                        assert candidate is not None
+                        install_candidates(registry, [candidate], [])
+        self.assertEqual(len(built_wheel_paths), 1)
+        self.assertEqual(
+            [path.name for path in installed_paths],
+            ['Thing-1.0-py3-none-any.whl'] * 2,
+        )
+
+
+class TestSourceTreeHash(unittest.TestCase):
+    """Hash source trees to find the wheels built from them."""
+
+    def test_ignored_files(self) -> None:
+        """Change the hash only for files that are part of the source."""
+        with tempfile.TemporaryDirectory() as temp_dir_name:
+            dir_path = pathlib.Path(temp_dir_name)
+            dir_path.joinpath('.gitignore').write_bytes(b'*.log\n/out/\n')
+            dir_path.joinpath('setup.py').write_bytes(b'')
+            dir_path.joinpath('thing').mkdir()
+            dir_path.joinpath('thing', 'build').mkdir()
+            dir_path.joinpath('thing', 'build', 'a.py').write_bytes(b'')
+            hash_str = fj.lib.build.hash_source_tree(dir_path)
+            for relative_path_str in (
+                    '.git/HEAD',
+                    'Thing.egg-info/PKG-INFO',
+                    'build/lib/thing.py',
+                    'out/thing.txt',
+                    'thing/__pycache__/a.cpython-39.pyc',
+                    'thing/debug.log',
+            ):
+                file_path = dir_path.joinpath(relative_path_str)
+                file_path.parent.mkdir(parents=True, exist_ok=True)
+                file_path.write_bytes(b'ignored')
+                self.assertEqual(
+                    fj.lib.build.hash_source_tree(dir_path),
+                    hash_str,
+                    relative_path_str,
+                )
+            for relative_path_str in (
+                    'thing/build/a.py',
+                    'thing/out/b.py',
+                    'setup.py',
+            ):
+                file_path = dir_path.joinpath(relative_path_str)
+                file_path.parent.mkdir(parents=True, exist_ok=True)
+                file_path.write_bytes(b'changed')
+                changed_hash_str = fj.lib.build.hash_source_tree(dir_path)
+                self.assertNotEqual(changed_hash_str, hash_str)
+                hash_str = changed_hash_str
+
+
+class TestBuildEnvironment(unittest.TestCase):
+    """Reuse build environments for the same build requirements."""
+
+    @unittest.skipIf(os.name == 'nt', "Layout of the prefix is for POSIX")
+    def test_layers_are_installed_once(self) -> None:
+        """Install again only for other build requirements."""
+        installed_requirement_strs: typing.List[typing.List[str]] = []
+
+        def pip_install(
+                prefix_dir_path: pathlib.Path,
+                requirement_strs: typing.List[str],
+        ) -> None:
+            installed_requirement_strs.append(requirement_strs)
+            lib_dir_path = pathlib.Path(
+                sysconfig.get_paths(
+                    'posix_prefix',
+                    vars={
+                        'base': str(prefix_dir_path),
+                        'platbase': str(prefix_dir_path),
+                    },
+                )['purelib'],
+            )
+            lib_dir_path.mkdir(parents=True)
+            lib_dir_path.joinpath(
+                f'layer{len(installed_requirement_strs)}.py',
+            ).write_bytes(b'')
+
+        with tempfile.TemporaryDirectory() as temp_dir_name:
+            environ = {'XDG_CACHE_HOME': temp_dir_name}
+            with unittest.mock.patch.dict(os.environ, environ), \
+                    unittest.mock.patch.object(
+                        fj.lib.buildenv,
+                        '_pip_install',
+                        pip_install,
+                    ), \
+                    fj.lib.base.build_registry('fj-test') as registry:
+                for requirement_strs in (
+                        ['setuptools >= 40.8.0', 'wheel'],
+                        ['Wheel', 'setuptools>=40.8.0'],
+                ):
+                    build_environment = fj.lib.buildenv.BuildEnvironment(
+                        registry,
+                    )
+                    build_environment.install(requirement_strs)
+                    build_environment.install(['flit_core'])
+                    build_environment.install([])
+                build_environment.run_subprocess(
+                    [
+                        sys.executable,
+                        '-c',
+                        'import layer1, layer2',
+                    ],
+                )
+        self.assertEqual(
+            installed_requirement_strs,
+            [['setuptools>=40.8.0', 'wheel'], ['flit-core']],
+        )
+
+    def test_environments_of_build_interpreter(self) -> None:
+        """Key the environments on the interpreter running the builds."""
+        with fj.lib.base.build_registry('fj-test') as registry:
+            other_environment = dataclasses.replace(
+                registry.environment,
+                python_implementation_str='PyPy',
+                python_version=packaging.version.Version('3.99'),
+            )
+            with fj.lib.base.build_registry(
+                    'fj-test',
+                    other_environment,
+            ) as other_registry:
+                self.assertEqual(
+                    other_registry.get_build_environments_cache_dir_path(),
+                    registry.get_build_environments_cache_dir_path(),
+                )
+
+    def test_setup_py_only_project(self) -> None:
+        """Build projects without 'pyproject.toml' in these environments."""
+        source_dir_path_strs: typing.List[str] = []
+
+        def build_wheel(target_dir_name: str) -> str:
+            wheel_file_name = 'Thing-1.0-py3-none-any.whl'
+            pathlib.Path(target_dir_name, wheel_file_name).write_bytes(b'')
+            return wheel_file_name
+
+        def make_wheel_hook_caller(
+                _registry: fj.lib.base.Registry,
+                source_dir_path: pathlib.Path,
+        ) -> unittest.mock.Mock:
+            source_dir_path_strs.append(str(source_dir_path))
+            return unittest.mock.Mock(build_wheel=build_wheel)
+
+        with tempfile.TemporaryDirectory() as temp_dir_name:
+            source_dir_path = pathlib.Path(temp_dir_name, 'Thing-1.0')
+            source_dir_path.mkdir()
+            source_dir_path.joinpath('setup.py').write_text(
+                'import setuptools\nsetuptools.setup()\n',
+                encoding='utf-8',
+            )
+            target_dir_path = pathlib.Path(temp_dir_name, 'wheel')
+            target_dir_path.mkdir()
+            with unittest.mock.patch.object(
+                    fj.lib.buildenv,
+                    'make_wheel_hook_caller',
+                    make_wheel_hook_caller,
+            ), fj.lib.base.build_registry('fj-test') as registry:
+                wheel_path = fj.lib.wheel.Pep517WheelBuilder().build(
+                    registry,
+                    source_dir_path,
+                    target_dir_path,
+                )
+            self.assertEqual(
+                wheel_path,
+                target_dir_path.joinpath('Thing-1.0-py3-none-any.whl'),
+            )
+        self.assertEqual(source_dir_path_strs, [str(source_dir_path)])
+
+
+# EOF